@@ -1,11 +1,26 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
+from blog.forms import ArticleAdminForm
 from blog.models import Article
+from blog.services import ArticleService
 
 
 @admin.register(Article)
 class ArticleAdmin(admin.ModelAdmin):
     """Настройка отображения данных модели Article в админке."""
-    list_display = ("id", "article_title", "is_published", "create_at")
+    form = ArticleAdminForm  # Проверка запрещенных слов в заголовке и тексте статьи
+    list_display = ("id", "article_title", "is_published", "create_at", "updated_at")
     list_filter = ("article_title",)
     search_fields = ("article_title", "create_at",)
+    actions = ("publish_selected", "unpublish_selected")
+
+    @admin.action(description="Опубликовать выбранные статьи", permissions=["change"])
+    def publish_selected(self, request, queryset):
+        """Массовая публикация одним UPDATE (кеш блога сбрасывает ArticleService.set_published())."""
+        changed_ids = ArticleService.set_published(list(queryset.values_list("pk", flat=True)), True)
+        self.message_user(request, f"Опубликовано статей: {len(changed_ids)}.", messages.SUCCESS)
+
+    @admin.action(description="Снять с публикации выбранные статьи", permissions=["change"])
+    def unpublish_selected(self, request, queryset):
+        changed_ids = ArticleService.set_published(list(queryset.values_list("pk", flat=True)), False)
+        self.message_user(request, f"Снято с публикации статей: {len(changed_ids)}.", messages.SUCCESS)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        """Подключаю сигналы модели Article (инвалидация кеша по тегам)."""
+        import blog.signals  # noqa: F401
@@ -1,14 +1,22 @@
 from django import forms
 
+from catalog.moderation import ForbiddenWordsMixin
+from catalog.uploads import SafeImageField
+
 from .models import Article
 
 
-class ArticleForm(forms.ModelForm):
-    """Форма для добавления пользователем новой статьи в блоге на странице add_your_article.html."""
+class ArticleForm(ForbiddenWordsMixin, forms.ModelForm):
+    """Форма для добавления пользователем новой статьи в блоге на странице add_your_article.html.
+    Заголовок и текст статьи проверяются на отсутствие запрещенных слов (ForbiddenWordsMixin)."""
+
+    forbidden_words_fields = ('article_title', 'article_contents')
 
     class Meta:
         model = Article
         fields = ['article_title', 'article_contents', 'image']
+        # Проверка формата (JPEG/PNG по сигнатуре файла), размера файла и размеров в пикселях до декодирования
+        field_classes = {'image': SafeImageField}
         widgets = {
             'article_title': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -30,3 +38,13 @@ class ArticleForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         for field_name, field in self.fields.items():
             field.help_text = None
+
+
+class ArticleAdminForm(ForbiddenWordsMixin, forms.ModelForm):
+    """Форма статьи в админке: те же проверки запрещенных слов, что и на сайте."""
+
+    forbidden_words_fields = ('article_title', 'article_contents')
+
+    class Meta:
+        model = Article
+        fields = '__all__'
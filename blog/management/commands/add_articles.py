@@ -2,17 +2,26 @@ import os
 
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from blog.models import Article
 
 
 class Command(BaseCommand):
-    help = "Кастомная команда для импорта данных Article из файла фикстуры."
+    help = (
+        "Кастомная команда для импорта данных Article из выгрузки create_article_fixture (articles.jsonl.gz), а если ее "
+        "нет - из файла фикстуры articles_fixture.json."
+    )
 
     def handle(self, *args, **kwargs):
-        # Для удобства тестирования буду предварительно очищать БД при записи статей из фикстуры
-        Article.objects.all().delete()
-        # Создаю путь до фикстуры
-        fixture_file = os.path.join("data/fixtures", "articles_fixture.json")
-        call_command("loaddata", fixture_file)
-        self.stdout.write(self.style.SUCCESS("Успешный импорт данных из фикстуры."))
+        with transaction.atomic():  # При ошибке загрузки прежние записи не теряются
+            # Для удобства тестирования буду предварительно очищать БД при записи статей из фикстуры
+            Article.objects.all().delete()
+            # Создаю путь до выгрузки create_article_fixture и до фикстуры из репозитория
+            export_file = os.path.join("data/fixtures", "articles.jsonl.gz")
+            fixture_file = os.path.join("data/fixtures", "articles_fixture.json")
+            # Выгрузка create_article_fixture - тоже фикстура Django (сжатый JSONL): loaddata читает ее построчно и
+            # восстанавливает записи с теми же pk и датами создания
+            source = export_file if os.path.exists(export_file) else fixture_file
+            call_command("loaddata", source)
+            self.stdout.write(self.style.SUCCESS(f"Успешный импорт данных из {source}."))
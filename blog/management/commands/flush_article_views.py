@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.services import ArticleViewsCounter
+
+
+class Command(BaseCommand):
+    help = "Кастомная команда для переноса накопленных в Redis просмотров статей в БД (Article.views_counter)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Повторять перенос каждые N секунд (по умолчанию - один перенос и выход, например, для cron).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            articles, views = ArticleViewsCounter.flush()
+            self.stdout.write(self.style.SUCCESS(f"Перенесено просмотров: {views} (статей: {articles})."))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
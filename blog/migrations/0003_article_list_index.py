@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+from config.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, зато индекс строится без блокировки записи в таблицу
+    atomic = False
+
+    dependencies = [
+        ("blog", "0002_alter_article_create_at"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="article",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-create_at", "-id"],
+                name="article_published_created_idx",
+            ),
+        ),
+    ]
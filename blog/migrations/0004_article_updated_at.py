@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0003_article_list_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now, verbose_name="Дата изменения"
+            ),
+            preserve_default=False,
+        ),
+    ]
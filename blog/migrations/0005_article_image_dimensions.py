@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_article_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота превью"
+            ),
+        ),
+        migrations.AddField(
+            model_name="article",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина превью"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+from config.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, зато индекс строится без блокировки записи в таблицу
+    atomic = False
+
+    dependencies = [
+        ("blog", "0005_article_image_dimensions"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="article",
+            index=models.Index(fields=["updated_at"], name="article_updated_idx"),
+        ),
+    ]
@@ -6,7 +6,11 @@ class Article(models.Model):
     article_title = models.CharField(max_length=100, unique=True, blank=False, verbose_name='Заголовок статьи', help_text="Введите заголовок статьи")
     article_contents = models.TextField(blank=False, verbose_name='Содержимое статьи', help_text="Введите содержимое статьи")
     image = models.ImageField(upload_to='article_image/', blank=True, verbose_name='Превью (изображение)', help_text="Добавьте превью")
+    # Размеры оригинала превью заполняются после создания производных изображений (catalog/images.py)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина превью')
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Высота превью')
     create_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата изменения')
     is_published = models.BooleanField(default=False, blank=False, verbose_name='Признак публикации', help_text="Зафиксируйте факт публикации")
     views_counter = models.PositiveIntegerField(default=0, verbose_name='Количество просмотров')
 
@@ -19,3 +23,13 @@ class Article(models.Model):
         verbose_name_plural = "Статьи"
         ordering = ["article_title"]
         db_table = "blog_articles"
+        # Частичный индекс под список статей блога: filter(is_published=True).order_by("-create_at", "-id")
+        indexes = [
+            models.Index(
+                fields=["-create_at", "-id"],
+                condition=models.Q(is_published=True),
+                name="article_published_created_idx",
+            ),
+            # Инкрементальная выгрузка (export_data --since): filter(updated_at__gte=...)
+            models.Index(fields=["updated_at"], name="article_updated_idx"),
+        ]
@@ -0,0 +1,204 @@
+import time
+import uuid
+from collections import Counter
+from contextlib import suppress
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from redis.exceptions import ResponseError
+
+from blog.models import Article
+from catalog.cache_tags import invalidate_tags
+
+
+class ArticleViewsCounter:
+    """Класс для буферизованного счетчика просмотров статей.
+    Просмотры накапливаются в Redis (хеш "id статьи -> количество", атомарный HINCRBY) и периодически переносятся в
+    Article.views_counter одним UPDATE с F() (команда flush_article_views). Так просмотры не теряются при
+    параллельных запросах и не перезаписывают всю строку статьи на каждый просмотр.
+    Если кеш не Redis (например, локальная разработка), просмотр сразу записывается в БД атомарным UPDATE с F()."""
+
+    cache_key = "article_views_pending"
+    # Версия счетчика: растет с каждым просмотром, входит в ETag списка блога (количество просмотров на странице
+    # меняется раньше, чем тег "blog:published" при переносе в БД)
+    version_key = "article_views_version"
+    # Через сколько секунд буфер, оставшийся от прерванного переноса (падение процесса или ошибка Redis после
+    # RENAME), считается брошенным и забирается следующим flush(). Больше времени любого живого переноса
+    stale_flush_timeout = 600
+
+    @staticmethod
+    def _client():
+        """Клиент Redis из бэкенда кеша (RedisCache и наследники) или None, если кеш не Redis."""
+        backend_client = getattr(cache, "_cache", None)
+        if backend_client is None or not hasattr(backend_client, "get_client"):
+            return None
+        return backend_client.get_client(write=True)
+
+    @staticmethod
+    def _guarded(operation, fallback):
+        """Команда Redis под предохранителем бэкенда кеша (ResilientRedisCache.guarded()): пока Redis недоступен,
+        выполняется fallback, и запрос к сайту не ждет таймаута и не падает с ошибкой."""
+        guarded = getattr(cache, "guarded", None)
+        return guarded(operation, fallback) if guarded is not None else operation()
+
+    @classmethod
+    def _key(cls):
+        return cache.make_key(cls.cache_key)
+
+    @classmethod
+    def hit(cls, article_id):
+        """Функция регистрирует один просмотр статьи.
+        :param article_id: ID статьи."""
+        client = cls._client()
+
+        def update_in_db():
+            Article.objects.filter(pk=article_id).update(views_counter=F("views_counter") + 1)
+            if not cache.add(cls.version_key, 1, timeout=None):
+                with suppress(ValueError):  # Ключ мог быть вытеснен между add() и incr()
+                    cache.incr(cls.version_key)
+
+        def increment():
+            # Просмотр и версия - одним обращением к Redis (pipeline)
+            pipeline = client.pipeline(transaction=False)
+            pipeline.hincrby(cls._key(), article_id, 1)
+            pipeline.incr(cache.make_key(cls.version_key))
+            pipeline.execute()
+
+        if client is None:
+            update_in_db()
+            return
+        cls._guarded(increment, update_in_db)
+
+    @classmethod
+    def version(cls):
+        """Функция возвращает версию счетчика просмотров (меняется при каждом просмотре) - для ETag страниц, на которых
+        выводится количество просмотров (conditional_page(state=...)).
+        :return: Строка-версия."""
+        client = cls._client()
+        if client is None:
+            return str(cache.get(cls.version_key, 0))
+        # Читаю из Redis напрямую (версию меняет INCR в обход бэкенда кеша, ближний уровень о нем не знает). Пока
+        # Redis недоступен, просмотры пишутся в БД, а версия - в локальный кеш (update_in_db() в hit())
+        value = cls._guarded(
+            lambda: client.get(cache.make_key(cls.version_key)), lambda: f"local:{cache.get(cls.version_key, 0)}"
+        )
+        return value.decode() if isinstance(value, bytes) else str(value or 0)
+
+    @classmethod
+    def get_pending(cls, article_ids):
+        """Функция возвращает накопленные, но еще не перенесенные в БД просмотры (одним запросом HMGET).
+        :param article_ids: Список ID статей.
+        :return: Словарь {ID статьи: количество просмотров в буфере}."""
+        client = cls._client()
+        article_ids = list(article_ids)
+        if client is None or not article_ids:
+            return {}
+        values = cls._guarded(lambda: client.hmget(cls._key(), article_ids), lambda: [None] * len(article_ids))
+        return {article_id: int(value) for article_id, value in zip(article_ids, values) if value is not None}
+
+    @classmethod
+    def apply_pending(cls, articles):
+        """Функция добавляет к views_counter статей (только в памяти, без сохранения) просмотры из буфера, чтоб
+        шаблоны выводили актуальное количество просмотров без обращения к строке статьи в БД.
+        :param articles: Список статей."""
+        pending = cls.get_pending(article.pk for article in articles)
+        for article in articles:
+            article.views_counter += pending.get(article.pk, 0)
+        return articles
+
+    @classmethod
+    def _flushing_key(cls, key):
+        """Имя буфера на время переноса: время создания (для поиска брошенных буферов) и случайная часть."""
+        return f"{key}:flushing:{int(time.time())}:{uuid.uuid4().hex}"
+
+    @classmethod
+    def _claim(cls, client, source, key):
+        """Функция атомарно забирает буфер source (RENAME в новый буфер переноса).
+        :return: Имя нового буфера или None, если source нет (буфер пуст или его уже забрал другой процесс)."""
+        flushing_key = cls._flushing_key(key)
+        try:
+            client.rename(source, flushing_key)
+        except ResponseError:
+            return None
+        return flushing_key
+
+    @classmethod
+    def _claim_stale(cls, client, key):
+        """Функция забирает буферы прерванных переносов старше stale_flush_timeout (поиск через SCAN, не KEYS).
+        Свежие буферы не трогаются: их, возможно, прямо сейчас переносит другой процесс."""
+        deadline = time.time() - cls.stale_flush_timeout
+        claimed = []
+        for name in client.scan_iter(match=f"{key}:flushing:*"):
+            name = name.decode() if isinstance(name, bytes) else name
+            created_at = name.rsplit(":", 2)[-2]  # У буферов прежнего формата (flushing:<uuid>) времени нет
+            if not created_at.isdigit() or int(created_at) < deadline:
+                flushing_key = cls._claim(client, name, key)
+                if flushing_key:
+                    claimed.append(flushing_key)
+        return claimed
+
+    @classmethod
+    def flush(cls):
+        """Функция переносит накопленные просмотры в БД одним UPDATE ... SET views_counter = views_counter + CASE ...
+        Буфер атомарно переименовывается (RENAME), поэтому просмотры, пришедшие во время переноса, попадают уже в
+        новый буфер. Переименованный буфер удаляется только после UPDATE, а если UPDATE не удался - после возврата
+        просмотров в основной буфер (одной транзакцией MULTI). Если процесс упал или Redis оборвал соединение
+        посередине, буфер остается в Redis, и следующий flush() переносит его вместе с новыми просмотрами (см.
+        stale_flush_timeout). После переноса сбрасываются теги кеша статей и списка блога.
+        :return: Пара (количество статей, количество просмотров)."""
+        client = cls._client()
+        if client is None:
+            return 0, 0
+        key = cls._key()
+        claimed = cls._claim_stale(client, key)
+        flushing_key = cls._claim(client, key, key)
+        if flushing_key:
+            claimed.append(flushing_key)
+        if not claimed:  # Буфер пуст - переносить нечего
+            return 0, 0
+        pending = Counter()
+        for flushing_key in claimed:
+            for article_id, count in client.hgetall(flushing_key).items():
+                pending[int(article_id)] += int(count)
+        try:
+            with transaction.atomic():
+                Article.objects.filter(pk__in=pending).update(
+                    views_counter=F("views_counter")
+                    + Case(*(When(pk=article_id, then=Value(count)) for article_id, count in pending.items()), default=0)
+                )
+        except Exception:
+            pipeline = client.pipeline(transaction=True)
+            for article_id, count in pending.items():
+                pipeline.hincrby(key, article_id, count)
+            pipeline.delete(*claimed)
+            pipeline.execute()
+            raise
+        client.delete(*claimed)
+        # UPDATE не вызывает сигналы - сбрасываю теги вручную (список блога выводит количество просмотров)
+        invalidate_tags("blog:published", *(f"article:{article_id}" for article_id in pending))
+        return len(pending), sum(pending.values())
+
+
+class ArticleService:
+    """Класс для сервисных функций по работе со статьями (модель Article)."""
+
+    @staticmethod
+    def set_published(article_ids, is_published):
+        """Функция массово публикует или снимает с публикации статьи одним UPDATE (сигналы модели при этом не
+        вызываются, поэтому теги кеша сбрасываются здесь же).
+        :param article_ids: ID статей.
+        :param is_published: Новый статус публикации.
+        :return: Список ID статей, статус которых изменился."""
+        with transaction.atomic():
+            changed_ids = list(
+                Article.objects.select_for_update()
+                .filter(pk__in=article_ids)
+                .exclude(is_published=is_published)
+                .values_list("pk", flat=True)
+            )
+            if changed_ids:
+                Article.objects.filter(pk__in=changed_ids).update(is_published=is_published, updated_at=timezone.now())
+                invalidate_tags("blog:published", *(f"article:{pk}" for pk in changed_ids))
+        return changed_ids
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from blog.models import Article
+from catalog.cache_tags import invalidate_tags
+from catalog.images import ImageDerivatives
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+def article_changed(sender, instance, **kwargs):
+    """Инвалидация кеша статьи и списка опубликованных статей блога."""
+    invalidate_tags(f"article:{instance.pk}", "blog:published")
+
+
+# Производные изображения (миниатюры WebP/JPEG) превью статьи создаются в пуле процессов после загрузки
+ImageDerivatives.register(Article, "image", "article", "image_width", "image_height")
@@ -1,6 +1,7 @@
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse, reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views.generic import (
     CreateView,
     DeleteView,
@@ -11,40 +12,65 @@ from django.views.generic import (
 
 from blog.forms import ArticleForm
 from blog.models import Article
+from blog.services import ArticleViewsCounter
+from catalog.conditional import conditional_page
+from catalog.paginators import KeysetPaginationMixin
 
 
-class BlogListView(ListView):
+# Условный GET (ETag / 304): список меняется вместе с тегом "blog:published" (в т.ч. при переносе просмотров в БД
+# командой flush_article_views) и с каждым просмотром статьи - количество просмотров выводится вместе с буфером
+@method_decorator(
+    conditional_page(tags=lambda request: ["blog:published"], state=lambda request: ArticleViewsCounter.version()),
+    name="dispatch",
+)
+class BlogListView(KeysetPaginationMixin, ListView):
     """Представление для отображения домашней страницы (blogs.html) с пагинацией и счетчиком просмотров."""
 
+    query_budget = 4  # Бюджет SQL-запросов страницы (проверяет команда check_query_budgets)
+
     model = Article
     template_name = "blog/blogs.html"
     context_object_name = "articles"
     paginate_by = 4
+    keyset_ordering = ("-create_at", "-id")
+    count_cache_key = "blog_published_count"
 
     def get_queryset(self):
         """Переопределяю метод get_queryset() где фильтрую статьи с признаком is_published=True и
         сортирую их по дате создания (по убыванию)."""
-        return super().get_queryset().filter(is_published=True).order_by("-create_at")
+        return super().get_queryset().filter(is_published=True).order_by("-create_at", "-id")
+
+    def get_context_data(self, **kwargs):
+        """Добавляю к счетчикам просмотров статей текущей страницы просмотры, накопленные в буфере (Redis)."""
+        context = super().get_context_data(**kwargs)
+        ArticleViewsCounter.apply_pending(context["articles"])
+        return context
 
 
 class BlogDetailView(LoginRequiredMixin, DetailView):
     """Представление для отображения страницы с подробной информацией о статье (article.html)."""
 
+    query_budget = 4
+
     model = Article
     template_name = "blog/article.html"
     context_object_name = "article"
 
     def get_object(self, queryset=None):
-        """Переопределяю метод get_object() для увеличения счетчика просмотров (views_counter) при каждом просмотре."""
+        """Переопределяю метод get_object() для увеличения счетчика просмотров при каждом просмотре. Просмотр
+        атомарно накапливается в буфере (ArticleViewsCounter) и переносится в БД командой flush_article_views,
+        а не сохранением всей статьи (save()) на каждый просмотр."""
         self.object = super().get_object(queryset)
-        self.object.views_counter += 1
-        self.object.save()
+        ArticleViewsCounter.hit(self.object.pk)
+        ArticleViewsCounter.apply_pending([self.object])
         return self.object
 
 
 class BlogCreateView(LoginRequiredMixin, CreateView):
     """Представление для отображения страницы с формой, которая позволяет пользователю добавить новую статью в блог."""
 
+    query_budget = 2
+
     model = Article
     template_name = "blog/add_your_article.html"
     form_class = ArticleForm
@@ -64,6 +90,8 @@ class BlogCreateView(LoginRequiredMixin, CreateView):
 class BlogUpdateView(LoginRequiredMixin, UpdateView):
     """Представление для редактирования статьи в блоге."""
 
+    query_budget = 3
+
     model = Article
     template_name = "blog/add_your_article.html"
     form_class = ArticleForm
@@ -76,6 +104,8 @@ class BlogUpdateView(LoginRequiredMixin, UpdateView):
 class BlogDeleteView(LoginRequiredMixin, DeleteView):
     """Представление для удаления статьи в блоге."""
 
+    query_budget = 3
+
     model = Article
     template_name = "blog/article_confirm_delete.html"
     success_url = reverse_lazy("blog:blog_page")
@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
+from catalog.forms import ProductAdminForm
 from catalog.models import Category, ContactsData, Feedback, Product
+from catalog.services import ProductService
 
 
 @admin.register(Category)
@@ -13,9 +15,26 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     """Настройка отображения данных модели Product в админке."""
-    list_display = ("id", "product_name", "price", "category",)
-    list_filter = ("category",)
+    form = ProductAdminForm  # Проверка запрещенных слов в названии и описании
+    list_display = ("id", "product_name", "price", "category", "is_published",)
+    list_filter = ("category", "is_published",)
     search_fields = ("product_name", "description",)
+    actions = ("publish_selected", "unpublish_selected")
+
+    def has_change_publication_permission(self, request):
+        """Право для действий публикации (проверяется Django для actions с permissions=["change_publication"])."""
+        return request.user.has_perm("catalog.can_change_product_publication")
+
+    @admin.action(description="Опубликовать выбранные продукты", permissions=["change_publication"])
+    def publish_selected(self, request, queryset):
+        """Массовая публикация одним UPDATE (счетчик и кеш обновляет ProductService.set_published())."""
+        changed_ids = ProductService.set_published(list(queryset.values_list("pk", flat=True)), True)
+        self.message_user(request, f"Опубликовано продуктов: {len(changed_ids)}.", messages.SUCCESS)
+
+    @admin.action(description="Снять с публикации выбранные продукты", permissions=["change_publication"])
+    def unpublish_selected(self, request, queryset):
+        changed_ids = ProductService.set_published(list(queryset.values_list("pk", flat=True)), False)
+        self.message_user(request, f"Снято с публикации продуктов: {len(changed_ids)}.", messages.SUCCESS)
 
 
 @admin.register(ContactsData)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CatalogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'catalog'
+
+    def ready(self):
+        """Подключаю сигналы моделей Product и Category (счетчик неопубликованных продуктов, инвалидация кеша по тегам)
+        и журнал медленных SQL-запросов (ставится на каждое новое соединение с БД)."""
+        import catalog.signals  # noqa: F401
+        import catalog.slow_queries  # noqa: F401
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from django.core import serializers
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from blog.models import Article
+from catalog.bulk_import import open_text
+from catalog.models import Category, Product
+
+
+class ExportSpec:
+    """Описание выгрузки одной модели: поля записи (имя в файле -> поле/путь в ORM) и поле времени изменения для
+    инкрементальной выгрузки (None - модель выгружается только целиком)."""
+
+    def __init__(self, model, fields, updated_field=None):
+        self.model = model
+        self.fields = fields
+        self.updated_field = updated_field
+
+    def get_queryset(self, since=None):
+        queryset = self.model._default_manager.order_by("pk")
+        if since is not None:
+            queryset = queryset.filter(**{f"{self.updated_field}__gte": since})
+        return queryset.values_list(*self.fields.values())
+
+
+# Формат записей совпадает с форматом команды import_catalog (выгрузку можно загрузить обратно)
+EXPORTS = {
+    "categories": ExportSpec(Category, {"category_name": "category_name", "description": "description"}),
+    "products": ExportSpec(
+        Product,
+        {
+            "product_name": "product_name",
+            "category_name": "category__category_name",
+            "description": "description",
+            "image": "image",
+            "price": "price",
+            "is_published": "is_published",
+            "created_at": "created_at",
+            "updated_at": "updated_at",
+        },
+        updated_field="updated_at",
+    ),
+    "articles": ExportSpec(
+        Article,
+        {
+            "article_title": "article_title",
+            "article_contents": "article_contents",
+            "image": "image",
+            "is_published": "is_published",
+            "views_counter": "views_counter",
+            "create_at": "create_at",
+            "updated_at": "updated_at",
+        },
+        updated_field="updated_at",
+    ),
+}
+
+
+def parse_since(value):
+    """Функция разбирает значение --since: дата (2025-01-31) или дата и время в ISO 8601. Время без часового пояса
+    считается локальным (TIME_ZONE).
+    :return: datetime с часовым поясом.
+    :raise ValueError: Если значение не распознано."""
+    moment = parse_datetime(value) or parse_date(value)
+    if moment is None:
+        raise ValueError(f"Не удалось распознать дату {value!r} (ожидается ISO 8601, например 2025-01-31T03:00:00).")
+    if not isinstance(moment, datetime):
+        moment = datetime.combine(moment, datetime.min.time())
+    return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+
+def to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def export_jsonl(kind, path, since=None, chunk_size=2000, progress=None):
+    """Функция потоково выгружает модель в файл JSONL (по одному JSON-объекту на строку) с постоянным расходом памяти:
+    строки читаются из БД порциями по chunk_size через серверный курсор (QuerySet.iterator(), на Postgres - named
+    cursor) и сразу пишутся в файл, сжатый gzip (*.gz) или zstd (*.zst). Файл пишется во временный и
+    переименовывается после успешной выгрузки, поэтому читатель не увидит недописанный файл.
+    :param kind: Что выгружать: ключ EXPORTS ("products", "categories", "articles").
+    :param path: Путь к файлу (*.jsonl, *.jsonl.gz, *.jsonl.zst).
+    :param since: Выгружать только записи, измененные не раньше этого момента (datetime) - для инкрементальной
+                  синхронизации (по индексу updated_at). Удаленные записи в такую выгрузку не попадают - удаления
+                  переносит только полная выгрузка. None - все записи.
+    :param chunk_size: Сколько строк читать из БД за раз.
+    :param progress: Функция progress(stats, elapsed), вызываемая после каждой порции.
+    :return: Словарь {"total": количество записей, "elapsed": секунды, "started_at": время начала выгрузки} -
+             started_at можно передать в since следующей выгрузки (изменения во время выгрузки не потеряются)."""
+    spec = EXPORTS[kind]
+    if since is not None and spec.updated_field is None:
+        raise ValueError(f"У модели {spec.model._meta.label} нет времени изменения: доступна только полная выгрузка.")
+    names = list(spec.fields)
+    stats = {"total": 0, "started_at": timezone.now()}
+    started = time.monotonic()
+    with open_output(path) as file:
+        for row in spec.get_queryset(since).iterator(chunk_size=chunk_size):
+            record = {name: to_json(value) for name, value in zip(names, row)}
+            file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            file.write("\n")
+            stats["total"] += 1
+            if progress and stats["total"] % chunk_size == 0:
+                progress(stats, time.monotonic() - started)
+    stats["elapsed"] = time.monotonic() - started
+    return stats
+
+
+def export_fixture(kind, path, chunk_size=2000):
+    """Функция потоково выгружает модель целиком в фикстуру Django формата JSONL (сериализатор "jsonl", как
+    dumpdata --format jsonl): в отличие от export_jsonl запись хранит все поля модели, включая pk, внешние ключи
+    (owner, category) и created_at, поэтому loaddata восстанавливает записи без изменений. Строки читаются из БД
+    порциями через QuerySet.iterator() и сразу пишутся в файл (*.jsonl.gz - сжатый gzip, его loaddata читает
+    построчно), память не зависит от размера таблицы.
+    :param kind: Что выгружать: ключ EXPORTS ("products", "categories", "articles").
+    :param path: Путь к файлу (*.jsonl или *.jsonl.gz).
+    :param chunk_size: Сколько строк читать из БД за раз.
+    :return: Количество выгруженных записей."""
+    total = 0
+
+    def counted(objects):
+        nonlocal total
+        for total, obj in enumerate(objects, start=1):
+            yield obj
+
+    queryset = EXPORTS[kind].model._default_manager.order_by("pk")
+    with open_output(path) as file:
+        serializers.serialize("jsonl", counted(queryset.iterator(chunk_size=chunk_size)), stream=file)
+    return total
+
+
+@contextmanager
+def open_output(path):
+    """Контекстный менеджер открывает файл выгрузки на запись (сжатие - по расширению, см. open_text). Файл пишется во
+    временный и переименовывается после успешной выгрузки, при ошибке временный файл удаляется."""
+    tmp_path = f"{path}.tmp{os.path.splitext(str(path))[1]}"  # Расширение сохраняю: по нему выбирается сжатие
+    try:
+        with open_text(tmp_path, "wt") as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
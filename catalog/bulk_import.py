@@ -0,0 +1,296 @@
+import csv
+import gzip
+import json
+import os
+import time
+
+from django.db import transaction
+
+from blog.models import Article
+from catalog.cache_tags import invalidate_tags
+from catalog.models import Category, Product
+from catalog.services import CatalogDataService, UnpublishedProductsCounter
+
+COMPRESSED_EXTENSIONS = (".gz", ".zst")
+TRUE_VALUES = {"1", "true", "yes", "да"}
+
+
+def parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in TRUE_VALUES
+    return bool(value)
+
+
+def parse_text(value):
+    return "" if value is None else str(value)
+
+
+# Поля входных данных по моделям: поле -> функция преобразования значения (в CSV все значения - строки).
+# Первое поле - уникальный ключ, по которому существующая запись обновляется, а не создается заново.
+IMPORT_FIELDS = {
+    "categories": {"category_name": parse_text, "description": parse_text},
+    "products": {
+        "product_name": parse_text,
+        "category_name": parse_text,
+        "description": parse_text,
+        "image": parse_text,
+        "price": float,
+        "is_published": parse_bool,
+    },
+    "articles": {
+        "article_title": parse_text,
+        "article_contents": parse_text,
+        "image": parse_text,
+        "is_published": parse_bool,
+        "views_counter": int,
+    },
+}
+# Вид изображений для команды build_image_derivatives --kind (после импорта с новыми фото)
+IMAGE_KINDS = {"products": "product", "articles": "article"}
+
+
+def open_text(path, mode="rt"):
+    """Функция открывает файл импорта/экспорта как текст в UTF-8. Сжатие определяется по расширению: *.gz - gzip,
+    *.zst - zstd (нужен необязательный пакет zstandard)."""
+    path = str(path)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode, encoding="utf-8", newline="")
+    if path.endswith(".zst"):
+        # zstandard - необязательный пакет (его нет в requirements.txt): без него работают .gz и несжатые файлы, а
+        # для .zst выводится понятная ошибка
+        try:
+            import zstandard  # type: ignore[import-not-found]
+        except ImportError:
+            raise ValueError("Для файлов .zst установите пакет zstandard (pip install zstandard).")
+        return zstandard.open(path, mode, encoding="utf-8", newline="")
+    return open(path, mode.replace("t", ""), encoding="utf-8", newline="")
+
+
+def detect_format(path):
+    """Формат файла по расширению (без учета сжатия): "jsonl" или "csv"."""
+    name = str(path)
+    for compressed_ext in COMPRESSED_EXTENSIONS:
+        if name.endswith(compressed_ext):
+            name = name[: -len(compressed_ext)]
+    ext = os.path.splitext(name)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    raise ValueError(f"Неизвестный формат файла {path}: поддерживаются .jsonl и .csv (в т.ч. сжатые .gz и .zst).")
+
+
+def read_records(file, file_format):
+    """Генератор читает записи из файла по одной (файл целиком в память не загружается).
+    :param file: Открытый текстовый файл.
+    :param file_format: "jsonl" (один JSON-объект на строку) или "csv" (с заголовком).
+    :return: Пары (номер строки, словарь полей)."""
+    if file_format == "csv":
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(file, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f"строка {line_number}: некорректный JSON ({error.msg})") from error
+
+
+class CatalogImporter:
+    """Класс для потокового импорта категорий, продуктов и статей с обновлением существующих записей (upsert):
+    1) записи читаются из файла по одной и отправляются в БД пачками по batch_size одним INSERT ... ON CONFLICT
+       (bulk_create(update_conflicts=True)) по уникальному полю category_name / product_name / article_title;
+    2) весь импорт выполняется в одной транзакции: каталог никогда не бывает пустым или наполовину загруженным, а при
+       ошибке в любой записи БД остается в исходном состоянии;
+    3) сигналы моделей при bulk_create не вызываются, поэтому кеш каталога (блога) и счетчик неопубликованных
+       продуктов сбрасываются один раз после коммита;
+    4) обновляются только поля, которые есть во входных данных (заголовок CSV или первая запись JSONL)."""
+
+    def __init__(self, kind, batch_size=2000):
+        """:param kind: Что импортируется: "categories", "products" или "articles".
+        :param batch_size: Количество записей в одном INSERT."""
+        self.kind = kind
+        self.parsers = IMPORT_FIELDS[kind]
+        self.key = next(iter(self.parsers))
+        self.batch_size = batch_size
+        self.fields = None
+        self.category_ids = {}  # Кеш "название категории -> id" на время импорта
+        self.touched_categories = set()
+        self.touched_articles = set()
+        self.categories_changed = False  # Создавались или менялись категории (нужно сбросить кеш списка категорий)
+        self.stats = {"total": 0, "created": 0, "updated": 0, "images_changed": 0}
+
+    def run(self, records, progress=None):
+        """Функция импортирует записи.
+        :param records: Итератор пар (номер строки, словарь полей), например read_records().
+        :param progress: Функция progress(stats, elapsed), вызываемая после каждой пачки.
+        :return: Словарь со статистикой: total, created, updated, images_changed.
+        :raise ValueError: Если запись некорректна (с номером строки); импорт при этом полностью откатывается."""
+        started = time.monotonic()
+        with transaction.atomic():
+            batch = {}
+            for line_number, record in records:
+                values = self.parse(line_number, record)
+                batch[values[self.key]] = values  # Повтор ключа в пачке: побеждает последняя запись
+                if len(batch) >= self.batch_size:
+                    self.flush(batch, started, progress)
+                    batch = {}
+            if batch:
+                self.flush(batch, started, progress)
+            self.invalidate_cache()
+        return self.stats
+
+    def parse(self, line_number, record):
+        """Проверка и преобразование одной записи."""
+        if self.fields is None:
+            self.fields = [field for field in self.parsers if field in record]
+            if self.key not in self.fields:
+                raise ValueError(f"строка {line_number}: нет обязательного поля {self.key}")
+            if self.kind == "products" and not {"category_name", "price"} <= set(self.fields):
+                raise ValueError(f"строка {line_number}: для продуктов обязательны поля category_name и price")
+        try:
+            values = {field: self.parsers[field](record.get(field)) for field in self.fields}
+        except (TypeError, ValueError) as error:
+            raise ValueError(f"строка {line_number}: некорректное значение ({error})") from error
+        if not values[self.key]:
+            raise ValueError(f"строка {line_number}: пустое поле {self.key}")
+        return values
+
+    def flush(self, batch, started, progress):
+        if self.kind == "categories":
+            self.upsert_categories(batch)
+        elif self.kind == "articles":
+            self.upsert_articles(batch)
+        else:
+            self.upsert_products(batch)
+        self.stats["total"] += len(batch)
+        if progress:
+            progress(self.stats, time.monotonic() - started)
+
+    def upsert_categories(self, batch):
+        existing = dict(Category.objects.filter(category_name__in=batch).values_list("category_name", "id"))
+        self.touched_categories.update(existing.values())
+        update_fields = [field for field in self.fields if field != self.key]
+        categories = [Category(**values) for values in batch.values()]
+        if update_fields:
+            Category.objects.bulk_create(
+                categories, update_conflicts=True, unique_fields=[self.key], update_fields=update_fields
+            )
+        else:
+            Category.objects.bulk_create(categories, ignore_conflicts=True)
+        self.stats["created"] += len(batch) - len(existing)
+        self.stats["updated"] += len(existing)
+        self.categories_changed = True
+
+    def resolve_categories(self, names):
+        """Функция возвращает id категорий по названиям (отсутствующие категории создаются)."""
+        missing = set(names) - self.category_ids.keys()
+        if missing:
+            self.category_ids.update(
+                Category.objects.filter(category_name__in=missing).values_list("category_name", "id")
+            )
+            new = missing - self.category_ids.keys()
+            if new:
+                Category.objects.bulk_create([Category(category_name=name) for name in new], ignore_conflicts=True)
+                self.category_ids.update(
+                    Category.objects.filter(category_name__in=new).values_list("category_name", "id")
+                )
+                self.categories_changed = True
+        return self.category_ids
+
+    def upsert_products(self, batch):
+        # Один запрос на пачку: какие продукты уже есть, их категории, статус и фото (чтоб не потерять размеры
+        # фото, если файл не изменился, и сбросить кеш прежней категории)
+        existing = {
+            row[0]: row[1:]
+            for row in Product.objects.filter(product_name__in=batch).values_list(
+                "product_name", "category_id", "is_published", "image", "image_width", "image_height"
+            )
+        }
+        category_ids = self.resolve_categories({values["category_name"] for values in batch.values()})
+
+        products = []
+        for name, values in batch.items():
+            values = dict(values)
+            product = Product(category_id=category_ids[values.pop("category_name")], **values)
+            old = existing.get(name)
+            if old:
+                self.touched_categories.add(old[0])
+            self.touched_categories.add(product.category_id)
+            if "image" in values:
+                if old and old[2] == product.image.name:
+                    product.image_width, product.image_height = old[3], old[4]
+                elif product.image:
+                    self.stats["images_changed"] += 1
+            products.append(product)
+
+        update_fields = [
+            field if field != "category_name" else "category" for field in self.fields if field != self.key
+        ]
+        if "image" in update_fields:
+            update_fields += ["image_width", "image_height"]
+        Product.objects.bulk_create(
+            products, update_conflicts=True, unique_fields=[self.key], update_fields=update_fields + ["updated_at"]
+        )
+        self.stats["created"] += len(batch) - len(existing)
+        self.stats["updated"] += len(existing)
+
+    def upsert_articles(self, batch):
+        existing = {
+            row[0]: row[1:]
+            for row in Article.objects.filter(article_title__in=batch).values_list(
+                "article_title", "id", "image", "image_width", "image_height"
+            )
+        }
+        articles = []
+        for title, values in batch.items():
+            article = Article(**values)
+            old = existing.get(title)
+            if old:
+                self.touched_articles.add(old[0])
+            if "image" in values:
+                if old and old[1] == article.image.name:
+                    article.image_width, article.image_height = old[2], old[3]
+                elif article.image:
+                    self.stats["images_changed"] += 1
+            articles.append(article)
+
+        update_fields = [field for field in self.fields if field != self.key]
+        if "image" in update_fields:
+            update_fields += ["image_width", "image_height"]
+        Article.objects.bulk_create(
+            articles, update_conflicts=True, unique_fields=[self.key], update_fields=update_fields + ["updated_at"]
+        )
+        self.stats["created"] += len(batch) - len(existing)
+        self.stats["updated"] += len(existing)
+
+    def invalidate_cache(self):
+        """Сброс кеша после коммита: вместо тегов каждого продукта меняются общие теги - "catalog:categories"
+        (входит в теги всех страниц продуктов), "catalog:published" и теги затронутых категорий. Для статей - тег
+        "blog:published" и теги обновленных статей."""
+        if not self.stats["total"]:
+            return
+        if self.kind == "articles":
+            invalidate_tags("blog:published", *(f"article:{pk}" for pk in self.touched_articles))
+            return
+        invalidate_tags(
+            "catalog:categories", "catalog:published", *(f"category:{pk}" for pk in self.touched_categories)
+        )
+        if self.categories_changed:
+            CatalogDataService.invalidate_categories()
+        if self.kind == "products":
+            UnpublishedProductsCounter.invalidate()
+
+
+def import_file(kind, path, batch_size=2000, progress=None):
+    """Функция импортирует файл JSONL/CSV (в т.ч. сжатый) через CatalogImporter, формат - по расширению.
+    :return: Словарь со статистикой импорта (см. CatalogImporter.run)."""
+    with open_text(path) as file:
+        return CatalogImporter(kind, batch_size=batch_size).run(read_records(file, detect_format(path)), progress)
+
+
+def format_stats(stats, elapsed):
+    """Строка прогресса импорта/экспорта: количество записей и скорость."""
+    return f"{stats['total']} записей за {elapsed:.1f} с ({stats['total'] / max(elapsed, 1e-9):,.0f} зап./с)"
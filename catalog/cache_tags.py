@@ -0,0 +1,90 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+
+from catalog.single_flight import SingleFlightCacheMiddleware
+
+# Префикс ключей в кеше, где хранятся версии тегов
+TAG_VERSION_PREFIX = "cache_tag"
+
+
+def _tag_key(tag):
+    return f"{TAG_VERSION_PREFIX}:{tag}"
+
+
+def _new_version():
+    """Версия тега - время его последнего изменения в микросекундах. Беру время, а не счетчик с 1, чтоб после потери
+    ключа в Redis (перезапуск, вытеснение) версия не совпала со старой и не "воскресила" устаревшие записи кеша."""
+    return time.time_ns() // 1000
+
+
+def get_tag_versions(tags):
+    """Функция возвращает текущие версии тегов (одним запросом get_many). Отсутствующие теги создаются.
+    :param tags: Список тегов, например ["product:5", "category:2"].
+    :return: Словарь {тег: версия}."""
+    keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many(keys.keys())
+    versions = {}
+    for key, tag in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            if not cache.add(key, version, timeout=None):  # Параллельный процесс мог создать тег раньше
+                version = cache.get(key, version)
+        versions[tag] = version
+    return versions
+
+
+def tags_fingerprint(tags):
+    """Функция возвращает короткий отпечаток текущих версий тегов. Отпечаток добавляется в ключ кеша страницы или
+    фрагмента, поэтому после смены версии любого тега старая запись просто перестает быть видна (и истекает по TTL).
+    :param tags: Список тегов.
+    :return: Строка-отпечаток."""
+    versions = get_tag_versions(tags)
+    raw = ";".join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def _bump(tags):
+    """Новая версия тега - текущее время, но не меньше старой версии + 1 (версия всегда растет, даже если часы
+    серверов немного расходятся). Все теги читаются и записываются двумя запросами (get_many/set_many)."""
+    keys = [_tag_key(tag) for tag in tags]
+    current = cache.get_many(keys)
+    now = _new_version()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys}, timeout=None)
+
+
+def invalidate_tags(*tags):
+    """Функция инвалидирует все записи кеша с указанными тегами за O(1) на тег: меняет версию тега в общем кеше
+    (Redis), поэтому инвалидация видна сразу во всех процессах gunicorn. Выполняется после коммита транзакции.
+    :param tags: Теги, например "product:5", "category:2", "catalog:published"."""
+    tags = [tag for tag in tags if tag]
+    if tags:
+        transaction.on_commit(lambda: _bump(tags))
+
+
+def tagged_cache_page(timeout, tags):
+    """Декоратор - аналог cache_page, но с тегами. Отпечаток версий тегов входит в key_prefix, поэтому для сброса
+    кеша страницы достаточно вызвать invalidate_tags() с любым из ее тегов. После сброса страницу пересобирает
+    только один процесс, остальные в это время отдают устаревшую копию (SingleFlightCacheMiddleware).
+    :param timeout: Время жизни кеша страницы (в секундах).
+    :param tags: Функция (request, *args, **kwargs) -> список тегов страницы."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            middleware = SingleFlightCacheMiddleware(
+                lambda request: view_func(request, *args, **kwargs),
+                page_timeout=timeout,
+                key_prefix=f"tagged.{tags_fingerprint(tags(request, *args, **kwargs))}",
+                stale_key_prefix="tagged.stale",
+                stale_timeout=timeout * 4,
+            )
+            return middleware(request)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,71 @@
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+from catalog.cache_tags import get_tag_versions
+from catalog.services import UnpublishedProductsCounter
+
+
+def viewer_fingerprint(request):
+    """Функция возвращает отпечаток того, что на странице зависит от пользователя (меню: вход/профиль, аватар,
+    счетчик неопубликованных продуктов), чтоб страница одного пользователя не считалась актуальной для другого.
+    Счетчик неопубликованных продуктов входит в отпечаток только для пользователей с правом
+    'can_change_product_publication' (menu.html показывает его только им): для остальных он не читается и не меняет
+    их ETag.
+    :param request: HTTP-запрос.
+    :return: Строка-отпечаток."""
+    user = request.user
+    if not user.is_authenticated:
+        return "anonymous"
+    avatar = getattr(user, "avatar", None)
+    fingerprint = f"{user.pk}:{user.email}:{avatar.name if avatar else ''}"
+    if user.has_perm("catalog.can_change_product_publication"):
+        fingerprint += f":{UnpublishedProductsCounter.get()}"
+    return fingerprint
+
+
+def conditional_page(tags, state=None):
+    """Декоратор для условного GET (ETag / ответ 304) без рендеринга шаблона.
+    1) ETag - отпечаток версий тегов кеша страницы (см. cache_tags.py), пользователя и, если задан state, данных
+       страницы, которые теги не покрывают. Версии тегов берутся одним запросом get_many (обычно из ближнего уровня
+       кеша в памяти процесса), без запросов к БД;
+    2) если If-None-Match в запросе совпадает с текущим ETag, сразу возвращается 304. Last-Modified не отдается:
+       страница зависит от пользователя, а время изменения тегов у всех одно, и по одному If-Modified-Since
+       (без If-None-Match) пользователь получил бы 304 на страницу, сохраненную браузером для другого пользователя;
+    3) если у пользователя есть непоказанные сообщения (django.contrib.messages), проверка пропускается: сообщения
+       выводятся только при полном рендеринге страницы.
+    Декоратор должен быть внешним по отношению к кешу страницы (tagged_cache_page), чтоб 304 отдавался до
+    обращения к кешу.
+    :param tags: Функция (request, *args, **kwargs) -> список тегов страницы.
+    :param state: Функция (request, *args, **kwargs) -> строка, которая меняется вместе с данными страницы, не
+                  покрытыми тегами (например, версия счетчика просмотров статей), или None."""
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or len(get_messages(request)):
+                return view_func(request, *args, **kwargs)
+
+            versions = get_tag_versions(tags(request, *args, **kwargs))
+            raw = ";".join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+            if state is not None:
+                raw += f"|{state(request, *args, **kwargs)}"
+            etag = quote_etag(hashlib.md5(f"{raw}|{viewer_fingerprint(request)}".encode()).hexdigest())
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response.headers["ETag"] = etag
+            # Страница зависит от пользователя: браузер хранит ее только у себя и проверяет при каждом заходе
+            patch_vary_headers(response, ("Cookie",))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,6 +1,10 @@
-from catalog.models import Product
+from django.utils.functional import SimpleLazyObject
+
+from catalog.services import UnpublishedProductsCounter
+
 
 def unpublished_products_count(request):
-    """Контекстный процессор для автоматического подсчета количества неопубликованных продуктов и передачи
-    этого количества во все шаблоны (страницы) магазина."""
-    return {"unpublished_count": Product.objects.filter(is_published=False).count()}
+    """Контекстный процессор для передачи количества неопубликованных продуктов во все шаблоны (страницы) магазина.
+    Значение ленивое: счетчик читается из кеша только тогда, когда шаблон действительно выводит бейдж (menu.html
+    показывает его только пользователям с правом 'can_change_product_publication')."""
+    return {"unpublished_count": SimpleLazyObject(UnpublishedProductsCounter.get)}
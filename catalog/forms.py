@@ -1,20 +1,23 @@
-import re
-
 from django import forms
 from django.core.exceptions import ValidationError
-from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
 
-from config.config import ALLOWED_IMAGE_FORMATS, FORBIDDEN_WORDS, MAX_IMAGE_SIZE
+from catalog.moderation import ForbiddenWordsMixin
+from catalog.uploads import SafeImageField
 
 from .models import Product
 
 
-class ProductForm(forms.ModelForm):
-    """Форма для добавления пользователем нового товара на странице add_your_product.html."""
+class ProductForm(ForbiddenWordsMixin, forms.ModelForm):
+    """Форма для добавления пользователем нового товара на странице add_your_product.html.
+    Название и описание проверяются на отсутствие запрещенных слов (ForbiddenWordsMixin)."""
+
+    forbidden_words_fields = ("product_name", "description")
 
     class Meta:
         model = Product
         fields = "__all__"
+        # Проверка формата (JPEG/PNG по сигнатуре файла), размера файла и размеров в пикселях до декодирования
+        field_classes = {"image": SafeImageField}
         widgets = {
             "product_name": forms.TextInput(attrs={"placeholder": "Введите название продукта (max: 100 символов)"}),
             "description": forms.Textarea(attrs={"placeholder": "Введите описание продукта"}),
@@ -45,29 +48,6 @@ class ProductForm(forms.ModelForm):
         # ШАГ 5: Делаю "owner" не редактируемым (отображается, но менять нельзя):
         self.fields["owner"].widget.attrs["disabled"] = True  # Запрещает редактирование
 
-    def clean_product_name(self):
-        """Валидация атрибута формы 'product_name', которая проверяет отсутствие запрещенных слов в данном поле."""
-        product_name = self.cleaned_data.get("product_name", "")
-        for word in FORBIDDEN_WORDS:
-            # Регулярное выражение проверяет запрещенное слово даже если оно будет написано без пробела или с
-            # точкой/запятой (например, "криптовалюта,").
-            # re.IGNORECASE - сделает регулярное выражение нечувствительным к регистру.
-            if re.search(rf"\b{word}\b", product_name, re.IGNORECASE):
-                # Django формы имеют атрибут self.fields['product_name'].label, который хранит читаемое имя поля (то,
-                # что будет видно в форме для пользователя, чтоб вывести в предупреждении потом красиво.)
-                field_label = self.fields["product_name"].label
-                raise ValidationError(f'Поле "{field_label}" не может содержать это слово')
-        return product_name
-
-    def clean_description(self):
-        """Валидация атрибута формы 'description', которая проверяет отсутствие запрещенных слов в данном поле."""
-        description = self.cleaned_data.get("description", "")
-        for word in FORBIDDEN_WORDS:
-            if re.search(rf"\b{word}\b", description, re.IGNORECASE):
-                field_label = self.fields["description"].label
-                raise ValidationError(f'Поле "{field_label}" не может содержать это слово')
-        return description
-
     def clean_price(self):
         """Валидация атрибута формы 'price', которая проверяет что цена не отрицательная."""
         price = self.cleaned_data.get("price")
@@ -76,25 +56,15 @@ class ProductForm(forms.ModelForm):
             raise ValidationError(f'Поле "{field_label}" не может быть отрицательным.')
         return price
 
-    def clean_image(self):
-        """Валидацию формата (JPEG/PNG) и размера (до 5 МБ) загружаемого пользователем изображения."""
-        image = self.cleaned_data.get("image")
-        if image:
-            # Сразу проверяю, является ли image загруженным файлом или он уже в БД. Суть в том, что image - это объект
-            # ImageFieldFile, а не UploadedFile, если файл уже загружен в базу данных. У ImageFieldFile нет атрибута
-            # content_type потому что image уже является ссылкой на файл в БД, а не на загруженный через форму файл.
-            # ЭТО ВЫЗЫВАЛО ОШИБКУ ПОСЛЕ ТОГО, КАК Я ИЗМНИЛ МОДЕЛЬ (добавил параметр is_published) И ПРИМЕНИЛ МИГРАЦИЮ.
-            # Ключевой момент: при первой загрузке через форму в request.FILES поле image содержало UploadedFile и
-            # ошибок не было, а после доработки модели Product в catalog/models.py и применения миграции поле image
-            # уже содержит ImageFieldFile которое не имеет content_type, поэтому и всплывала ошибка при редактировании.
-            if isinstance(image, (InMemoryUploadedFile, TemporaryUploadedFile)):
-                if image.content_type not in ALLOWED_IMAGE_FORMATS:
-                    raise ValidationError("Файл должен быть в формате JPEG или PNG.")
-                if image.size > MAX_IMAGE_SIZE:
-                    raise ValidationError("Размер изображения не должен превышать 5 МБ.")
-            else:
-                return image  # Если уже в БД, то просто возвращаю его без проверок content_type и size
-        return image
+
+class ProductAdminForm(ForbiddenWordsMixin, forms.ModelForm):
+    """Форма продукта в админке: те же проверки запрещенных слов, что и на сайте."""
+
+    forbidden_words_fields = ("product_name", "description")
+
+    class Meta:
+        model = Product
+        fields = "__all__"
 
 
 class ContactForm(forms.Form):
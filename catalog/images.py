@@ -0,0 +1,242 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models.signals import post_init, post_save, pre_save
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Папка внутри MEDIA_ROOT для производных изображений: derivatives/<путь оригинала без расширения>/<ширина>.<формат>
+DERIVATIVES_DIR = "derivatives"
+# Форматы производных изображений: расширение -> (формат Pillow, MIME-тип для <source type="...">)
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpg": ("JPEG", "image/jpeg")}
+# Ширины производных изображений по видам (можно переопределить в settings.IMAGE_DERIVATIVES["WIDTHS"])
+DEFAULT_WIDTHS = {"product": (250, 500, 1000), "article": (250, 500, 1000), "avatar": (40, 80, 160)}
+EXIF_ORIENTATION = 0x0112
+
+
+def get_option(name, default):
+    return getattr(settings, "IMAGE_DERIVATIVES", {}).get(name, default)
+
+
+def get_widths(kind):
+    """Ширины производных изображений для вида изображения ("product", "article", "avatar")."""
+    return tuple(sorted(get_option("WIDTHS", DEFAULT_WIDTHS)[kind]))
+
+
+def derivative_widths(widths, original_width):
+    """Функция возвращает ширины, которые реально создаются для оригинала: все ширины меньше оригинала и сама ширина
+    оригинала, если он меньше самой большой ширины (изображения не увеличиваются).
+    :param widths: Ширины вида изображения (по возрастанию).
+    :param original_width: Ширина оригинала.
+    :return: Список ширин по возрастанию."""
+    result = [width for width in widths if width < original_width]
+    if original_width <= widths[-1]:
+        result.append(original_width)
+    return result
+
+
+def storage_name(name):
+    """Имя файла в хранилище (в БД часть путей сохранена с префиксом "media/", см. фильтр media_filter)."""
+    name = str(name)
+    return name[len("media/"):] if name.startswith("media/") else name
+
+
+def derivative_dir(name):
+    """Папка производных изображений оригинала в хранилище, например derivatives/product_image/photo."""
+    return f"{DERIVATIVES_DIR}/{os.path.splitext(storage_name(name))[0]}"
+
+
+def derivative_name(name, width, ext):
+    """Имя производного изображения в хранилище, например derivatives/product_image/photo/250.webp."""
+    return f"{derivative_dir(name)}/{width}.{ext}"
+
+
+def render_derivatives(source_path, target_dir, widths, quality):
+    """Функция создает производные изображения (WebP и JPEG нужных ширин) для одного оригинала. Выполняется в
+    отдельном процессе (ProcessPoolExecutor), поэтому работает только с путями файлов и не обращается к Django.
+    :param source_path: Путь к оригиналу.
+    :param target_dir: Папка для производных изображений.
+    :param widths: Ширины вида изображения.
+    :param quality: Качество сжатия WebP/JPEG.
+    :return: Пара (ширина, высота) оригинала с учетом поворота из EXIF."""
+    with Image.open(source_path) as image:
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):  # Фото повернуто на 90°: меняю стороны местами
+            width, height = height, width
+        # Для JPEG декодирую сразу в уменьшенном масштабе (в разы быстрее и меньше памяти на больших фото)
+        image.draft("RGB", (widths[-1], widths[-1]))
+        image = ImageOps.exif_transpose(image)
+        os.makedirs(target_dir, exist_ok=True)
+        for target_width in derivative_widths(widths, width):
+            target_size = (target_width, max(round(height * target_width / width), 1))
+            resized = image if image.size == target_size else image.resize(target_size, Image.LANCZOS)
+            rgba = resized.convert("RGBA")
+            for ext, (image_format, _) in FORMATS.items():
+                if ext == "webp":
+                    converted = rgba
+                else:  # JPEG без прозрачности: прозрачный фон (PNG) заливаю белым, а не черным
+                    converted = Image.new("RGB", rgba.size, "white")
+                    converted.paste(rgba, mask=rgba.getchannel("A"))
+                path = os.path.join(target_dir, f"{target_width}.{ext}")
+                # Пишу во временный файл и переименовываю: страница никогда не получит недописанное изображение
+                converted.save(f"{path}.tmp", image_format, quality=quality, optimize=True)
+                os.replace(f"{path}.tmp", path)
+    return width, height
+
+
+class ImageSpec:
+    """Описание поля изображения модели, для которого создаются производные изображения."""
+
+    def __init__(self, model, field, kind, width_field, height_field):
+        self.model = model
+        self.field = field
+        self.kind = kind
+        self.width_field = width_field
+        self.height_field = height_field
+
+    def __repr__(self):
+        return f"<ImageSpec {self.model._meta.label}.{self.field} ({self.kind})>"
+
+
+class ImageDerivatives:
+    """Класс для создания производных изображений (миниатюры нескольких ширин в WebP и JPEG) после загрузки.
+    1) Поля изображений регистрируются методом register() в signals.py приложений: при смене файла ширина и высота
+       оригинала в модели сбрасываются, а после коммита транзакции задача уходит в пул процессов (ProcessPoolExecutor),
+       поэтому запрос пользователя не ждет обработку изображения;
+    2) когда процесс пула закончил, ширина и высота оригинала сохраняются в модели (save(update_fields=...)), поэтому
+       шаблоны строят srcset по полям модели и никогда не открывают файл изображения (ImageField.width);
+    3) пока производных изображений нет (ширина не заполнена), шаблоны выводят оригинал."""
+
+    specs: list[ImageSpec] = []
+    _executor = None
+    _executor_pid = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def register(cls, model, field, kind, width_field, height_field):
+        """Функция регистрирует поле изображения модели и подключает сигналы для отслеживания смены файла.
+        :param model: Класс модели.
+        :param field: Имя поля ImageField.
+        :param kind: Вид изображения (ключ в IMAGE_DERIVATIVES["WIDTHS"]).
+        :param width_field: Имя поля модели для ширины оригинала.
+        :param height_field: Имя поля модели для высоты оригинала."""
+        spec = ImageSpec(model, field, kind, width_field, height_field)
+        cls.specs.append(spec)
+        uid = f"image_derivatives:{model._meta.label}.{field}"
+        post_init.connect(partial(cls._remember_file, spec), sender=model, weak=False, dispatch_uid=uid)
+        pre_save.connect(partial(cls._file_changing, spec), sender=model, weak=False, dispatch_uid=uid)
+        post_save.connect(partial(cls._file_saved, spec), sender=model, weak=False, dispatch_uid=uid)
+        return spec
+
+    # --- Отслеживание смены файла ---
+
+    @staticmethod
+    def _loaded_attr(spec):
+        return f"_loaded_{spec.field}"
+
+    @classmethod
+    def _remember_file(cls, spec, sender, instance, **kwargs):
+        """Запоминаю имя файла на момент загрузки из БД (через __dict__, чтоб не загружать отложенное поле)."""
+        name = instance.__dict__.get(spec.field)
+        setattr(instance, cls._loaded_attr(spec), None if name is None else str(name))
+
+    @classmethod
+    def _file_changing(cls, spec, sender, instance, raw=False, **kwargs):
+        """Перед сохранением: если файл изменился, сбрасываю размеры (они относятся к старому файлу)."""
+        if raw:  # Загрузка фикстур
+            return
+        file = getattr(instance, spec.field)
+        loaded = getattr(instance, cls._loaded_attr(spec), None)
+        changed = (file and not file._committed) or (loaded is not None and (file.name or "") != loaded)
+        instance._image_changed = getattr(instance, "_image_changed", set())
+        if changed or (instance._state.adding and file):
+            instance._image_changed.add(spec.field)
+            setattr(instance, spec.width_field, None)
+            setattr(instance, spec.height_field, None)
+
+    @classmethod
+    def _file_saved(cls, spec, sender, instance, raw=False, **kwargs):
+        """После сохранения: новый файл отправляю в пул процессов (после коммита транзакции)."""
+        file = getattr(instance, spec.field)
+        setattr(instance, cls._loaded_attr(spec), file.name or "")
+        if spec.field in getattr(instance, "_image_changed", ()):
+            instance._image_changed.discard(spec.field)
+            if file:
+                name = file.name
+                transaction.on_commit(lambda: cls.schedule(spec, instance.pk, name))
+
+    # --- Пул процессов ---
+
+    @classmethod
+    def get_executor(cls):
+        """Пул процессов (один на процесс Django; после fork() воркера gunicorn создается заново). Процессы пула
+        запускаются методом "spawn": они не наследуют соединения с БД и Redis родительского процесса."""
+        with cls._executor_lock:
+            if cls._executor is None or cls._executor_pid != os.getpid():
+                cls._executor = ProcessPoolExecutor(
+                    max_workers=get_option("WORKERS", 2), mp_context=multiprocessing.get_context("spawn")
+                )
+                cls._executor_pid = os.getpid()
+            return cls._executor
+
+    @staticmethod
+    def task_args(spec, name):
+        """Аргументы render_derivatives() для файла. Процессы пула работают с путями файлов, поэтому нужно локальное
+        хранилище (FileSystemStorage, MEDIA_ROOT)."""
+        source_path = default_storage.path(storage_name(name))
+        target_dir = default_storage.path(derivative_dir(name))
+        return source_path, target_dir, get_widths(spec.kind), get_option("QUALITY", 80)
+
+    @classmethod
+    def schedule(cls, spec, pk, name):
+        """Функция отправляет создание производных изображений в пул процессов.
+        :param spec: Описание поля изображения (ImageSpec).
+        :param pk: ID объекта модели.
+        :param name: Имя файла изображения."""
+        future = cls.get_executor().submit(render_derivatives, *cls.task_args(spec, name))
+        future.add_done_callback(partial(cls._task_done, spec, pk, name))
+        return future
+
+    @classmethod
+    def _task_done(cls, spec, pk, name, future):
+        """Вызывается в служебном потоке пула: сохраняет размеры оригинала в модели."""
+        try:
+            cls.save_dimensions(spec, pk, name, future.result())
+        except Exception:
+            logger.exception("Не удалось создать производные изображения для %s", name)
+        finally:
+            connections.close_all()  # Соединения с БД служебного потока
+
+    @staticmethod
+    def save_dimensions(spec, pk, name, dimensions):
+        """Функция сохраняет размеры оригинала, если за время обработки файл объекта не сменился. Используется
+        save(update_fields=...), чтоб сработали сигналы модели (инвалидация кеша страниц с этим изображением).
+        :return: True, если размеры сохранены."""
+        instance = spec.model._default_manager.filter(pk=pk).first()
+        if instance is None or getattr(instance, spec.field).name != name:
+            return False
+        setattr(instance, spec.width_field, dimensions[0])
+        setattr(instance, spec.height_field, dimensions[1])
+        instance.save(update_fields=[spec.width_field, spec.height_field])
+        return True
+
+
+def get_srcset(name, original_width, kind, ext):
+    """Функция возвращает значение атрибута srcset производных изображений в одном формате.
+    :param name: Имя файла оригинала.
+    :param original_width: Ширина оригинала (из модели).
+    :param kind: Вид изображения.
+    :param ext: Формат ("webp" или "jpg").
+    :return: Список пар (URL, ширина) по возрастанию ширины."""
+    return [
+        (default_storage.url(derivative_name(name, width, ext)), width)
+        for width in derivative_widths(get_widths(kind), original_width)
+    ]
@@ -0,0 +1,308 @@
+import io
+import math
+import platform
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from catalog.cache_tags import invalidate_tags
+from catalog.models import Category, Product
+from catalog.services import CatalogDataService, UnpublishedProductsCounter
+
+SEED_PREFIX = "load-test"
+SEED_PASSWORD = "load-test-password"
+
+
+class WsgiClient:
+    """Клиент одного симулированного пользователя: вызывает WSGI-приложение напрямую (без сети и HTTP-сервера), как
+    его вызвал бы gunicorn/uWSGI, и хранит cookies между запросами (сессия, CSRF-токен)."""
+
+    def __init__(self, application):
+        self.application = application
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        """Функция выполняет запрос и полностью читает ответ.
+        :return: (код ответа, тело ответа в байтах)."""
+        body = urlencode(data or {}, doseq=True).encode()
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "HTTP_HOST": "localhost",
+            "HTTP_COOKIE": "; ".join(f"{name}={value}" for name, value in self.cookies.items()),
+            "CONTENT_TYPE": "application/x-www-form-urlencoded",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b"".join(result)
+        finally:
+            # close() отправляет сигнал request_finished (как после ответа настоящего сервера)
+            if hasattr(result, "close"):
+                result.close()
+        for name, value in response["headers"]:
+            if name.lower() == "set-cookie":
+                for morsel in SimpleCookie(value).values():
+                    if morsel["max-age"] == 0 or morsel["expires"].startswith("Thu, 01 Jan 1970"):
+                        self.cookies.pop(morsel.key, None)
+                    else:
+                        self.cookies[morsel.key] = morsel.value
+        return response["status"], content
+
+    def form_data(self, data):
+        """Данные формы с CSRF-токеном из cookie (cookie выставляет GET-запрос страницы с формой)."""
+        return {"csrfmiddlewaretoken": self.cookies.get(settings.CSRF_COOKIE_NAME, ""), **data}
+
+
+class SimulatedUser:
+    """Симулированный пользователь магазина: выполняет сценарии (главная, категории, продукт, вход, добавление
+    продукта) в случайном порядке с заданными весами и записывает время, код ответа и количество SQL-запросов
+    каждого запроса."""
+
+    def __init__(self, application, number, dataset, rng):
+        self.client = WsgiClient(application)
+        self.email = dataset["emails"][number]
+        self.dataset = dataset
+        self.rng = rng
+        self.logged_in = False
+        self.samples = []  # (имя запроса, код ответа, ожидаемый ли код, секунды, SQL-запросов)
+        self.queries = 0
+        self.created = 0
+
+    def count_queries(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def call(self, name, method, path, data=None, expected=200):
+        self.queries = 0
+        started = time.perf_counter()
+        try:
+            status, _ = self.client.request(method, path, data)
+        except Exception:
+            status = 0  # Исключение вне обработчика Django (в обычном запуске - 500 от WSGI-сервера)
+        elapsed = time.perf_counter() - started
+        self.samples.append((name, status, status == expected, elapsed, self.queries))
+        return status
+
+    def home(self):
+        self.call("home", "GET", reverse("catalog:home_page"))
+
+    def category(self):
+        category_id = self.rng.choice(self.dataset["category_ids"])
+        self.call("category", "GET", reverse("catalog:category_products_page", args=[category_id]))
+
+    def product(self):
+        self.ensure_login()
+        product_id = self.rng.choice(self.dataset["product_ids"])
+        self.call("product", "GET", reverse("catalog:product_detail_page", args=[product_id]))
+
+    def login(self):
+        if self.logged_in:
+            self.call("logout", "POST", reverse("users:logout"), self.client.form_data({}), expected=302)
+            self.logged_in = False
+        self.ensure_login()
+
+    def ensure_login(self):
+        if self.logged_in:
+            return
+        self.call("login_form", "GET", reverse("users:login"))
+        data = self.client.form_data({"username": self.email, "password": SEED_PASSWORD})
+        self.logged_in = self.call("login", "POST", reverse("users:login"), data, expected=302) == 302
+
+    def add_product(self):
+        self.ensure_login()
+        path = reverse("catalog:add_your_product_page")
+        self.call("add_product_form", "GET", path)
+        self.created += 1
+        data = {
+            "product_name": f"{SEED_PREFIX}-new-{self.email.split('@')[0]}-{self.created}",
+            "description": "Товар, добавленный нагрузочным тестом",
+            "price": self.rng.randint(1, 1000),
+            "category": self.rng.choice(self.dataset["category_ids"]),
+        }
+        self.call("add_product", "POST", path, self.client.form_data(data), expected=302)
+
+    def run(self, scenarios, deadline, think_time):
+        """Цикл пользователя до deadline (time.monotonic()): случайный сценарий с учетом весов, пауза think_time."""
+        names, weights = zip(*scenarios.items())
+        # У каждого потока свое соединение с БД: счетчик запросов подключаю к нему внутри потока
+        with connection.execute_wrapper(self.count_queries):
+            try:
+                while time.monotonic() < deadline:
+                    getattr(self, self.rng.choices(names, weights)[0])()
+                    if think_time:
+                        time.sleep(think_time)
+            finally:
+                connections.close_all()
+
+
+# Сценарии и веса по умолчанию (доля сценария в общем потоке запросов)
+DEFAULT_SCENARIOS = {"home": 30, "category": 30, "product": 30, "login": 5, "add_product": 5}
+
+
+def parse_scenarios(value):
+    """Разбор строки вида "home=30,category=30,product=30" в словарь сценарий -> вес.
+    :raise ValueError: Если сценарий неизвестен или вес не положительное число."""
+    scenarios = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_SCENARIOS:
+            raise ValueError(f"Неизвестный сценарий {name!r}: доступны {', '.join(DEFAULT_SCENARIOS)}.")
+        scenarios[name] = float(weight) if weight else DEFAULT_SCENARIOS[name]
+        if scenarios[name] <= 0:
+            raise ValueError(f"Вес сценария {name!r} должен быть больше 0.")
+    return scenarios
+
+
+def seed_dataset(categories, products, users):
+    """Функция создает тестовые данные (с префиксом SEED_PREFIX): категории, опубликованные продукты и пользователей
+    с паролем SEED_PASSWORD.
+    :return: Словарь с ID категорий, ID продуктов и email пользователей для сценариев."""
+    with transaction.atomic():
+        Category.objects.bulk_create(
+            Category(category_name=f"{SEED_PREFIX}-category-{i}", description="Категория нагрузочного теста")
+            for i in range(categories)
+        )
+        category_ids = list(
+            Category.objects.filter(category_name__startswith=f"{SEED_PREFIX}-").values_list("pk", flat=True)
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    product_name=f"{SEED_PREFIX}-product-{i}",
+                    description="Продукт нагрузочного теста. " * 10,
+                    price=i % 1000 + 1,
+                    category_id=category_ids[i % len(category_ids)],
+                    is_published=True,
+                )
+                for i in range(products)
+            ),
+            batch_size=1000,
+        )
+        product_ids = list(
+            Product.objects.filter(product_name__startswith=f"{SEED_PREFIX}-").values_list("pk", flat=True)
+        )
+        password = make_password(SEED_PASSWORD)  # Хеш считаю один раз на всех пользователей
+        emails = [f"{SEED_PREFIX}-{i}@example.com" for i in range(users)]
+        get_user_model().objects.bulk_create(get_user_model()(email=email, password=password) for email in emails)
+    # bulk_create не вызывает сигналы: сбрасываю кеш каталога сам
+    invalidate_tags("catalog:published", "catalog:categories")
+    CatalogDataService.invalidate_categories()
+    return {"category_ids": category_ids, "product_ids": product_ids, "emails": emails}
+
+
+def delete_dataset():
+    """Функция удаляет тестовые данные (в т.ч. продукты, добавленные сценарием add_product)."""
+    with transaction.atomic():
+        Product.objects.filter(product_name__startswith=f"{SEED_PREFIX}-").delete()
+        Category.objects.filter(category_name__startswith=f"{SEED_PREFIX}-").delete()
+        get_user_model().objects.filter(email__startswith=f"{SEED_PREFIX}-").delete()
+    UnpublishedProductsCounter.invalidate()
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(samples, elapsed):
+    """Статистика по выборке запросов: количество, ошибки, коды ответов, req/s, задержки (мс) и SQL-запросы."""
+    latencies = sorted(sample[3] * 1000 for sample in samples)
+    queries = [sample[4] for sample in samples]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if not sample[2]),
+        "statuses": dict(Counter(str(sample[1]) for sample in samples)),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "queries": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+            "max": max(queries, default=0),
+        },
+    }
+
+
+def run_load_test(application, dataset, users, duration, scenarios, think_time=0.0, random_seed=None):
+    """Функция запускает нагрузочный тест: users потоков-пользователей выполняют сценарии в течение duration секунд.
+    :return: Словарь с результатами (для JSON): окружение, итоги и статистика по каждому виду запроса."""
+    rng = random.Random(random_seed)
+    simulated = [
+        SimulatedUser(application, number, dataset, random.Random(rng.random())) for number in range(users)
+    ]
+    started_at = timezone.now()
+    started = time.monotonic()
+    threads = [
+        threading.Thread(target=user.run, args=(scenarios, started + duration, think_time)) for user in simulated
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    samples = [sample for user in simulated for sample in user.samples]
+    by_name = defaultdict(list)
+    for sample in samples:
+        by_name[sample[0]].append(sample)
+    return {
+        "started_at": started_at.isoformat(),
+        "environment": {
+            "database": connection.vendor,
+            "cache": settings.CACHES["default"]["BACKEND"],
+            "debug": settings.DEBUG,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        },
+        "config": {
+            "users": users,
+            "duration": duration,
+            "think_time": think_time,
+            "scenarios": scenarios,
+            "products": len(dataset["product_ids"]),
+            "categories": len(dataset["category_ids"]),
+        },
+        "elapsed": round(elapsed, 3),
+        "total": summarize(samples, elapsed),
+        "requests": {name: summarize(by_name[name], elapsed) for name in sorted(by_name)},
+    }
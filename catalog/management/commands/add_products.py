@@ -2,17 +2,26 @@ import os
 
 from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from catalog.models import Product
 
 
 class Command(BaseCommand):
-    help = "Кастомная команда для импорта данных Product из файла фикстуры."
+    help = (
+        "Кастомная команда для импорта данных Product из выгрузки create_product_fixture (products.jsonl.gz), а если ее "
+        "нет - из файла фикстуры products_fixture.json."
+    )
 
     def handle(self, *args, **kwargs):
-        # По заданию ДЗ, перед тем как создать выполняю удаление существующих записей
-        Product.objects.all().delete()
-        # Создаю путь до фикстуры
-        fixture_file = os.path.join("data/fixtures", "products_fixture.json")
-        call_command("loaddata", fixture_file)
-        self.stdout.write(self.style.SUCCESS("Успешный импорт данных из фикстуры."))
+        with transaction.atomic():  # При ошибке загрузки прежние записи не теряются
+            # По заданию ДЗ, перед тем как создать выполняю удаление существующих записей
+            Product.objects.all().delete()
+            # Создаю путь до выгрузки create_product_fixture и до фикстуры из репозитория
+            export_file = os.path.join("data/fixtures", "products.jsonl.gz")
+            fixture_file = os.path.join("data/fixtures", "products_fixture.json")
+            # Выгрузка create_product_fixture - тоже фикстура Django (сжатый JSONL): loaddata читает ее построчно и
+            # восстанавливает записи с теми же pk, владельцами и датами создания
+            source = export_file if os.path.exists(export_file) else fixture_file
+            call_command("loaddata", source)
+            self.stdout.write(self.style.SUCCESS(f"Успешный импорт данных из {source}."))
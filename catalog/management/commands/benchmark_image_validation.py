@@ -0,0 +1,114 @@
+import io
+import os
+import struct
+import timeit
+import zlib
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from catalog.uploads import SafeImageField
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для замера стоимости проверки загружаемых изображений (мс на 1 МБ файла): дешевая проверка "
+        "SafeImageField против стандартной forms.ImageField и полного декодирования изображения Pillow."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="640x480,1280x960,1920x1440",
+            help="Размеры тестовых изображений в пикселях через запятую (изображения заполняются шумом).",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Сколько раз повторять каждую проверку.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [tuple(int(side) for side in size.split("x")) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("Размеры указываются в формате ШИРИНАxВЫСОТА, например 1280x960.")
+
+        validators = {
+            "SafeImageField": SafeImageField().clean,
+            "forms.ImageField": forms.ImageField().clean,
+            "полное декодирование": self.decode,
+        }
+        totals = {name: [0.0, 0.0] for name in validators}  # Секунды и мегабайты для среднего "мс на МБ"
+
+        for width, height in sizes:
+            for image_format in ("JPEG", "PNG"):
+                data = self.make_image(width, height, image_format)
+                megabytes = len(data) / (1024 * 1024)
+                line = [f"{image_format:<4} {width}x{height} ({megabytes:.2f} МБ):"]
+                for name, validate in validators.items():
+                    seconds = self.measure(validate, data, image_format, options["repeat"])
+                    if seconds is None:
+                        line.append(f"{name}: отклонено")
+                        continue
+                    totals[name][0] += seconds
+                    totals[name][1] += megabytes
+                    line.append(f"{name}: {seconds * 1000:.2f} мс")
+                self.stdout.write(" | ".join(line))
+
+        for name, (seconds, megabytes) in totals.items():
+            if megabytes:
+                self.stdout.write(self.style.SUCCESS(f"{name}: {seconds * 1000 / megabytes:.2f} мс на 1 МБ"))
+
+        # "Декомпрессионная бомба": файл меньше 1 КБ с заголовком 50000x50000 пикселей (2.5 млрд пикселей)
+        bomb = self.make_png_bomb(50000, 50000)
+        seconds = self.measure(validators["SafeImageField"], bomb, "PNG", options["repeat"], expect_error=True)
+        self.stdout.write(f"Бомба {len(bomb)} байт (50000x50000): отклонена SafeImageField за {seconds * 1000:.3f} мс")
+
+    @staticmethod
+    def make_image(width, height, image_format):
+        """Изображение из случайного шума (худший случай для сжатия, поэтому файл максимального размера)."""
+        image = Image.frombytes("RGB", (width, height), os.urandom(width * height * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, image_format, **({"quality": 90} if image_format == "JPEG" else {}))
+        return buffer.getvalue()
+
+    @staticmethod
+    def make_png_bomb(width, height):
+        """PNG с огромными размерами в заголовке и почти пустыми данными."""
+
+        def chunk(chunk_type, payload):
+            body = chunk_type + payload
+            return struct.pack(">I", len(payload)) + body + struct.pack(">I", zlib.crc32(body))
+
+        header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+        return (
+            b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00" * 1024)) + chunk(b"IEND", b"")
+        )
+
+    @staticmethod
+    def decode(upload):
+        with Image.open(upload) as image:
+            image.load()
+
+    @staticmethod
+    def measure(validate, data, image_format, repeat, expect_error=False):
+        """Среднее время одной проверки (новый объект файла на каждый вызов, как при реальной загрузке).
+        :return: Секунды или None, если файл отклонен."""
+        content_type = Image.MIME[image_format]
+
+        def run():
+            validate(SimpleUploadedFile(f"image.{image_format.lower()}", data, content_type=content_type))
+
+        try:
+            run()
+        except (ValidationError, Image.DecompressionBombError):
+            if not expect_error:
+                return None
+        return timeit.timeit(lambda: Command.run_quietly(run), number=repeat) / repeat
+
+    @staticmethod
+    def run_quietly(run):
+        try:
+            run()
+        except (ValidationError, Image.DecompressionBombError):
+            pass
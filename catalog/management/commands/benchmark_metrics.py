@@ -0,0 +1,87 @@
+import tempfile
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from catalog.metrics import MetricsMiddleware, MetricsStore
+
+# Кеш на время замера: локальный, общий кеш Redis не затрагивается
+ISOLATED_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "metrics-bench"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для замера накладных расходов записи метрик (MetricsMiddleware) на один запрос к сайту: "
+        "один и тот же запрос (SQL-запросы и чтения из кеша) выполняется без middleware и через него, разница - "
+        "стоимость метрик. Завершается с ошибкой, если она больше --limit-us микросекунд."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000, help="Сколько запросов выполнить в одном замере.")
+        # По умолчанию - наибольший бюджет SQL-запросов страниц и чтения кеша страницы продукта без кеша страниц
+        parser.add_argument("--queries", type=int, default=7, help="SQL-запросов на запрос к сайту.")
+        parser.add_argument("--cache-gets", type=int, default=14, help="Чтений из кеша на запрос к сайту.")
+        parser.add_argument("--limit-us", type=float, default=50, help="Допустимые накладные расходы (мкс/запрос).")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["queries"] < 0 or options["cache_gets"] < 0:
+            raise CommandError("Количество запросов должно быть больше 0, SQL-запросов и чтений кеша - не меньше 0.")
+        path = reverse("catalog:home_page")
+        match = resolve(path)
+
+        def view(request):
+            """Имитация представления: резолвинг URL, SQL-запросы и чтения из кеша, без рендеринга."""
+            request.resolver_match = match
+            cache = caches["default"]
+            for i in range(options["cache_gets"]):
+                cache.get(f"metrics-bench-{i % 2}")  # Половина чтений - попадания
+            with connection.cursor() as cursor:
+                for _ in range(options["queries"]):
+                    cursor.execute("SELECT 1")
+            return HttpResponse()
+
+        with override_settings(CACHES=ISOLATED_CACHES), tempfile.TemporaryDirectory() as directory:
+            caches["default"].set("metrics-bench-0", 1)
+            request = RequestFactory().get(path)
+            middleware = MetricsMiddleware(view)
+            middleware.store = MetricsStore(directory, flush_interval=1.0)  # Файлы метрик - во временном каталоге
+
+            baseline, measured = self.measure(lambda: view(request), lambda: middleware(request), options["requests"])
+            recorded = sum(middleware.store.requests.values())
+
+        overhead = measured - baseline
+        self.stdout.write(
+            f"Запрос без метрик: {baseline:8.2f} мкс | с метриками: {measured:8.2f} мкс | "
+            f"накладные расходы: {overhead:6.2f} мкс (SQL-запросов: {options['queries']}, "
+            f"чтений кеша: {options['cache_gets']}, записано запросов: {recorded})"
+        )
+        if overhead > options["limit_us"]:
+            raise CommandError(f"Накладные расходы метрик {overhead:.2f} мкс больше {options['limit_us']} мкс.")
+        self.stdout.write(self.style.SUCCESS(f"Накладные расходы метрик не больше {options['limit_us']} мкс."))
+
+    @staticmethod
+    def measure(baseline_func, func, number, repeat=7):
+        """Замеры без метрик и с ними чередуются (одинаковый шум от других процессов), из repeat замеров по number
+        вызовов берется лучший. Каждый вариант выполняется в своем потоке: метрики ставят счетчики на кеш и
+        соединение с БД потока, и замер без метрик не должен их задевать.
+        :return: (мкс на вызов без метрик, мкс на вызов с метриками)."""
+        results = {baseline_func: [], func: []}
+        executors = {baseline_func: ThreadPoolExecutor(max_workers=1), func: ThreadPoolExecutor(max_workers=1)}
+        try:
+            for target, executor in executors.items():
+                executor.submit(target).result()  # Прогрев (соединение с БД, первые записи в словари)
+            for _ in range(repeat):
+                for target, executor in executors.items():
+                    results[target].append(executor.submit(timeit.timeit, target, number=number).result())
+        finally:
+            for executor in executors.values():
+                executor.submit(connections.close_all).result()
+                executor.shutdown()
+        return min(results[baseline_func]) / number * 1_000_000, min(results[func]) / number * 1_000_000
@@ -0,0 +1,91 @@
+import timeit
+
+from django.core.cache.backends.redis import RedisSerializer
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from catalog.models import Category, Product
+from catalog.paginators import KeysetPaginator
+from catalog.services import ProductCardList, ProductService
+
+SEED_PREFIX = "cache-bench"
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для сравнения кеша списка продуктов категории: список экземпляров Product (pickle) "
+        "против компактных карточек ProductCardList (marshal). Выводит размер данных в кеше и время десериализации."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--category", type=int, help="ID существующей категории для замера.")
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=1000,
+            help="Если категория не указана - сколько продуктов сгенерировать (данные откатываются после замера).",
+        )
+        parser.add_argument("--description-length", type=int, default=2000, help="Длина описания сгенерированных продуктов.")
+        parser.add_argument("--repeat", type=int, default=50, help="Сколько раз повторять десериализацию.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            category_id = options["category"]
+            if category_id is None:
+                category_id = self.seed(options["seed"], options["description_length"])
+            elif not Category.objects.filter(pk=category_id).exists():
+                raise CommandError(f"Категория с ID {category_id} не найдена.")
+            self.benchmark(category_id, options["repeat"])
+            transaction.set_rollback(True)
+
+    def seed(self, count, description_length):
+        category = Category.objects.create(category_name=f"{SEED_PREFIX}-category")
+        Product.objects.bulk_create(
+            (
+                Product(
+                    product_name=f"{SEED_PREFIX}-{i}",
+                    description="x" * description_length,
+                    image=f"product_image/{SEED_PREFIX}-{i}.png",
+                    price=i,
+                    category=category,
+                    is_published=True,
+                )
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+        return category.pk
+
+    def benchmark(self, category_id, repeat):
+        """Сериализую оба варианта так же, как это делает RedisCache (RedisSerializer), и замеряю размер,
+        полную десериализацию и десериализацию + выборку первой страницы через KeysetPaginator."""
+        serializer = RedisSerializer()
+        queryset = ProductService.get_category_queryset(category_id)
+        variants = {
+            "Product (pickle)": (serializer.dumps(list(queryset)), lambda data: serializer.loads(data)),
+            "ProductCardList (marshal)": (
+                serializer.dumps(ProductCardList.from_queryset(queryset).encode()),
+                lambda data: ProductCardList.decode(serializer.loads(data)),
+            ),
+        }
+
+        self.stdout.write(f"Продуктов в категории: {queryset.count()}")
+        results = {}
+        for name, (data, loads) in variants.items():
+            load_time = timeit.timeit(lambda: loads(data), number=repeat) / repeat
+            page_time = timeit.timeit(
+                lambda: KeysetPaginator(loads(data), 6, model=Product).page(None).object_list, number=repeat
+            ) / repeat
+            results[name] = (len(data), load_time)
+            self.stdout.write(
+                f"{name:<28} размер: {len(data):>10} байт | десериализация: {load_time * 1000:8.3f} мс | "
+                f"десериализация + страница: {page_time * 1000:8.3f} мс"
+            )
+
+        (old_size, old_time), (new_size, new_time) = results.values()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Размер меньше в {old_size / max(new_size, 1):.1f} раз, "
+                f"десериализация быстрее в {old_time / max(new_time, 1e-9):.1f} раз."
+            )
+        )
@@ -0,0 +1,74 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from catalog.images import ImageDerivatives, get_option, render_derivatives
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для создания производных изображений (миниатюры WebP/JPEG) для уже загруженных фото "
+        "продуктов, превью статей и аватаров, а также заполнения их ширины и высоты в БД."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Пересоздать производные изображения, даже если размеры уже заполнены."
+        )
+        parser.add_argument(
+            "--kind", choices=[spec.kind for spec in ImageDerivatives.specs], help="Обработать только один вид изображений."
+        )
+        parser.add_argument("--workers", type=int, default=get_option("WORKERS", 2), help="Количество процессов.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Сколько файлов отправлять в пул за раз.")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("Количество процессов должно быть больше 0.")
+        specs = [spec for spec in ImageDerivatives.specs if options["kind"] in (None, spec.kind)]
+        # Процессы пула запускаются методом "spawn", чтоб не наследовать соединение с БД этого процесса
+        with ProcessPoolExecutor(options["workers"], mp_context=multiprocessing.get_context("spawn")) as executor:
+            for spec in specs:
+                self.process(executor, spec, options["force"], options["batch_size"])
+
+    def process(self, executor, spec, force, batch_size):
+        """Обрабатывает все изображения одного поля модели пачками по batch_size файлов."""
+        queryset = spec.model._default_manager.exclude(**{f"{spec.field}__isnull": True}).exclude(**{spec.field: ""})
+        if not force:
+            queryset = queryset.filter(**{f"{spec.width_field}__isnull": True})
+        rows = queryset.order_by("pk").values_list("pk", spec.field)
+
+        started = time.monotonic()
+        done = failed = 0
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                done, failed = self.run_batch(executor, spec, batch, done, failed)
+                batch = []
+        if batch:
+            done, failed = self.run_batch(executor, spec, batch, done, failed)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{spec.model._meta.label}.{spec.field}: обработано {done}, ошибок {failed} за {elapsed:.1f} с "
+                f"({done / max(elapsed, 1e-9):.1f} изобр./с)."
+            )
+        )
+
+    def run_batch(self, executor, spec, batch, done, failed):
+        futures = {
+            executor.submit(render_derivatives, *ImageDerivatives.task_args(spec, name)): (pk, name) for pk, name in batch
+        }
+        for future in as_completed(futures):
+            pk, name = futures[future]
+            try:
+                ImageDerivatives.save_dimensions(spec, pk, name, future.result())
+                done += 1
+            except (OSError, ValueError, Image.DecompressionBombError) as error:  # Нет файла или это не изображение
+                failed += 1
+                self.stderr.write(f"{spec.model._meta.label} {pk} ({name}): {error}")
+        return done, failed
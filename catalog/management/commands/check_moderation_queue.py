@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from catalog.models import Category, Product
+from catalog.services import ModerationQueue, ProductService, UnpublishedProductsCounter
+
+SEED_PREFIX = "moderation-check"
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для проверки очереди модерации (ModerationQueue) под нагрузкой: несколько модераторов "
+        "(потоков) одновременно берут продукты в работу и публикуют их. Проверяет, что ни один продукт не разобран "
+        "дважды, и выводит пропускную способность для разного количества модераторов. Тестовые данные удаляются "
+        "после проверки. Запускать на Postgres: на SQLite нет SELECT ... FOR UPDATE SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--moderators", default="1,2,4,8", help="Количество модераторов через запятую (по прогону на каждое)."
+        )
+        parser.add_argument("--products", type=int, default=600, help="Сколько продуктов в очереди.")
+        parser.add_argument("--batch", type=int, default=6, help="Сколько продуктов модератор берет за раз.")
+        parser.add_argument(
+            "--review-ms", type=int, default=50, help="Сколько миллисекунд модератор разбирает одну пачку."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            moderator_counts = [int(value) for value in options["moderators"].split(",")]
+        except ValueError:
+            raise CommandError("Количество модераторов - числа через запятую, например 1,2,4,8.")
+        if min(moderator_counts) < 1 or options["products"] < 1 or options["batch"] < 1:
+            raise CommandError("Количество модераторов, продуктов и размер пачки должны быть больше 0.")
+
+        users = []
+        try:
+            category, users = self.seed(options["products"], max(moderator_counts))
+            queryset = Product.objects.filter(category=category)
+            failed = False
+            for count in moderator_counts:
+                # Перед каждым прогоном возвращаю все продукты в очередь
+                queryset.update(is_published=False, claimed_by=None, claim_expires_at=None)
+                elapsed, processed = self.run(queryset, users[:count], options["batch"], options["review_ms"] / 1000)
+                duplicates = [pk for pk, times in Counter(processed).items() if times > 1]
+                missed = options["products"] - len(set(processed))
+                line = (
+                    f"Модераторов: {count}, разобрано {len(processed)} продуктов за {elapsed:.2f} с "
+                    f"({len(processed) / elapsed:,.0f} продуктов/с)"
+                )
+                if duplicates or missed:
+                    failed = True
+                    self.stdout.write(
+                        self.style.ERROR(f"{line}: разобраны дважды: {len(duplicates)}, не разобраны: {missed}")
+                    )
+                else:
+                    self.stdout.write(self.style.SUCCESS(line))
+        finally:
+            self.cleanup(users)
+        if failed:
+            raise CommandError("Очередь модерации выдала один продукт нескольким модераторам.")
+
+    def seed(self, count, moderators):
+        category = Category.objects.create(category_name=f"{SEED_PREFIX}-category")
+        Product.objects.bulk_create(
+            Product(product_name=f"{SEED_PREFIX}-{i}", price=1, category=category, is_published=False)
+            for i in range(count)
+        )
+        user_model = get_user_model()
+        users = [user_model.objects.create(email=f"{SEED_PREFIX}-{i}@example.com") for i in range(moderators)]
+        return category, users
+
+    def run(self, queryset, users, batch, review_seconds):
+        """Прогон: каждый модератор в своем потоке берет пачку, "разбирает" ее и публикует, пока очередь не опустеет.
+        :return: (секунды, список ID всех разобранных продуктов с повторами)."""
+        processed = []
+        errors = []
+        lock = threading.Lock()
+
+        def moderate(user):
+            try:
+                while True:
+                    product_ids = ModerationQueue.claim(user, count=batch, queryset=queryset)
+                    if not product_ids:
+                        return
+                    time.sleep(review_seconds)
+                    published = ProductService.set_published(product_ids, True)
+                    with lock:
+                        processed.extend(published)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                # У каждого потока свое соединение с БД - закрываю его сам
+                connections.close_all()
+
+        threads = [threading.Thread(target=moderate, args=(user,)) for user in users]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if errors:
+            raise CommandError(f"Ошибка в потоке модератора: {errors[0]!r}")
+        return elapsed, processed
+
+    def cleanup(self, users):
+        Product.objects.filter(product_name__startswith=SEED_PREFIX).delete()
+        Category.objects.filter(category_name__startswith=SEED_PREFIX).delete()
+        get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+        # Публикации в прогонах меняли счетчик неопубликованных продуктов - пересчитываю его заново
+        UnpublishedProductsCounter.invalidate()
@@ -0,0 +1,116 @@
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from blog.models import Article
+from catalog.models import Category, ContactsData, Product
+from catalog.query_inspector import QueryRecorder, get_budget_method, get_query_budget
+
+SEED_PREFIX = "query-budget"
+# Проверяемые URLconf: пространство имен -> модуль
+URLCONFS = {"catalog": "catalog.urls", "blog": "blog.urls", "users": "users.urls"}
+# Кеш на время проверки: пустой локальный (худший случай - страница не в кеше), общий кеш Redis не затрагивается
+ISOLATED_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": SEED_PREFIX}}
+# Данные формы для представлений без GET (имя URL -> функция от тестовых данных): без них представление отвечает 400
+# раньше, чем выполнит свои запросы, и бюджет проверялся бы на ошибке
+POST_DATA = {
+    "catalog:products_bulk_publication": lambda data: {"action": "publish", "product_ids": data["unpublished_ids"]},
+}
+# Ожидаемый код ответа: страница (GET) отображается, действие (POST) перенаправляет на страницу
+EXPECTED_STATUS = {"GET": 200, "POST": 302}
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для проверки бюджетов SQL-запросов: открывает каждый URL из catalog.urls, blog.urls и "
+        "users.urls (с пустым кешем, от имени суперпользователя) и завершается с ошибкой, если страница ответила не "
+        "200 (действие POST - не 302), представление выполнило больше запросов, чем объявлено в его атрибуте "
+        "query_budget, бюджет не объявлен или найден N+1 (один и тот же запрос из одного места в цикле). Тестовые "
+        "данные откатываются после проверки."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=12, help="Сколько продуктов и статей сгенерировать.")
+        parser.add_argument("--verbose-sql", action="store_true", help="Вывести отпечатки всех запросов каждого URL.")
+
+    def handle(self, *args, **options):
+        if options["seed"] < 1:
+            raise CommandError("Количество тестовых записей должно быть больше 0.")
+        with override_settings(CACHES=ISOLATED_CACHES), transaction.atomic():
+            data = self.seed(options["seed"])
+            failures = []
+            for namespace, name, pattern in self.iter_patterns():
+                failures += self.check_url(namespace, name, pattern, data, options["verbose_sql"])
+            transaction.set_rollback(True)
+        if failures:
+            for failure in failures:
+                self.stdout.write(self.style.ERROR(failure))
+            raise CommandError(f"Нарушений бюджета запросов: {len(failures)}.")
+        self.stdout.write(self.style.SUCCESS("Все представления укладываются в бюджет запросов, N+1 не найдено."))
+
+    def seed(self, count):
+        user = get_user_model().objects.create_superuser(email=f"{SEED_PREFIX}@example.com", password=SEED_PREFIX)
+        category = Category.objects.create(category_name=f"{SEED_PREFIX}-category")
+        ContactsData.objects.update_or_create(id=1, defaults={"country": "Россия", "tax_id": "0", "address": "-"})
+        products = Product.objects.bulk_create(
+            Product(
+                product_name=f"{SEED_PREFIX}-{i}", price=i, category=category, owner=user, is_published=i % 2 == 0
+            )
+            for i in range(count * 2)
+        )
+        articles = Article.objects.bulk_create(
+            Article(article_title=f"{SEED_PREFIX}-{i}", article_contents="текст", is_published=True)
+            for i in range(count)
+        )
+        return {
+            "user": user,
+            "unpublished_ids": [product.pk for product in products if not product.is_published],
+            "kwargs": {
+                "catalog": {"pk": products[0].pk, "category_id": category.pk},
+                "blog": {"pk": articles[0].pk},
+                "users": {},
+            },
+        }
+
+    def iter_patterns(self):
+        for namespace, module in URLCONFS.items():
+            for pattern in import_module(module).urlpatterns:
+                yield namespace, pattern.name, pattern
+
+    def check_url(self, namespace, name, pattern, data, verbose_sql):
+        kwargs = {key: data["kwargs"][namespace][key] for key in pattern.pattern.converters}
+        url = reverse(f"{namespace}:{name}", kwargs=kwargs)
+        # POST - для представлений без GET (публикация продукта, выход и т.п.), с данными формы из POST_DATA
+        method = get_budget_method(pattern.callback)
+        post_data = POST_DATA.get(f"{namespace}:{name}", lambda data: {})(data)
+        client = Client()
+        client.force_login(data["user"])
+        with QueryRecorder() as recorder:
+            response = client.get(url) if method == "GET" else client.post(url, post_data)
+
+        budget = get_query_budget(pattern.callback)
+        self.stdout.write(
+            f"{method:<5}{url:<45}{response.status_code:>5}  запросов: {recorder.count:>3} / "
+            f"{'-' if budget is None else budget}"
+        )
+        if verbose_sql:
+            for query in recorder.queries:
+                self.stdout.write(f"        {query.origin}: {query.fingerprint}")
+
+        view_name = f"{namespace}:{name} ({url})"
+        if response.status_code != EXPECTED_STATUS[method]:
+            # Запросы ответа с ошибкой не показательны: бюджет не сравниваю
+            return [f"{view_name}: код ответа {response.status_code} вместо {EXPECTED_STATUS[method]}"]
+        failures = []
+        if budget is None:
+            failures.append(f"{view_name}: не объявлен бюджет запросов (атрибут query_budget представления)")
+        elif recorder.count > budget:
+            failures.append(f"{view_name}: {recorder.count} SQL-запросов при бюджете {budget}")
+        for query_fingerprint, origin, times in recorder.n_plus_one():
+            failures.append(f"{view_name}: N+1 - {times} x {query_fingerprint} ({origin})")
+        return failures
@@ -0,0 +1,129 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from blog.models import Article
+from blog.views import BlogListView
+from catalog.models import Category, Product
+from catalog.paginators import KeysetPaginator
+from catalog.services import ProductService
+from catalog.views import CatalogListView, CatalogUnpublishedListView
+
+SEED_PREFIX = "explain-seed"
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для проверки планов запросов (EXPLAIN) всех списков магазина. "
+        "Завершается с ошибкой, если какой-либо запрос выполняется через последовательное сканирование таблицы."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Сколько продуктов сгенерировать перед проверкой (данные удаляются после проверки).",
+        )
+        parser.add_argument("--categories", type=int, default=20, help="Сколько категорий сгенерировать.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise CommandError(f"Проверка планов запросов не поддерживается для БД '{connection.vendor}'.")
+
+        # Все сгенерированные данные откатываются вместе с транзакцией, поэтому команду можно запускать на любой БД
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"], options["categories"])
+            failures = self.check_plans(options["verbosity"])
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"Последовательное сканирование таблицы в запросах: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("Все запросы списков используют индексы."))
+
+    def seed(self, products_count, categories_count):
+        """Генерирует большой набор данных и обновляет статистику планировщика."""
+        categories = Category.objects.bulk_create(
+            Category(category_name=f"{SEED_PREFIX}-{i}") for i in range(categories_count)
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    product_name=f"{SEED_PREFIX}-{i}",
+                    price=i % 1000,
+                    category=random.choice(categories),
+                    is_published=random.random() < 0.9,
+                )
+                for i in range(products_count)
+            ),
+            batch_size=5000,
+        )
+        Article.objects.bulk_create(
+            (
+                Article(article_title=f"{SEED_PREFIX}-{i}", article_contents="-", is_published=random.random() < 0.9)
+                for i in range(max(products_count // 10, 1))
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for table in (Category._meta.db_table, Product._meta.db_table, Article._meta.db_table):
+                    cursor.execute(f"ANALYZE {table}")
+            else:
+                cursor.execute("ANALYZE")
+        self.stdout.write(f"Сгенерировано продуктов: {products_count}, категорий: {categories_count}.")
+
+    def get_targets(self):
+        """Возвращает пары (название, пагинатор) для всех списков магазина. QuerySet'ы берутся из самих
+        представлений, чтоб проверка ломалась при любом изменении их фильтров или сортировки."""
+        request = RequestFactory().get("/")
+        targets = []
+        for name, view_class in (
+            ("catalog:home_page", CatalogListView),
+            ("catalog:unpublished_products_page", CatalogUnpublishedListView),
+            ("blog:blog_page", BlogListView),
+        ):
+            view = view_class()
+            view.setup(request)
+            targets.append((name, view.get_paginator(view.get_queryset(), view.paginate_by)))
+
+        category = Category.objects.filter(products__is_published=True).order_by("-pk").first()
+        if category is not None:
+            paginator = KeysetPaginator(ProductService.get_category_queryset(category.pk), CatalogListView.paginate_by)
+            targets.append(("catalog:category_products_page", paginator))
+        return targets
+
+    def check_plans(self, verbosity):
+        """Проверяет планы первой страницы и "глубокой" страницы (из середины списка) для каждого списка."""
+        failures = []
+        for name, paginator in self.get_targets():
+            queryset = paginator.object_list
+            middle = queryset.order_by(*paginator.ordering)[queryset.count() // 2:][:1].first()
+            pages = {"первая страница": paginator.page_queryset()}
+            if middle is not None:
+                values = [getattr(middle, field.lstrip("-")) for field in paginator.ordering]
+                pages["глубокая страница"] = paginator.page_queryset(values)
+
+            for page_name, page_queryset in pages.items():
+                plan = page_queryset.explain()
+                scanned = self.find_sequential_scans(plan)
+                if scanned:
+                    failures.append(f"{name} ({page_name})")
+                    self.stdout.write(self.style.ERROR(f"{name} ({page_name}): Seq Scan по {', '.join(scanned)}"))
+                else:
+                    self.stdout.write(f"{name} ({page_name}): OK")
+                if verbosity > 1 or scanned:
+                    self.stdout.write(plan)
+        return failures
+
+    @staticmethod
+    def find_sequential_scans(plan):
+        """Ищет в плане запроса последовательное сканирование таблиц (Postgres: 'Seq Scan on ...',
+        SQLite: 'SCAN ...' без 'USING INDEX')."""
+        if connection.vendor == "postgresql":
+            return re.findall(r"Seq Scan on (\w+)", plan)
+        return re.findall(r"\bSCAN (\w+)\b(?! USING)", plan)
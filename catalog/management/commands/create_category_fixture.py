@@ -1,21 +1,23 @@
 import os
 
-from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
+from catalog.bulk_export import export_fixture
+
 
 class Command(BaseCommand):
-    help = "Кастомная команда для экспорта данных Category в файл фикстуры."
+    help = "Кастомная команда для экспорта данных Category в файл categories.jsonl.gz (фикстура Django в сжатом JSONL)."
 
     def handle(self, *args, **kwargs):
-        # Указываю путь для сохранения фикстуры
-        fixture_file = os.path.join("data/fixtures", "categories_fixture.json")
+        # Указываю путь для сохранения выгрузки
+        fixture_file = os.path.join("data/fixtures", "categories.jsonl.gz")
 
         # Создаю директорию, если её ещё нет
         os.makedirs(os.path.dirname(fixture_file), exist_ok=True)
 
-        # Вызываю dumpdata и формирую фикстуру
-        with open(fixture_file, "w", encoding="utf-8") as file:
-            call_command("dumpdata", "catalog.Category", stdout=file, indent=4)
+        # Выгружаю потоково (порциями из БД сразу в сжатый файл), а не через dumpdata: память не зависит от размера
+        # таблицы. Формат - фикстура Django (все поля, включая pk), ее загружает loaddata.
+        # Выгрузка для синхронизации в формате import_catalog (в т.ч. инкрементальная --since) - команда export_data
+        total = export_fixture("categories", fixture_file)
 
-        self.stdout.write(self.style.SUCCESS(f"Успешный экспорт данных в {fixture_file}"))
+        self.stdout.write(self.style.SUCCESS(f"Успешный экспорт данных в {fixture_file} (записей: {total})"))
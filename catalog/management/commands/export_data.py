@@ -0,0 +1,67 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.bulk_export import EXPORTS, export_jsonl, parse_since
+from catalog.bulk_import import format_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для потоковой выгрузки продуктов, категорий или статей в JSONL (в т.ч. сжатый .gz/.zst) "
+        "с постоянным расходом памяти. Поддерживает инкрементальную выгрузку записей, измененных с указанного момента."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=list(EXPORTS), help="Что выгружать.")
+        parser.add_argument("path", help="Путь к файлу: .jsonl, .jsonl.gz или .jsonl.zst (нужен пакет zstandard).")
+        parser.add_argument(
+            "--since",
+            help="Выгрузить только записи с updated_at не раньше этого момента (ISO 8601, например 2025-01-31T03:00). "
+            "Удаленные записи в такую выгрузку не попадают: чтоб учесть удаления, нужна полная выгрузка.",
+        )
+        parser.add_argument(
+            "--state-file",
+            help="Файл с моментом прошлой выгрузки для ночной синхронизации: если файл есть и --since не указан, "
+            "выгружаются изменения с этого момента; после успешной выгрузки в файл записывается время ее начала.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Сколько строк читать из БД за раз.")
+        parser.add_argument(
+            "--progress-every", type=int, default=100000, help="Выводить прогресс каждые N записей (0 - не выводить)."
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("Размер порции должен быть больше 0.")
+        since = options["since"]
+        state_file = options["state_file"]
+        if since is None and state_file and os.path.exists(state_file):
+            with open(state_file, encoding="utf-8") as file:
+                since = file.read().strip() or None
+
+        self.progress_every = self.next_report = options["progress_every"]
+        try:
+            stats = export_jsonl(
+                options["kind"],
+                options["path"],
+                since=parse_since(since) if since else None,
+                chunk_size=options["chunk_size"],
+                progress=self.report_progress,
+            )
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+
+        if state_file:
+            with open(state_file, "w", encoding="utf-8") as file:
+                file.write(stats["started_at"].isoformat())
+        period = f"изменения с {since}" if since else "все записи"
+        self.stdout.write(
+            self.style.SUCCESS(f"Выгружено в {options['path']} ({period}): {format_stats(stats, stats['elapsed'])}.")
+        )
+        self.stdout.write(f"Для следующей инкрементальной выгрузки: --since {stats['started_at'].isoformat()}")
+
+    def report_progress(self, stats, elapsed):
+        if self.next_report and stats["total"] >= self.next_report:
+            self.stdout.write(f"Выгружено {format_stats(stats, elapsed)}")
+            while self.next_report <= stats["total"]:
+                self.next_report += self.progress_every
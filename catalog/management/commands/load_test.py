@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.load_testing import DEFAULT_SCENARIOS, delete_dataset, parse_scenarios, run_load_test, seed_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для нагрузочного теста магазина внутри процесса: генерирует тестовые данные и вызывает "
+        "настоящее WSGI-приложение (config.wsgi.application) из нескольких потоков-пользователей по сценариям "
+        "(главная, категории, продукт, вход, добавление продукта). Выводит p50/p95/p99, req/s и количество SQL-запросов "
+        "на запрос и сохраняет результаты в JSON для сравнения прогонов. Тестовые данные удаляются после прогона."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Количество одновременных пользователей (потоков).")
+        parser.add_argument("--duration", type=float, default=30, help="Длительность теста в секундах.")
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(f"{name}={weight}" for name, weight in DEFAULT_SCENARIOS.items()),
+            help="Сценарии и их веса через запятую.",
+        )
+        parser.add_argument("--think-ms", type=int, default=0, help="Пауза пользователя между сценариями (мс).")
+        parser.add_argument("--products", type=int, default=2000, help="Сколько продуктов сгенерировать.")
+        parser.add_argument("--categories", type=int, default=20, help="Сколько категорий сгенерировать.")
+        parser.add_argument("--random-seed", type=int, help="Зерно генератора случайных чисел (повторяемые прогоны).")
+        parser.add_argument("--output", help="Файл для результатов в JSON.")
+        parser.add_argument("--baseline", help="JSON-результаты прошлого прогона для сравнения.")
+        parser.add_argument("--keep-data", action="store_true", help="Не удалять тестовые данные после прогона.")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["duration"] <= 0 or options["products"] < 1 or options["categories"] < 1:
+            raise CommandError("Количество пользователей, продуктов, категорий и длительность должны быть больше 0.")
+        try:
+            scenarios = parse_scenarios(options["scenarios"])
+        except ValueError as error:
+            raise CommandError(error)
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as file:
+                    baseline = json.load(file)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Не удалось прочитать {options['baseline']}: {error}")
+
+        # Импортирую здесь: модуль создает WSGI-приложение (как при запуске gunicorn/uWSGI)
+        from config.wsgi import application
+
+        dataset = seed_dataset(options["categories"], options["products"], options["users"])
+        try:
+            self.stdout.write(
+                f"Пользователей: {options['users']}, длительность: {options['duration']} с, сценарии: {scenarios}"
+            )
+            results = run_load_test(
+                application,
+                dataset,
+                options["users"],
+                options["duration"],
+                scenarios,
+                think_time=options["think_ms"] / 1000,
+                random_seed=options["random_seed"],
+            )
+        finally:
+            if not options["keep_data"]:
+                delete_dataset()
+
+        self.report(results, baseline)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты сохранены в {options['output']}.")
+        if results["total"]["errors"]:
+            self.stdout.write(self.style.WARNING(f"Запросов с неожиданным кодом ответа: {results['total']['errors']}."))
+
+    def report(self, results, baseline):
+        header = f"{'запрос':<18}{'кол-во':>8}{'ошибки':>8}{'req/s':>9}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'SQL':>7}"
+        if baseline:
+            header += f"{'p95 было':>10}{'req/s было':>12}"
+        self.stdout.write(header)
+        rows = list(results["requests"].items()) + [("ИТОГО", results["total"])]
+        for name, stats in rows:
+            latency = stats["latency_ms"]
+            line = (
+                f"{name:<18}{stats['requests']:>8}{stats['errors']:>8}{stats['rps']:>9.1f}{latency['p50']:>9.1f}"
+                f"{latency['p95']:>9.1f}{latency['p99']:>9.1f}{stats['queries']['mean']:>7.1f}"
+            )
+            if baseline:
+                old = baseline["total"] if name == "ИТОГО" else baseline["requests"].get(name)
+                if old:
+                    line += f"{old['latency_ms']['p95']:>10.1f}{old['rps']:>12.1f}"
+            self.stdout.write(line)
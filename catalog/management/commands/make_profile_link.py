@@ -0,0 +1,34 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.profiling import TRIGGER_PARAM, get_config, make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для получения ссылки на профилирование страницы: добавляет к URL подписанный токен "
+        f"(GET-параметр {TRIGGER_PARAM}) для сотрудника. Запрос по ссылке от имени этого сотрудника профилируется "
+        "целиком (ProfilingMiddleware), файлы профиля пишутся в PROFILING['DIR'], их имена - в заголовке X-Profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="URL или путь страницы, например /catalog/home/.")
+        parser.add_argument("--email", required=True, help="Email сотрудника (is_staff), который откроет ссылку.")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options["email"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"Пользователь {options['email']} не найден.")
+        if not user.is_staff:
+            raise CommandError(f"Пользователь {options['email']} не сотрудник (is_staff): профилирование недоступно.")
+
+        parts = urlsplit(options["url"])
+        query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != TRIGGER_PARAM]
+        query.append((TRIGGER_PARAM, make_token(user)))
+        self.stdout.write(urlunsplit(parts._replace(query=urlencode(query))))
+        self.stdout.write(
+            f"Ссылка действует {get_config()['TOKEN_MAX_AGE'] // 60} мин. и только для {user.email} (после входа)."
+        )
@@ -0,0 +1,62 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from catalog.load_testing import WsgiClient
+from catalog.memory import GROUP_BY, SnapshotTracker, format_diff, get_rss
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для поиска утечек памяти: вызывает WSGI-приложение (config.wsgi.application) внутри "
+        "процесса --requests раз для каждого URL и выводит строки кода (или модули), которые набрали память между "
+        "снимком tracemalloc после прогрева и снимком после всех запросов. Память, которая растет вместе с "
+        "количеством запросов (а не выходит на плато после прогрева), - кандидат в утечку."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "urls", nargs="*", help="Пути страниц (по умолчанию - главная и страница категорий каталога)."
+        )
+        parser.add_argument("--requests", type=int, default=200, help="Сколько раз открыть каждый URL после прогрева.")
+        parser.add_argument("--warmup", type=int, default=20, help="Сколько раз открыть каждый URL до первого снимка.")
+        parser.add_argument("--group", choices=GROUP_BY, default="lineno", help="Группировка: строки кода или модули.")
+        parser.add_argument("--top", type=int, default=20, help="Сколько мест с наибольшим ростом вывести.")
+        parser.add_argument("--frames", type=int, default=1, help="Глубина стека каждой аллокации в tracemalloc.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1 or options["warmup"] < 0 or options["top"] < 1 or options["frames"] < 1:
+            raise CommandError("Количество запросов, мест и глубина стека должны быть больше 0.")
+        urls = options["urls"] or [reverse("catalog:home_page"), reverse("catalog:category_products_page")]
+
+        # Импортирую здесь: модуль создает WSGI-приложение (как при запуске gunicorn/uWSGI)
+        from config.wsgi import application
+
+        client = WsgiClient(application)
+        tracker = SnapshotTracker()
+        tracker.start(options["frames"])
+        try:
+            self.run(client, urls, options["warmup"])
+            tracker.diff(reset=True)  # Снимок после прогрева: кеши, шаблоны и соединения уже созданы
+            rss_before = get_rss()
+            self.run(client, urls, options["requests"])
+            rows = tracker.diff(options["group"], options["top"])
+            rss_after = get_rss()
+        finally:
+            tracemalloc.stop()
+
+        self.stdout.write(f"URL: {', '.join(urls)}; запросов после прогрева: {options['requests']} на URL")
+        if rss_before is not None:
+            self.stdout.write(
+                f"RSS: {rss_before / 1024 / 1024:.1f} -> {rss_after / 1024 / 1024:.1f} МБ "
+                f"({(rss_after - rss_before) / 1024:+.0f} КБ)"
+            )
+        self.stdout.write(format_diff(rows))
+
+    def run(self, client, urls, times):
+        for _ in range(times):
+            for url in urls:
+                status, _ = client.request("GET", url)
+                if status >= 500:
+                    raise CommandError(f"{url}: код ответа {status}.")
@@ -0,0 +1,40 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.profiling import aggregate_files, collapsed, get_config, parse_collapsed, top_functions
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для сводного отчета профилирования каждого N-го запроса (PROFILING['SAMPLE_EVERY']): "
+        "суммирует стеки всех воркеров за последние --hours часов (по всем представлениям или одному --view), "
+        "выводит топ функций и сохраняет стеки в формате collapsed для flamegraph (--output)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24, help="За сколько последних часов суммировать стеки.")
+        parser.add_argument("--view", help="Имя URL представления, например catalog:home_page.")
+        parser.add_argument("--top", type=int, help="Сколько функций вывести (по умолчанию PROFILING['TOP']).")
+        parser.add_argument("--output", help="Файл для суммарных стеков в формате collapsed (flamegraph).")
+
+    def handle(self, *args, **options):
+        if options["hours"] < 1:
+            raise CommandError("Количество часов должно быть больше 0.")
+        config = get_config()
+        since = time.localtime(time.time() - options["hours"] * 60 * 60)
+        paths = aggregate_files(config["DIR"], since=since, view=options["view"])
+        if not paths:
+            raise CommandError(f"Нет стеков за {options['hours']} ч. в {config['DIR']} (включен ли SAMPLE_EVERY?).")
+
+        stacks = Counter()
+        for path in paths:
+            with open(path, encoding="utf-8") as file:
+                stacks.update(parse_collapsed(file))
+        self.stdout.write(f"Файлов: {len(paths)}, представление: {options['view'] or 'все'}")
+        self.stdout.write(top_functions(stacks, options["top"] or config["TOP"]))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(collapsed(stacks))
+            self.stdout.write(f"Стеки сохранены в {options['output']}.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from catalog.services import UnpublishedProductsCounter
+
+
+class Command(BaseCommand):
+    help = "Кастомная команда для пересчета счетчика неопубликованных продуктов (исправляет дрейф значения в кеше)."
+
+    def handle(self, *args, **kwargs):
+        cached, actual = UnpublishedProductsCounter.reconcile()
+        if cached == actual:
+            self.stdout.write(self.style.SUCCESS(f"Счетчик актуален: {actual}."))
+        else:
+            self.stdout.write(self.style.WARNING(f"Счетчик исправлен: {cached} -> {actual}."))
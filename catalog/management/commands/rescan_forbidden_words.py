@@ -0,0 +1,103 @@
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.models import Article
+from blog.services import ArticleService
+from catalog.models import Product
+from catalog.moderation import get_matcher, scan_rows
+from catalog.services import ProductService
+
+# Что проверяется: вид -> (модель, проверяемые поля (первое - название записи для отчета), функция снятия с публикации)
+SCAN_TARGETS = {
+    "products": (Product, ("product_name", "description"), ProductService.set_published),
+    "articles": (Article, ("article_title", "article_contents"), ArticleService.set_published),
+}
+# Ключ кеша с отпечатком списка слов, по которому выполнялась последняя полная проверка (для --if-changed)
+FINGERPRINT_CACHE_KEY = "moderation_forbidden_words_fingerprint"
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для повторной проверки всех продуктов и статей на запрещенные слова (после изменения "
+        "FORBIDDEN_WORDS в config/config.py) в пуле процессов. Найденные опубликованные записи снимаются с "
+        "публикации и попадают к модератору."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=list(SCAN_TARGETS), help="Проверить только продукты или только статьи.")
+        parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="Количество процессов.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Сколько записей отправлять в процесс за раз.")
+        parser.add_argument("--dry-run", action="store_true", help="Только вывести найденные записи, ничего не менять.")
+        parser.add_argument(
+            "--if-changed",
+            action="store_true",
+            help="Ничего не делать, если список слов не менялся с последней полной проверки.",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("Количество процессов и размер пачки должны быть больше 0.")
+        matcher = get_matcher()
+        if options["if_changed"] and cache.get(FINGERPRINT_CACHE_KEY) == matcher.fingerprint:
+            self.stdout.write(self.style.SUCCESS("Список запрещенных слов не менялся, проверка не нужна."))
+            return
+
+        self.max_pending = options["workers"] * 2
+        targets = [kind for kind in SCAN_TARGETS if options["kind"] in (None, kind)]
+        # Процессы пула запускаются методом "spawn", чтоб не наследовать соединение с БД этого процесса
+        with ProcessPoolExecutor(options["workers"], mp_context=multiprocessing.get_context("spawn")) as executor:
+            for kind in targets:
+                self.scan(executor, kind, matcher.words, options["chunk_size"], options["dry_run"])
+
+        if not options["dry_run"] and options["kind"] is None:
+            cache.set(FINGERPRINT_CACHE_KEY, matcher.fingerprint, timeout=None)
+
+    def submit(self, executor, pending, offenders, words, chunk):
+        if len(pending) >= self.max_pending:
+            offenders.update(pending.popleft().result())
+        pending.append(executor.submit(scan_rows, words, chunk))
+        return len(chunk)
+
+    def scan(self, executor, kind, words, chunk_size, dry_run):
+        model, fields, set_published = SCAN_TARGETS[kind]
+        started = time.monotonic()
+        rows = model._default_manager.order_by("pk").values_list("pk", *fields)
+
+        # Пачки читаются из БД серверным курсором и сразу отправляются в пул. В работе держу не больше двух пачек на
+        # процесс, чтоб вся таблица не оказалась в очереди пула (в памяти)
+        offenders, pending, scanned, chunk = {}, deque(), 0, []
+        for row in rows.iterator(chunk_size=chunk_size):
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                scanned += self.submit(executor, pending, offenders, words, chunk)
+                chunk = []
+        if chunk:
+            scanned += self.submit(executor, pending, offenders, words, chunk)
+        while pending:
+            offenders.update(pending.popleft().result())
+
+        names = dict(model._default_manager.filter(pk__in=offenders).values_list("pk", fields[0])) if offenders else {}
+        for pk, found in sorted(offenders.items())[:50]:
+            self.stdout.write(f"{kind} {pk} «{names.get(pk, '')}»: {', '.join(found)}")
+        if len(offenders) > 50:
+            self.stdout.write(f"... и еще {len(offenders) - 50}")
+
+        unpublished = []
+        if offenders and not dry_run:
+            offender_ids = list(offenders)
+            for start in range(0, len(offender_ids), 1000):
+                unpublished += set_published(offender_ids[start:start + 1000], False)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{kind}: проверено {scanned} за {elapsed:.1f} с ({scanned / max(elapsed, 1e-9):,.0f} зап./с), "
+                f"с запрещенными словами: {len(offenders)}, снято с публикации: {len(unpublished)}"
+                + (" (--dry-run, изменения не сохранены)." if dry_run else ".")
+            )
+        )
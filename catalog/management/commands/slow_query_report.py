@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from catalog.slow_queries import get_config, log_files, read_entries, summarize
+
+SORT_KEYS = ("total_ms", "count", "max_ms", "p95_ms", "avg_ms")
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для сводки журнала медленных SQL-запросов (SLOW_QUERIES['LOG_FILE']): группирует записи "
+        "всех воркеров за последние --hours часов по отпечатку запроса и выводит худшие запросы - количество, "
+        "суммарное, среднее, p95 и максимальное время, представления, места в коде и последний план EXPLAIN."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24, help="За сколько последних часов взять записи журнала.")
+        parser.add_argument("--view", help="Только запросы представления (имя URL, например catalog:home_page).")
+        parser.add_argument("--top", type=int, default=10, help="Сколько худших запросов вывести.")
+        parser.add_argument("--sort", choices=SORT_KEYS, default="total_ms", help="Порядок: по какому показателю.")
+        parser.add_argument("--no-explain", action="store_true", help="Не выводить планы EXPLAIN.")
+        parser.add_argument("--log", help="Файл журнала (по умолчанию SLOW_QUERIES['LOG_FILE']).")
+
+    def handle(self, *args, **options):
+        if options["hours"] < 1 or options["top"] < 1:
+            raise CommandError("Количество часов и запросов должно быть больше 0.")
+        path = options["log"] or get_config()["LOG_FILE"]
+        if not log_files(path):
+            raise CommandError(f"Журнал медленных запросов {path} не найден.")
+
+        since = datetime.now().astimezone() - timedelta(hours=options["hours"])
+        entries = read_entries(path, since)
+        if options["view"]:
+            entries = (entry for entry in entries if entry["view"] == options["view"])
+        summary = sorted(summarize(entries), key=lambda row: row[options["sort"]], reverse=True)
+        if not summary:
+            self.stdout.write(f"Медленных запросов за {options['hours']} ч. нет.")
+            return
+
+        self.stdout.write(
+            f"Разных медленных запросов: {len(summary)}, всего: {sum(row['count'] for row in summary)} "
+            f"за {options['hours']} ч."
+        )
+        for number, row in enumerate(summary[: options["top"]], start=1):
+            self.stdout.write("")
+            self.stdout.write(
+                self.style.WARNING(
+                    f"#{number}: {row['count']} раз, всего {row['total_ms']:.0f} мс, среднее {row['avg_ms']:.1f} мс, "
+                    f"p95 {row['p95_ms']:.1f} мс, макс. {row['max_ms']:.1f} мс"
+                )
+            )
+            self.stdout.write(f"  SQL: {row['fingerprint']}")
+            self.stdout.write(f"  Представления: {self.most_common(row['views'])}")
+            self.stdout.write(f"  Места в коде: {self.most_common(row['origins'])}")
+            if row["explain"] and not options["no_explain"]:
+                self.stdout.write("  EXPLAIN:")
+                for line in row["explain"].splitlines():
+                    self.stdout.write(f"    {line}")
+
+    @staticmethod
+    def most_common(counter, limit=3):
+        return ", ".join(f"{name} ({times})" for name, times in counter.most_common(limit))
@@ -0,0 +1,175 @@
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import tracemalloc
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from catalog.profiling import short_filename
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {"TRACEMALLOC": False, "TRACEMALLOC_FRAMES": 1, "MAX_RSS_MB": 0, "RSS_CHECK_EVERY": 10}
+# Аллокации самого tracemalloc и загрузчика модулей не относятся к утечкам приложения
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+GROUP_BY = ("lineno", "filename")
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "MEMORY", {})}
+
+
+def get_rss():
+    """Функция возвращает текущий RSS процесса в байтах (/proc/self/statm на Linux). Где /proc нет - пиковый RSS
+    (resource.getrusage), а если нет и его - None."""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024  # На Linux - в килобайтах
+
+
+class SnapshotTracker:
+    """Снимки памяти tracemalloc одного процесса: каждый вызов diff() сравнивает новый снимок с предыдущим (первый -
+    со снимком при старте отслеживания) и показывает, какие строки или модули кода набрали память за интервал."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.previous = None
+
+    def start(self, frames):
+        """Включает tracemalloc (если еще не включен, например PYTHONTRACEMALLOC) и делает базовый снимок."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        with self.lock:
+            self.previous = self.take()
+
+    @staticmethod
+    def take():
+        return tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+
+    def diff(self, group_by="lineno", limit=20, reset=True):
+        """Функция сравнивает текущий снимок с предыдущим.
+        :param group_by: "lineno" - по строкам кода, "filename" - по модулям.
+        :param limit: Сколько мест с наибольшим ростом вернуть.
+        :param reset: Запомнить текущий снимок как предыдущий (следующий diff() - за новый интервал).
+        :return: Список словарей (место, прирост и итог в байтах и количестве блоков) от наибольшего роста."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc не включен (MEMORY['TRACEMALLOC'] в settings.py).")
+        gc.collect()  # Недостижимые циклы не должны выглядеть как утечка
+        snapshot = self.take()
+        with self.lock:
+            previous = self.previous
+            if reset:
+                self.previous = snapshot
+        if previous is None:
+            stats = snapshot.statistics(group_by)
+        else:
+            stats = snapshot.compare_to(previous, group_by)
+        return [
+            {
+                "location": self.location(stat.traceback[0], group_by),
+                "size_diff": getattr(stat, "size_diff", stat.size),
+                "size": stat.size,
+                "count_diff": getattr(stat, "count_diff", stat.count),
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ]
+
+    @staticmethod
+    def location(frame, group_by):
+        filename = short_filename(frame.filename)
+        return filename if group_by == "filename" else f"{filename}:{frame.lineno}"
+
+
+tracker = SnapshotTracker()
+
+
+def memory_stats():
+    """Сводка по памяти текущего процесса: RSS, трассируемая tracemalloc память и сборщик мусора."""
+    rss = get_rss()
+    stats = {
+        "pid": os.getpid(),
+        "rss_mb": round(rss / 1024 / 1024, 1) if rss is not None else None,
+        "max_rss_mb": get_config()["MAX_RSS_MB"] or None,
+        "tracemalloc": tracemalloc.is_tracing(),
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        stats["traced_mb"] = round(current / 1024 / 1024, 1)
+        stats["traced_peak_mb"] = round(peak / 1024 / 1024, 1)
+    return stats
+
+
+def format_diff(rows):
+    """Результат SnapshotTracker.diff() в виде текстовой таблицы."""
+    lines = [f"{'прирост КБ':>12}{'всего КБ':>12}{'прирост блоков':>16}  место"]
+    for row in rows:
+        lines.append(
+            f"{row['size_diff'] / 1024:>12.1f}{row['size'] / 1024:>12.1f}{row['count_diff']:>16}  {row['location']}"
+        )
+    return "\n".join(lines)
+
+
+class MemoryMiddleware:
+    """Middleware для памяти воркеров:
+    1) MEMORY["TRACEMALLOC"] - включает tracemalloc при старте воркера (снимки - страница catalog:memory_stats для
+       персонала). Пока выключено, tracemalloc не работает и ничего не стоит;
+    2) MEMORY["MAX_RSS_MB"] - после каждого RSS_CHECK_EVERY-го запроса проверяет RSS воркера и, если он больше
+       лимита, отправляет воркеру SIGTERM: gunicorn дообрабатывает текущий запрос, завершает воркер и запускает
+       новый (память, набранная за время жизни воркера, возвращается системе).
+    Если обе настройки выключены, Django не подключает middleware."""
+
+    recycle_signal = signal.SIGTERM
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config["TRACEMALLOC"] and not config["MAX_RSS_MB"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if config["TRACEMALLOC"]:
+            tracker.start(config["TRACEMALLOC_FRAMES"])
+        self.max_rss = config["MAX_RSS_MB"] * 1024 * 1024
+        self.check_every = config["RSS_CHECK_EVERY"]
+        self.requests = 0
+        self.recycling = False
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if self.max_rss and not self.recycling:
+            self.requests += 1
+            if self.requests % self.check_every == 0:
+                self.check_rss()
+        return response
+
+    def check_rss(self):
+        rss = get_rss()
+        if rss is None or rss <= self.max_rss:
+            return
+        self.recycling = True
+        logger.warning(
+            "RSS воркера %d: %.1f МБ больше лимита %d МБ после %d запросов, воркер будет перезапущен",
+            os.getpid(),
+            rss / 1024 / 1024,
+            self.max_rss // 1024 // 1024,
+            self.requests,
+        )
+        os.kill(os.getpid(), self.recycle_signal)
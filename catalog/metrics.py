@@ -0,0 +1,492 @@
+import atexit
+import bisect
+import functools
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+try:
+    import fcntl
+except ImportError:  # Windows: файлы завершившихся воркеров не сворачиваются в архив
+    fcntl = None  # type: ignore[assignment]
+
+# Границы корзин гистограммы времени ответа (сек.), как у стандартных клиентов Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Метка представления для запросов, которые не дошли до URL из urls.py (404 резолвера, ответ middleware)
+UNRESOLVED_VIEW = "<unresolved>"
+DEFAULTS = {"ENABLED": True, "DIR": None, "TOKEN": "", "FLUSH_INTERVAL": 1.0}
+FILE_PREFIX = "metrics_"
+# Просуммированные метрики завершившихся воркеров (их файлы metrics_<pid>.json после этого удаляются)
+ARCHIVE_FILE = "archive.json"
+LOCK_FILE = ".lock"
+# Состояния предохранителя кеша (config.cache_backends.CircuitBreaker)
+BREAKER_STATES = ("closed", "open", "half_open")
+BREAKER_COUNTERS = ("opens", "failures", "fallback_operations")
+
+
+class MetricsStore:
+    """Метрики одного процесса (воркера gunicorn) в памяти. Раз в flush_interval секунд (после очередного запроса к
+    сайту) они сохраняются в свой файл metrics_<pid>.json в общем каталоге, а эндпоинт /metrics суммирует файлы всех
+    воркеров (merge()). Запись метрик - только изменение словарей под блокировкой (потоки воркера), поэтому почти
+    ничего не стоит, а файл пишется не чаще раза в flush_interval секунд.
+    Файлы завершившихся воркеров не копятся: при выходе процесса (retire()) и при сборе метрик (merge() - для
+    воркеров, убитых без atexit) их счетчики прибавляются к archive.json, а сами файлы удаляются, поэтому суммы
+    счетчиков Prometheus не уменьшаются."""
+
+    def __init__(self, directory, flush_interval):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Пустые метрики текущего процесса (также после fork(): дочерний процесс не должен повторять счетчики
+        родителя, например при gunicorn --preload)."""
+        self.pid = os.getpid()
+        self.path = os.path.join(self.directory, f"{FILE_PREFIX}{self.pid}.json")
+        if os.path.exists(self.path):
+            # Файл оставил убитый процесс с тем же pid: переношу его счетчики в архив, чтоб не затереть их своими
+            with _directory_lock(self.directory):
+                _archive(self.directory, [self.path])
+        self.requests = Counter()  # (представление, метод, код ответа) -> запросов
+        self.latency = {}  # (представление, метод) -> [количество по корзинам..., +Inf, сумма секунд]
+        self.db_queries = Counter()  # представление -> SQL-запросов
+        self.cache = Counter()  # (кеш, "hit"/"miss") -> чтений
+        self.service_cache = Counter()  # (сервис, "hit"/"miss") -> обращений
+        self.next_flush = time.monotonic() + self.flush_interval
+
+    def check_pid(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.reset()
+
+    def record_request(self, view, method, status, duration, queries, cache_counts):
+        """Учет запроса к сайту. cache_counts - счетчики кешей потока [(кеш, [попадания, промахи])], они переносятся
+        в метрики и обнуляются."""
+        self.check_pid()
+        with self.lock:
+            self.requests[view, method, status] += 1
+            histogram = self.latency.get((view, method))
+            if histogram is None:
+                histogram = self.latency[view, method] = [0] * (len(LATENCY_BUCKETS) + 2)
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+            histogram[-1] += duration
+            if queries:
+                self.db_queries[view] += queries
+            for alias, counts in cache_counts:
+                if counts[0]:
+                    self.cache[alias, "hit"] += counts[0]
+                    counts[0] = 0
+                if counts[1]:
+                    self.cache[alias, "miss"] += counts[1]
+                    counts[1] = 0
+        if time.monotonic() >= self.next_flush:
+            self.flush()
+
+    def record_service_cache(self, service, hit):
+        self.check_pid()
+        with self.lock:
+            self.service_cache[service, "hit" if hit else "miss"] += 1
+
+    def snapshot(self):
+        breakers = breaker_stats()
+        with self.lock:
+            return {
+                "requests": [[*key, value] for key, value in self.requests.items()],
+                "latency": [[*key, values] for key, values in self.latency.items()],
+                "db_queries": [[key, value] for key, value in self.db_queries.items()],
+                "cache": [[*key, value] for key, value in self.cache.items()],
+                "service_cache": [[*key, value] for key, value in self.service_cache.items()],
+                "cache_breakers": breakers,
+            }
+
+    def flush(self):
+        """Сохраняет метрики процесса в его файл атомарно (временный файл + os.replace()): читатель не увидит
+        недописанный файл."""
+        self.check_pid()
+        self.next_flush = time.monotonic() + self.flush_interval
+        _write_json(self.directory, self.path, self.snapshot())
+
+    def retire(self):
+        """Выход процесса (atexit): счетчики процесса прибавляются к архиву, а его файл удаляется."""
+        self.flush()
+        with _directory_lock(self.directory):
+            _archive(self.directory, [self.path])
+
+    def merge(self):
+        """Функция суммирует метрики всех процессов из файлов каталога и архива завершившихся воркеров. Файлы
+        завершившихся воркеров перед этим переносятся в архив. Все делается под блокировкой каталога: иначе другой
+        воркер мог бы прочитать и архив, и еще не удаленный файл, т.е. посчитать счетчики дважды.
+        :return: (метрики в формате snapshot() с просуммированными значениями, количество файлов процессов)."""
+        self.flush()
+        with _directory_lock(self.directory) as locked:
+            paths = glob.glob(os.path.join(self.directory, f"{FILE_PREFIX}*.json"))
+            if locked:
+                dead = [path for path in paths if not _process_alive(path)]
+                _archive(self.directory, dead)
+                paths = [path for path in paths if path not in dead]
+            totals = _empty_totals()
+            archive = _read_json(os.path.join(self.directory, ARCHIVE_FILE))
+            if archive is not None:
+                _add_snapshot(totals, archive, alive=False)
+            for path in paths:
+                data = _read_json(path)
+                if data is not None:  # Файл удален между glob() и open()
+                    _add_snapshot(totals, data, alive=_process_alive(path))
+        return totals, len(paths)
+
+
+def _empty_totals():
+    return {
+        "requests": Counter(),
+        "latency": {},
+        "db_queries": Counter(),
+        "cache": Counter(),
+        "service_cache": Counter(),
+        "breaker_states": Counter(),
+        "breaker_counters": Counter(),
+    }
+
+
+def _add_snapshot(totals, data, alive):
+    """Прибавляет метрики одного файла (формат MetricsStore.snapshot()) к суммам totals."""
+    for alias, state, *values in data.get("cache_breakers", ()):
+        if alive:  # Состояние - только работающих воркеров, счетчики - всех
+            totals["breaker_states"][alias, state] += 1
+        for name, value in zip(BREAKER_COUNTERS, values):
+            totals["breaker_counters"][alias, name] += value
+    for *key, value in data["requests"]:
+        totals["requests"][tuple(key)] += value
+    for view, method, values in data["latency"]:
+        total = totals["latency"].setdefault((view, method), [0] * len(values))
+        for i, value in enumerate(values):
+            total[i] += value
+    for view, value in data["db_queries"]:
+        totals["db_queries"][view] += value
+    for *key, value in data["cache"]:
+        totals["cache"][tuple(key)] += value
+    for *key, value in data["service_cache"]:
+        totals["service_cache"][tuple(key)] += value
+
+
+def _totals_snapshot(totals):
+    """Суммы _add_snapshot() обратно в формате snapshot() (для архива; состояние предохранителя не сохраняется)."""
+    return {
+        "requests": [[*key, value] for key, value in totals["requests"].items()],
+        "latency": [[*key, values] for key, values in totals["latency"].items()],
+        "db_queries": [[key, value] for key, value in totals["db_queries"].items()],
+        "cache": [[*key, value] for key, value in totals["cache"].items()],
+        "service_cache": [[*key, value] for key, value in totals["service_cache"].items()],
+        "cache_breakers": [
+            [alias, None, *(totals["breaker_counters"][alias, name] for name in BREAKER_COUNTERS)]
+            for alias in sorted({alias for alias, _ in totals["breaker_counters"]})
+        ],
+    }
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(directory, path, data):
+    """Сохраняет файл атомарно (временный файл + os.replace()): читатель не увидит недописанный файл."""
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@contextmanager
+def _directory_lock(directory):
+    """Блокировка каталога метрик между воркерами (flock на файле .lock). Без fcntl (Windows) блокировки нет и
+    возвращается False: тогда файлы в архив не переносятся."""
+    if fcntl is None:
+        yield False
+        return
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _archive(directory, paths):
+    """Прибавляет метрики файлов процессов paths к архиву и удаляет эти файлы (вызывать под _directory_lock()).
+    Если процесс упадет между записью архива и удалением файлов, их счетчики будут посчитаны дважды - окно в
+    несколько миллисекунд при выходе воркера."""
+    if fcntl is None:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    totals = _empty_totals()
+    archive = _read_json(archive_path)
+    if archive is not None:
+        _add_snapshot(totals, archive, alive=False)
+    archived = []
+    for path in paths:
+        data = _read_json(path)
+        if data is not None:
+            _add_snapshot(totals, data, alive=False)
+            archived.append(path)
+    if archived:
+        _write_json(directory, archive_path, _totals_snapshot(totals))
+        for path in archived:
+            os.unlink(path)
+
+
+def _process_alive(path):
+    """Работает ли процесс, которому принадлежит файл метрик metrics_<pid>.json (каталог метрик - локальный для
+    сервера, поэтому pid однозначно указывает на процесс)."""
+    try:
+        os.kill(int(os.path.basename(path)[len(FILE_PREFIX):-len(".json")]), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True  # Процесс есть, но принадлежит другому пользователю
+    return True
+
+
+def breaker_stats():
+    """Состояние и счетчики предохранителей кешей текущего процесса (только бэкенды с get_breaker_stats(), например
+    ResilientRedisCache): [[кеш, состояние, размыкания, ошибки Redis, операции в локальном кеше], ...]."""
+    stats = []
+    for alias in settings.CACHES:
+        get_breaker_stats = getattr(caches[alias], "get_breaker_stats", None)
+        if get_breaker_stats is not None:
+            breaker = get_breaker_stats()
+            stats.append([alias, breaker["state"], *(breaker[name] for name in BREAKER_COUNTERS)])
+    return stats
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, "METRICS", {})}
+    if not config["DIR"]:
+        config["DIR"] = os.path.join(settings.BASE_DIR, "metrics")
+    return config
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Хранилище метрик процесса (создается при первом обращении, при выходе процесса переносится в архив)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = get_config()
+                _store = MetricsStore(str(config["DIR"]), config["FLUSH_INTERVAL"])
+                atexit.register(_store.retire)
+    return _store
+
+
+def record_service_cache(service, hit):
+    """Учет попадания (hit=True) или промаха сервисного кеша (например, ProductService), если метрики включены."""
+    if _store is not None:
+        _store.record_service_cache(service, hit)
+
+
+# Счетчики текущего потока: обертки кешей и соединений с БД ставятся в потоке один раз (instrument_thread()) и только
+# увеличивают свой список-счетчик, поэтому почти ничего не добавляют к запросу к сайту
+_thread = threading.local()
+# Номер настроек CACHES/DATABASES: после их изменения (override_settings в командах) потоки ставят обертки заново
+_generation = 0
+
+
+@receiver(setting_changed)
+def _on_setting_changed(setting, **kwargs):
+    global _generation
+    if setting in ("CACHES", "DATABASES"):
+        _generation += 1
+
+
+def instrument_cache(backend):
+    """Функция подменяет get() и get_many() экземпляра бэкенда кеша на считающие попадания и промахи (один раз на
+    экземпляр: Django создает свой экземпляр кеша для каждого потока).
+    :return: Список-счетчик [попадания, промахи] экземпляра."""
+    counts = getattr(backend, "_metrics_counts", None)
+    if counts is not None:
+        return counts
+    counts = backend._metrics_counts = [0, 0]
+    get, get_many = backend.get, backend.get_many
+
+    @functools.wraps(get)
+    def counted_get(key, default=None, version=None):
+        value = get(key, default, version)
+        counts[value is default] += 1
+        return value
+
+    @functools.wraps(get_many)
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        values = get_many(keys, version)
+        counts[0] += len(values)
+        counts[1] += len(keys) - len(values)
+        return values
+
+    backend.get, backend.get_many = counted_get, counted_get_many
+    return counts
+
+
+def instrument_connection(connection):
+    """Функция ставит на соединение с БД (у каждого потока свое) обертку, которая считает SQL-запросы.
+    :return: Список-счетчик [SQL-запросы] соединения."""
+    counts = getattr(connection, "_metrics_counts", None)
+    if counts is not None:
+        return counts
+    counts = connection._metrics_counts = [0]
+
+    def count_query(execute, sql, params, many, context):
+        counts[0] += 1
+        return execute(sql, params, many, context)
+
+    # В начало списка: connection.execute_wrapper() (Server-Timing, QueryRecorder) снимает свою обертку с конца
+    # списка, и постоянная обертка не должна ему мешать
+    connection.execute_wrappers.insert(0, count_query)
+    return counts
+
+
+def instrument_thread():
+    """Функция ставит счетчики на кеши из CACHES и соединения с БД текущего потока (у каждого потока свои экземпляры
+    кешей и соединений, и они живут, пока жив поток)."""
+    _thread.generation = _generation
+    _thread.cache_counts = [(alias, instrument_cache(caches[alias])) for alias in settings.CACHES]
+    _thread.query_counts = [instrument_connection(connection) for connection in connections.all()]
+
+
+class MetricsMiddleware:
+    """Middleware для метрик сайта (эндпоинт /metrics в формате Prometheus): количество запросов по представлениям
+    (имя URL, например catalog:home_page), методам и кодам ответа, гистограмма времени ответа, SQL-запросы по
+    представлениям и попадания/промахи кешей. Метрики всех воркеров суммируются через файлы в METRICS["DIR"]."""
+
+    def __init__(self, get_response):
+        if not get_config()["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.store = get_store()
+
+    def __call__(self, request):
+        if getattr(_thread, "generation", None) != _generation:
+            instrument_thread()
+        query_counts = _thread.query_counts
+        queries = sum(counts[0] for counts in query_counts)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        self.store.record_request(
+            match.view_name if match else UNRESOLVED_VIEW,
+            request.method,
+            response.status_code,
+            duration,
+            sum(counts[0] for counts in query_counts) - queries,
+            _thread.cache_counts,
+        )
+        return response
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus(data, processes):
+    """Функция выводит просуммированные метрики (MetricsStore.merge()) в текстовом формате Prometheus."""
+    lines = [
+        "# HELP skystore_http_requests_total Запросы к сайту по представлениям, методам и кодам ответа.",
+        "# TYPE skystore_http_requests_total counter",
+    ]
+    for (view, method, status), value in sorted(data["requests"].items()):
+        lines.append(f"skystore_http_requests_total{_labels(view=view, method=method, status=status)} {value}")
+
+    lines += [
+        "# HELP skystore_http_request_duration_seconds Время ответа по представлениям и методам.",
+        "# TYPE skystore_http_request_duration_seconds histogram",
+    ]
+    for (view, method), values in sorted(data["latency"].items()):
+        cumulative = 0
+        for bound, value in zip((*LATENCY_BUCKETS, "+Inf"), values[:-1]):
+            cumulative += value
+            labels = _labels(view=view, method=method, le=bound)
+            lines.append(f"skystore_http_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(view=view, method=method)
+        lines.append(f"skystore_http_request_duration_seconds_sum{labels} {values[-1]:.6f}")
+        lines.append(f"skystore_http_request_duration_seconds_count{labels} {cumulative}")
+
+    lines += [
+        "# HELP skystore_db_queries_total SQL-запросы по представлениям.",
+        "# TYPE skystore_db_queries_total counter",
+    ]
+    for view, value in sorted(data["db_queries"].items()):
+        lines.append(f"skystore_db_queries_total{_labels(view=view)} {value}")
+
+    lines += [
+        "# HELP skystore_cache_requests_total Чтения из кеша (get/get_many) по кешам: попадания и промахи.",
+        "# TYPE skystore_cache_requests_total counter",
+    ]
+    for (alias, result), value in sorted(data["cache"].items()):
+        lines.append(f"skystore_cache_requests_total{_labels(cache=alias, result=result)} {value}")
+
+    lines += [
+        "# HELP skystore_service_cache_requests_total Обращения к кешу сервисов (ProductService): попадания и промахи.",
+        "# TYPE skystore_service_cache_requests_total counter",
+    ]
+    for (service, result), value in sorted(data["service_cache"].items()):
+        lines.append(f"skystore_service_cache_requests_total{_labels(service=service, result=result)} {value}")
+
+    lines += [
+        "# HELP skystore_cache_breaker_state Работающие воркеры по состоянию предохранителя кеша: closed - Redis "
+        "доступен, open - кеш в памяти процесса, half_open - пробный запрос к Redis.",
+        "# TYPE skystore_cache_breaker_state gauge",
+    ]
+    for alias in sorted({alias for alias, _ in data["breaker_counters"]}):
+        for state in BREAKER_STATES:
+            value = data["breaker_states"][alias, state]
+            lines.append(f"skystore_cache_breaker_state{_labels(cache=alias, state=state)} {value}")
+    for name, help_text in (
+        ("opens", "Размыкания предохранителя кеша (Redis недоступен)."),
+        ("failures", "Ошибки запросов к Redis (соединение, таймаут)."),
+        ("fallback_operations", "Операции кеша, выполненные в памяти процесса вместо Redis."),
+    ):
+        lines += [
+            f"# HELP skystore_cache_breaker_{name}_total {help_text}",
+            f"# TYPE skystore_cache_breaker_{name}_total counter",
+        ]
+        for (alias, counter), value in sorted(data["breaker_counters"].items()):
+            if counter == name:
+                lines.append(f"skystore_cache_breaker_{name}_total{_labels(cache=alias)} {value}")
+
+    lines += [
+        "# HELP skystore_metrics_processes Процессы (воркеры), чьи метрики просуммированы.",
+        "# TYPE skystore_metrics_processes gauge",
+        f"skystore_metrics_processes {processes}",
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+from config.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, зато индекс строится без блокировки записи в таблицу
+    atomic = False
+
+    dependencies = [
+        ("catalog", "0010_product_owner"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["-created_at", "-id"],
+                name="product_published_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_published", True)),
+                fields=["category", "-created_at", "-id"],
+                name="product_category_created_idx",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("is_published", False)),
+                fields=["-created_at", "-id"],
+                name="product_unpublished_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalog", "0011_product_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота фото"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина фото"
+            ),
+        ),
+    ]
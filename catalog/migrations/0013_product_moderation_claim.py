@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from config.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, зато индекс строится без блокировки записи в таблицу
+    atomic = False
+
+    dependencies = [
+        ("catalog", "0012_product_image_dimensions"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="claim_expires_at",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Захвачен до"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="claimed_by",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="claimed_products",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Модератор",
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(
+                condition=models.Q(("claimed_by__isnull", False)),
+                fields=["claimed_by"],
+                name="product_claimed_by_idx",
+            ),
+        ),
+    ]
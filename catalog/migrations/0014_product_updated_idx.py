@@ -0,0 +1,21 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+from config.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции, зато индекс строится без блокировки записи в таблицу
+    atomic = False
+
+    dependencies = [
+        ("catalog", "0013_product_moderation_claim"),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name="product",
+            index=models.Index(fields=["updated_at"], name="product_updated_idx"),
+        ),
+    ]
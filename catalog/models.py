@@ -25,6 +25,9 @@ class Product(models.Model):
     product_name = models.CharField(max_length=100, unique=True, blank=False, verbose_name="Наименование товара", help_text="Введите название товара")
     description = models.TextField(blank=True, verbose_name="Описание товара", help_text="Введите описание товара")
     image = models.ImageField(upload_to="product_image/", blank=True, null=True, verbose_name="Фотография товара", help_text="Загрузите фото товара")
+    # Размеры оригинала фото заполняются после создания производных изображений (catalog/images.py)
+    image_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина фото")
+    image_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота фото")
     category = models.ForeignKey(blank=True, verbose_name="Категория товара", to=Category, on_delete=models.CASCADE, related_name="products", help_text="Выберите категорию")
     price = models.FloatField(blank=False, null=False, verbose_name="Цена товара", help_text="Укажите цену товара")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -43,6 +46,20 @@ class Product(models.Model):
         help_text="Пользователь, создавший этот товар"
     )
 
+    # Захват продукта модератором в очереди модерации (ModerationQueue в catalog/services.py): кто разбирает продукт и
+    # до какого времени. После истечения срока продукт снова доступен другим модераторам
+    claimed_by = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        editable=False,
+        on_delete=models.SET_NULL,
+        related_name="claimed_products",
+        db_index=False,  # Вместо индекса по всей таблице - частичный индекс product_claimed_by_idx (см. Meta.indexes)
+        verbose_name="Модератор",
+    )
+    claim_expires_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Захвачен до")
+
     def __str__(self):
         """Метод определяет строковое представление объекта. Полезно для отображения объектов в админке/консоли."""
         return f"{self.product_name}"
@@ -55,6 +72,35 @@ class Product(models.Model):
         permissions = [
             ("can_change_product_publication", "Может управлять публикацией продукта (опубликовать / отменить)"),
         ]
+        # Частичные индексы под "горячие" запросы списков (keyset-пагинация по created_at, id):
+        indexes = [
+            # Главная страница: filter(is_published=True).order_by("-created_at", "-id")
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(is_published=True),
+                name="product_published_created_idx",
+            ),
+            # Страница категории: filter(category_id=..., is_published=True).order_by("-created_at", "-id")
+            models.Index(
+                fields=["category", "-created_at", "-id"],
+                condition=models.Q(is_published=True),
+                name="product_category_created_idx",
+            ),
+            # Очередь модератора: filter(is_published=False).order_by("-created_at", "-id")
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(is_published=False),
+                name="product_unpublished_idx",
+            ),
+            # Продукты, захваченные модератором: filter(claimed_by=...) (захвачено всегда немного продуктов)
+            models.Index(
+                fields=["claimed_by"],
+                condition=models.Q(claimed_by__isnull=False),
+                name="product_claimed_by_idx",
+            ),
+            # Инкрементальная выгрузка (export_data --since): filter(updated_at__gte=...)
+            models.Index(fields=["updated_at"], name="product_updated_idx"),
+        ]
 
 
 class ContactsData(models.Model):
@@ -0,0 +1,85 @@
+import hashlib
+import re
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+
+from config.config import FORBIDDEN_WORDS
+
+
+class ForbiddenWordsMatcher:
+    """Класс для поиска запрещенных слов в тексте. Весь список слов компилируется один раз в одно регулярное
+    выражение-альтернацию, поэтому текст просматривается за один проход, а не отдельным re.search() на каждое слово.
+    Границы слова - любой символ, который не является буквой/цифрой Unicode (как \\b в прежней проверке): слово
+    находится и с точкой или запятой после него ("криптовалюта,"), но не внутри другого слова ("крипта" не находится
+    в "криптовалюта")."""
+
+    def __init__(self, words):
+        """:param words: Запрещенные слова (регистр не важен)."""
+        self.words = frozenset(word.strip().lower() for word in words if word.strip())
+        # Длинные слова первыми: при общем начале ("крипта"/"криптовалюта") регулярное выражение не остановится на
+        # более коротком варианте там, где совпадает длинный
+        alternation = "|".join(re.escape(word) for word in sorted(self.words, key=len, reverse=True))
+        # Без re.IGNORECASE, текст приводится к нижнему регистру перед поиском: так поиск почти вдвое быстрее
+        self.pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)") if self.words else None
+
+    @property
+    def fingerprint(self):
+        """Отпечаток списка слов (меняется при изменении FORBIDDEN_WORDS)."""
+        return hashlib.md5("\n".join(sorted(self.words)).encode()).hexdigest()
+
+    def search(self, text):
+        """Функция возвращает первое найденное запрещенное слово или None."""
+        if not text or self.pattern is None:
+            return None
+        match = self.pattern.search(text.lower())
+        return match.group() if match else None
+
+    def find_all(self, text):
+        """Функция возвращает множество всех запрещенных слов в тексте."""
+        if not text or self.pattern is None:
+            return set()
+        return set(self.pattern.findall(text.lower()))
+
+
+@lru_cache(maxsize=8)
+def get_matcher(words=None):
+    """Функция возвращает скомпилированный поиск запрещенных слов (один объект на процесс для каждого списка слов).
+    :param words: frozenset слов; None - список FORBIDDEN_WORDS из config/config.py."""
+    return ForbiddenWordsMatcher(FORBIDDEN_WORDS if words is None else words)
+
+
+class ForbiddenWordsMixin:
+    """Миксин для ModelForm: проверяет отсутствие запрещенных слов в полях из forbidden_words_fields. Используется в
+    формах сайта (ProductForm, ArticleForm) и формах админки."""
+
+    forbidden_words_fields: tuple[str, ...] = ()
+
+    def clean(self):
+        cleaned_data = super().clean()
+        matcher = get_matcher()
+        for field_name in self.forbidden_words_fields:
+            if field_name in self.fields and matcher.search(cleaned_data.get(field_name)):
+                # Django формы имеют атрибут self.fields[...].label, который хранит читаемое имя поля (то, что видно
+                # в форме для пользователя), чтоб красиво вывести его в предупреждении
+                field_label = self.fields[field_name].label
+                self.add_error(
+                    field_name,
+                    ValidationError(f'Поле "{field_label}" не может содержать это слово', code="forbidden_word"),
+                )
+        return cleaned_data
+
+
+def scan_rows(words, rows):
+    """Функция ищет запрещенные слова в пачке строк. Выполняется в процессе пула (команда rescan_forbidden_words),
+    поэтому работает только с переданными данными и не обращается к БД.
+    :param words: frozenset запрещенных слов (выражение компилируется один раз на процесс пула).
+    :param rows: Список кортежей (id, текст, текст, ...).
+    :return: Список пар (id, отсортированный список найденных слов) только для строк с запрещенными словами."""
+    matcher = get_matcher(words)
+    offenders = []
+    for pk, *texts in rows:
+        found = set().union(*(matcher.find_all(text) for text in texts))
+        if found:
+            offenders.append((pk, sorted(found)))
+    return offenders
@@ -0,0 +1,254 @@
+import base64
+import binascii
+import datetime
+import json
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+    """Страница keyset-пагинации. Повторяет интерфейс django.core.paginator.Page (has_next/has_previous/number),
+    но вместо номеров соседних страниц отдает непрозрачные курсоры."""
+
+    def __init__(self, object_list, paginator, number, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<KeysetPage {self.number}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator(Paginator):
+    """Keyset (cursor) пагинатор. В отличие от стандартного Paginator не делает OFFSET и COUNT(*) на каждой странице:
+    следующая страница выбирается условием WHERE (created_at, id) < (последняя запись текущей страницы), поэтому
+    глубокие страницы открываются так же быстро, как первая.
+    Работает как с QuerySet, так и с уже готовым списком объектов (например, из кеша ProductService).
+    Общее количество записей (для отображения номеров страниц) берется из кеша, а не считается при каждом запросе.
+    Наследуется от Paginator, чтоб его можно было указать в paginator_class представлений на базе ListView."""
+
+    def __init__(self, object_list, per_page, ordering=("-created_at", "-id"), model=None, count_cache_key=None,
+                 count_timeout=60 * 5):
+        """:param object_list: QuerySet или список объектов.
+        :param per_page: Количество объектов на странице.
+        :param ordering: Поля ключа пагинации. Последнее поле должно быть уникальным (обычно 'id').
+        :param model: Модель объектов (нужна, если object_list - это список).
+        :param count_cache_key: Ключ кеша для общего количества записей (если None - номера страниц не считаются).
+        :param count_timeout: Время жизни закешированного количества записей (в секундах)."""
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(ordering)
+        self.model = model if model is not None else getattr(object_list, "model", None)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    def _check_object_list_is_ordered(self):
+        """Порядок записей задает сам пагинатор (ordering), предупреждение Paginator о несортированном QuerySet не
+        нужно."""
+
+    @property
+    def _is_queryset(self):
+        return hasattr(self.object_list, "filter")
+
+    @property
+    def _fields(self):
+        """Список пар (имя поля, признак сортировки по убыванию)."""
+        return [(field.lstrip("-"), field.startswith("-")) for field in self.ordering]
+
+    @cached_property
+    def count(self):
+        """Общее количество записей. Для списка - len(), для QuerySet - закешированный COUNT(*)."""
+        if not self._is_queryset:
+            return len(self.object_list)
+        if self.count_cache_key is None:
+            return None
+        return cache.get_or_set(self.count_cache_key, self.object_list.count, timeout=self.count_timeout)
+
+    @cached_property
+    def num_pages(self):
+        """Примерное количество страниц (по закешированному количеству записей)."""
+        if self.count is None:
+            return None
+        return max(1, math.ceil(self.count / self.per_page))
+
+    def encode_cursor(self, obj, direction, number):
+        """Кодирует ключ объекта, направление ('n' - вперед, 'p' - назад) и номер страницы в непрозрачный курсор."""
+        values = []
+        for name, _ in self._fields:
+            value = getattr(obj, name)
+            values.append(value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value)
+        payload = json.dumps({"v": values, "d": direction, "n": number}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Декодирует курсор. Возвращает (значения ключа, направление, номер страницы) или None,
+        если курсор пустой или испорчен (тогда открывается первая страница)."""
+        if not cursor:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            raw_values, direction, number = payload["v"], payload["d"], int(payload["n"])
+            if direction not in ("n", "p") or len(raw_values) != len(self.ordering):
+                return None
+            values = [
+                self.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self._fields, raw_values)
+            ]
+        except (binascii.Error, ValueError, TypeError, KeyError, FieldDoesNotExist, ValidationError):
+            return None
+        # Поля ключа пагинации не бывают NULL: курсор с null подделан (WHERE с None и сравнение в списке дали бы 500)
+        if any(value is None for value in values):
+            return None
+        # Время без часового пояса (подделанный курсор) привожу к текущему поясу, как это делает ORM: иначе в списке
+        # его нельзя сравнить со временем объектов
+        for i, value in enumerate(values):
+            if settings.USE_TZ and isinstance(value, datetime.datetime) and timezone.is_naive(value):
+                values[i] = timezone.make_aware(value)
+        return values, direction, max(number, 1)
+
+    def _keyset_q(self, values, backwards):
+        """Строит условие 'строго после курсора' (или 'строго до курсора' при backwards=True) для QuerySet:
+        (a < x) OR (a = x AND b < y) ... с учетом направления сортировки каждого поля."""
+        condition = Q()
+        for i, (name, descending) in enumerate(self._fields):
+            lookup = "lt" if descending != backwards else "gt"
+            part = Q(**{f"{name}__{lookup}": values[i]})
+            for (prev_name, _), prev_value in zip(self._fields[:i], values[:i]):
+                part &= Q(**{prev_name: prev_value})
+            condition |= part
+        return condition
+
+    def _is_after(self, obj, values, backwards):
+        """То же условие, что и в _keyset_q(), но для объекта из списка."""
+        for (name, descending), value in zip(self._fields, values):
+            current = getattr(obj, name)
+            if current == value:
+                continue
+            return current < value if descending != backwards else current > value
+        return False
+
+    @staticmethod
+    def _bisect(rows, predicate):
+        """Возвращает индекс первого объекта, для которого predicate истинно (predicate монотонно меняется
+        с False на True по ходу отсортированного списка)."""
+        low, high = 0, len(rows)
+        while low < high:
+            middle = (low + high) // 2
+            if predicate(rows[middle]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def page_queryset(self, values=None, backwards=False):
+        """Возвращает QuerySet одной страницы (per_page + 1 объектов) после (или до) ключа values.
+        Используется и самим пагинатором, и командой check_query_plans для проверки планов запросов."""
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(field[1:] if field.startswith("-") else f"-{field}" for field in ordering)
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_q(values, backwards))
+        return queryset[:self.per_page + 1]
+
+    def _fetch(self, values, backwards):
+        """Выбирает per_page + 1 объектов после (или до) курсора. Лишний объект нужен только для того,
+        чтоб понять, есть ли еще страница в этом направлении."""
+        limit = self.per_page + 1
+        if self._is_queryset:
+            items = list(self.page_queryset(values, backwards))
+        else:
+            # Список уже отсортирован по ключу пагинации, поэтому границу курсора ищу бинарным поиском и беру срез
+            # (для ленивых списков, например ProductCardList, создаются только объекты текущей страницы)
+            rows = self.object_list
+            if values is None:
+                items = list(rows[:limit])
+            elif backwards:
+                end = self._bisect(rows, lambda obj: not self._is_after(obj, values, backwards=True))
+                items = list(rows[max(end - limit, 0):end])[::-1]
+            else:
+                start = self._bisect(rows, lambda obj: self._is_after(obj, values, backwards=False))
+                items = list(rows[start:start + limit])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+        return items, has_more
+
+    def page(self, cursor=None):
+        """Возвращает страницу по курсору. Без курсора (или с испорченным курсором) - первая страница."""
+        decoded = self.decode_cursor(cursor)
+        if decoded is None:
+            items, has_next = self._fetch(None, backwards=False)
+            number, has_previous = 1, False
+        else:
+            values, direction, number = decoded
+            if direction == "n":
+                items, has_next = self._fetch(values, backwards=False)
+                has_previous = True
+            else:
+                items, has_previous = self._fetch(values, backwards=True)
+                has_next = True
+                if not has_previous:
+                    number = 1
+        next_cursor = self.encode_cursor(items[-1], "n", number + 1) if has_next and items else ""
+        # Для второй страницы ссылка "назад" ведет просто на первую страницу (без курсора)
+        previous_cursor = self.encode_cursor(items[0], "p", number - 1) if has_previous and items and number > 2 else ""
+        return KeysetPage(items, self, number, has_next and bool(items), has_previous, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """Миксин для ListView, который заменяет стандартную пагинацию (OFFSET + COUNT(*)) на keyset-пагинацию.
+    Номер страницы в URL заменяется курсором (?cursor=...)."""
+
+    paginator_class: type[Paginator] = KeysetPaginator
+    page_kwarg = "cursor"
+    keyset_ordering = ("-created_at", "-id")
+    count_cache_key: str | None = None  # Ключ кеша для общего количества записей
+
+    def get_count_cache_key(self):
+        return self.count_cache_key
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return self.paginator_class(
+            queryset,
+            per_page,
+            ordering=self.keyset_ordering,
+            model=self.model,
+            count_cache_key=self.get_count_cache_key(),
+            **kwargs,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        """Возвращает (paginator, page, object_list, is_paginated) как и стандартный MultipleObjectMixin."""
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(self.page_kwarg))
+        return paginator, page, page.object_list, page.has_other_pages()
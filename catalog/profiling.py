@@ -0,0 +1,289 @@
+import atexit
+import cProfile
+import glob
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+# GET-параметр с подписанным токеном, который включает профилирование запроса (см. команду make_profile_link)
+TRIGGER_PARAM = "_profile"
+SIGNING_SALT = "catalog.profiling"
+DEFAULTS = {
+    "ENABLED": True,
+    "DIR": None,
+    "ENGINE": "sampling",
+    "INTERVAL": 0.002,
+    "TOP": 30,
+    "TOKEN_MAX_AGE": 60 * 60,
+    "SAMPLE_EVERY": 0,
+    "ROLL_INTERVAL": 300,
+}
+AGGREGATE_DIR = "aggregate"
+UNRESOLVED_VIEW = "unresolved"
+
+# Префиксы путей, которые убираются из имен функций в стеках: site-packages и стандартная библиотека
+_LIBRARY_PATHS = (
+    *(path for path in sys.path if path.endswith(("site-packages", "dist-packages"))),
+    sysconfig.get_paths()["stdlib"],
+)
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, "PROFILING", {})}
+    if not config["DIR"]:
+        config["DIR"] = os.path.join(settings.BASE_DIR, "profiles")
+    config["DIR"] = str(config["DIR"])
+    return config
+
+
+def make_token(user):
+    """Подписанный токен для профилирования запросов от имени сотрудника user (действует TOKEN_MAX_AGE секунд)."""
+    return signing.dumps({"user": user.pk}, salt=SIGNING_SALT)
+
+
+def check_token(request, token, max_age):
+    """Токен подходит, только если его подпись верна, срок не истек и запрос выполняет тот же сотрудник."""
+    user = getattr(request, "user", None)
+    if user is None or not user.is_staff:
+        return False
+    try:
+        data = signing.loads(token, salt=SIGNING_SALT, max_age=max_age)
+    except signing.BadSignature:  # В т.ч. SignatureExpired
+        return False
+    return data.get("user") == user.pk
+
+
+def short_filename(filename):
+    """Путь к модулю относительно проекта или библиотек ("catalog/views.py", "django/db/models/query.py")."""
+    for prefix in (str(settings.BASE_DIR), *_LIBRARY_PATHS):
+        if filename.startswith(prefix):
+            return filename[len(prefix):].lstrip(os.sep)
+    return filename
+
+
+def frame_label(code):
+    """Имя функции в стеке: модуль и имя функции ("catalog/views.py:get")."""
+    return f"{short_filename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик одного потока: фоновый поток каждые interval секунд снимает стек профилируемого
+    потока (sys._current_frames()) и считает одинаковые стеки. Профилируемый код не замедляется вызовами
+    профилировщика на каждой функции (как у cProfile): стоимость - только сами снимки стека. Частота снимков
+    ограничена переключением GIL между потоками (sys.getswitchinterval(), 5 мс по умолчанию)."""
+
+    available = hasattr(sys, "_current_frames")
+
+    def __init__(self, interval, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()  # (функция корня, ..., функция листа) -> снимков
+        self._labels = {}  # code -> имя функции (кеш, чтоб не считать имя заново для каждого снимка)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if self._stopped.is_set():
+                break  # Снимок сделан уже после остановки (поток ждет join() в __exit__)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._labels.get(code)
+                if label is None:
+                    label = self._labels[code] = frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def collapsed(stacks):
+    """Стеки в формате "collapsed stacks" (flamegraph.pl, speedscope, inferno): "корень;...;лист количество"."""
+    return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def parse_collapsed(lines):
+    """Обратная функция для collapsed(): строки формата "корень;...;лист количество" -> Counter стеков."""
+    stacks = Counter()
+    for line in lines:
+        stack, _, count = line.rstrip("\n").rpartition(" ")
+        if stack and count.isdigit():
+            stacks[tuple(stack.split(";"))] += int(count)
+    return stacks
+
+
+def top_functions(stacks, limit):
+    """Топ функций по снимкам стека: собственное время (функция - лист стека) и общее (функция есть в стеке).
+    :return: Текстовая таблица."""
+    total = sum(stacks.values())
+    own, inclusive = Counter(), Counter()
+    for stack, count in stacks.items():
+        own[stack[-1]] += count
+        for label in set(stack):
+            inclusive[label] += count
+    lines = [f"Снимков стека: {total}", f"{'собств. %':>10}{'общее %':>10}  функция"]
+    for label, count in own.most_common(limit):
+        lines.append(f"{count / total * 100:>10.1f}{inclusive[label] / total * 100:>10.1f}  {label}")
+    lines.append("")
+    lines.append(f"{'общее %':>10}  функция (по общему времени)")
+    for label, count in inclusive.most_common(limit):
+        lines.append(f"{count / total * 100:>10.1f}  {label}")
+    return "\n".join(lines) + "\n"
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else UNRESOLVED_VIEW
+
+
+def _file_safe(name):
+    return name.replace(":", ".").replace(os.sep, "_")
+
+
+def write_atomic(path, content):
+    """Функция пишет файл через временный и os.replace(). Ошибка записи (нет места, нет прав на каталог) только
+    пишется в лог: из-за профиля запрос к сайту не должен заканчиваться ошибкой 500.
+    :return: True, если файл записан."""
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(tmp_path, path)
+    except OSError as error:
+        logger.warning("Файл профиля %s не записан: %s", path, error)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+class ProfileAggregator:
+    """Сумма стеков по представлениям для профилирования каждого N-го запроса. Раз в roll_interval секунд стеки
+    процесса сохраняются в каталог aggregate/<час>/ (по файлу на представление и процесс) и обнуляются; команда
+    profile_report суммирует файлы за нужный период."""
+
+    def __init__(self, directory, roll_interval):
+        self.directory = os.path.join(directory, AGGREGATE_DIR)
+        self.roll_interval = roll_interval
+        self.lock = threading.Lock()
+        self.stacks = defaultdict(Counter)
+        self.next_roll = time.monotonic() + roll_interval
+
+    def add(self, view, stacks):
+        with self.lock:
+            self.stacks[view].update(stacks)
+        if time.monotonic() >= self.next_roll:
+            self.roll()
+
+    def roll(self):
+        with self.lock:
+            self.next_roll = time.monotonic() + self.roll_interval
+            rolled, self.stacks = self.stacks, defaultdict(Counter)
+        hour = time.strftime("%Y%m%d%H")
+        suffix = f"{os.getpid()}_{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        for view, stacks in rolled.items():
+            path = os.path.join(self.directory, hour, f"{_file_safe(view)}__{suffix}.collapsed")
+            write_atomic(path, collapsed(stacks))
+
+
+def aggregate_files(directory, since=None, view=None):
+    """Файлы стеков профилирования каждого N-го запроса (ProfileAggregator), начиная с часа since (time.struct_time)
+    и только для представления view (если указано)."""
+    pattern = f"{_file_safe(view)}__*.collapsed" if view else "*.collapsed"
+    paths = glob.glob(os.path.join(directory, AGGREGATE_DIR, "*", pattern))
+    if since is not None:
+        since_hour = time.strftime("%Y%m%d%H", since)
+        paths = [path for path in paths if os.path.basename(os.path.dirname(path)) >= since_hour]
+    return sorted(paths)
+
+
+class ProfilingMiddleware:
+    """Middleware для профилирования запросов в продакшене:
+    1) по запросу сотрудника: запрос с GET-параметром _profile=<подписанный токен> (команда make_profile_link)
+       профилируется целиком, в каталог PROFILING["DIR"] пишутся стеки в формате collapsed (для flamegraph) и топ
+       функций, имя файлов - в заголовке ответа X-Profile;
+    2) каждый N-й (случайно, PROFILING["SAMPLE_EVERY"]) запрос профилируется сэмплирующим профилировщиком, стеки
+       суммируются по представлениям в отчеты каталога aggregate/ (команда profile_report)."""
+
+    def __init__(self, get_response):
+        self.config = get_config()
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_every = self.config["SAMPLE_EVERY"] if StackSampler.available else 0
+        self.aggregator = ProfileAggregator(self.config["DIR"], self.config["ROLL_INTERVAL"])
+        atexit.register(self.aggregator.roll)  # Стеки с прошлого сохранения - при выходе воркера
+
+    def __call__(self, request):
+        token = request.GET.get(TRIGGER_PARAM)
+        if token is not None and check_token(request, token, self.config["TOKEN_MAX_AGE"]):
+            return self.profile_request(request)
+        if self.sample_every and random.randrange(self.sample_every) == 0:
+            with StackSampler(self.config["INTERVAL"]) as sampler:
+                response = self.get_response(request)
+            self.aggregator.add(view_name(request), sampler.stacks)
+            return response
+        return self.get_response(request)
+
+    def profile_request(self, request):
+        """Профилирование одного запроса: сэмплирующим профилировщиком или cProfile (PROFILING["ENGINE"] = "cprofile"
+        или в интерпретаторе без sys._current_frames())."""
+        header = f"{request.method} {request.path}\n"
+        if self.config["ENGINE"] == "sampling" and StackSampler.available:
+            with StackSampler(self.config["INTERVAL"]) as sampler:
+                response = self.get_response(request)
+            base_path = self.profile_path(request)
+            files = [
+                path
+                for path, content in (
+                    (f"{base_path}.collapsed", collapsed(sampler.stacks)),
+                    (f"{base_path}.txt", header + top_functions(sampler.stacks, self.config["TOP"])),
+                )
+                if write_atomic(path, content)
+            ]
+        else:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            base_path = self.profile_path(request)
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(self.config["TOP"])
+            files = [f"{base_path}.txt"] if write_atomic(f"{base_path}.txt", header + report.getvalue()) else []
+            if files:  # Каталог доступен для записи
+                try:
+                    profiler.dump_stats(f"{base_path}.prof")  # Для snakeviz, flameprof и т.п.
+                    files.insert(0, f"{base_path}.prof")
+                except OSError as error:
+                    logger.warning("Файл профиля %s.prof не записан: %s", base_path, error)
+        if files:
+            response["X-Profile"] = ", ".join(os.path.basename(path) for path in files)
+        return response
+
+    def profile_path(self, request):
+        """Путь к файлам профиля без расширения: время, представление (известно после обработки запроса) и суффикс."""
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}_{_file_safe(view_name(request))}_{uuid.uuid4().hex[:6]}"
+        return os.path.join(self.config["DIR"], name)
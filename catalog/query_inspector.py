@@ -0,0 +1,163 @@
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+# Сколько одинаковых запросов (один отпечаток из одного места кода или шаблона) за запрос страницы считается N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE)
+
+RecordedQuery = namedtuple("RecordedQuery", ["fingerprint", "sql", "duration", "origin"])
+
+
+def fingerprint(sql):
+    """Функция приводит SQL к отпечатку: параметры, строки и числа заменяются на "?", списки IN (?, ?, ...) любой
+    длины - на IN (...), пробелы схлопываются. Запросы, которые отличаются только значениями, получают один отпечаток.
+    """
+    sql = _STRING.sub("?", sql.replace("%s", "?"))
+    sql = _SPACES.sub(" ", _NUMBER.sub("?", sql)).strip()
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def wrapper_code(wrapper):
+    """Код, который выполняется при вызове обертки execute_wrapper: функции, метода или объекта с __call__()."""
+    function = getattr(wrapper, "__func__", wrapper)
+    return getattr(function, "__code__", None) or getattr(type(wrapper).__call__, "__code__", None)
+
+
+def find_origin(connection=None):
+    """Функция возвращает место, откуда выполнен запрос: строку шаблона ("catalog/home.html:25"), если запрос
+    выполнен при рендеринге шаблона (например, {{ product.category }}), иначе строку кода проекта
+    ("catalog/views.py:97").
+    :param connection: Соединение с БД, если функция вызвана из обертки его execute_wrapper()."""
+    project_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    # Обертки execute_wrapper (метрики, Server-Timing, журнал медленных запросов) - тоже код проекта, но не место
+    # запроса: поиск начинаю снаружи цепочки оберток соединения (они вызывают друг друга напрямую)
+    if connection is not None:
+        codes = {wrapper_code(wrapper) for wrapper in connection.execute_wrappers}
+        wrapper_frame = frame
+        while wrapper_frame is not None and wrapper_frame.f_code not in codes:
+            wrapper_frame = wrapper_frame.f_back
+        if wrapper_frame is not None:
+            while wrapper_frame.f_back is not None and wrapper_frame.f_back.f_code in codes:
+                wrapper_frame = wrapper_frame.f_back
+            frame = wrapper_frame.f_back
+    code_location = None
+    while frame is not None:
+        # Самый внутренний узел шаблона (переменная или тег), который рендерился в момент запроса. Проверяю type(), а
+        # не isinstance(): isinstance() вычислил бы ленивый объект (например, request.user) и выполнил бы запрос
+        node = frame.f_locals.get("self")
+        if issubclass(type(node), Node) and node.origin is not None and node.token is not None:
+            return f"{node.origin.template_name or node.origin.name}:{node.token.lineno}"
+        filename = frame.f_code.co_filename
+        if (
+            code_location is None
+            and filename.startswith(project_dir)
+            and "site-packages" not in filename
+            and filename != __file__
+        ):
+            code_location = f"{os.path.relpath(filename, project_dir)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return code_location or "?"
+
+
+class QueryRecorder:
+    """Контекстный менеджер для записи всех SQL-запросов к БД (через connection.execute_wrapper()): SQL, отпечаток,
+    время выполнения и место в коде или шаблоне, откуда выполнен запрос.
+    Пример:
+        with QueryRecorder() as recorder:
+            response = client.get(url)
+        recorder.count, recorder.n_plus_one()"""
+
+    def __init__(self, using="default"):
+        self.using = using
+        self.queries = []
+        self._wrapper = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries.append(RecordedQuery(fingerprint(sql), sql, duration, find_origin(context["connection"])))
+
+    def __enter__(self):
+        self._wrapper = connections[self.using].execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def n_plus_one(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Функция находит N+1: один и тот же запрос (отпечаток), выполненный threshold и более раз из одного места
+        (т.е. в цикле - обычно обращение к связанному объекту при выводе списка).
+        :return: Список кортежей (отпечаток, место, количество) от самых частых."""
+        repeated = Counter((query.fingerprint, query.origin) for query in self.queries)
+        return [
+            (query_fingerprint, origin, times)
+            for (query_fingerprint, origin), times in repeated.most_common()
+            if times >= threshold
+        ]
+
+
+def get_query_budget(view_func):
+    """Бюджет SQL-запросов представления: атрибут query_budget класса представления (None - бюджет не объявлен).
+    Бюджет задается для отображения страницы (GET), а для представлений без GET (публикация, выход) - для POST."""
+    return getattr(getattr(view_func, "view_class", None), "query_budget", None)
+
+
+def get_budget_method(view_func):
+    """HTTP-метод, для которого задан бюджет запросов представления: "GET" или "POST" (если GET не поддерживается)."""
+    view_class = getattr(view_func, "view_class", None)
+    if view_class is None or ("get" in view_class.http_method_names and hasattr(view_class, "get")):
+        return "GET"
+    return "POST"
+
+
+class QueryInspectorMiddleware:
+    """Middleware для разработки: записывает все SQL-запросы каждого запроса к сайту и пишет в лог предупреждение,
+    если найден N+1 или представление превысило свой бюджет запросов (query_budget). Включается настройкой
+    QUERY_INSPECTOR (переменная окружения QUERY_INSPECTOR=True), в остальных случаях Django не подключает его."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSPECTOR", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        budget = get_query_budget(match.func) if match and request.method == get_budget_method(match.func) else None
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                "%s %s: %d SQL-запросов при бюджете %d (%s)",
+                request.method,
+                request.path,
+                recorder.count,
+                budget,
+                match.view_name,
+            )
+        for query_fingerprint, origin, times in recorder.n_plus_one():
+            logger.warning("N+1 %s %s: %d x %s (%s)", request.method, request.path, times, query_fingerprint, origin)
+        return response
@@ -0,0 +1,196 @@
+import functools
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+# Методы бэкенда кеша, время которых попадает в сегмент "cache"
+CACHE_METHODS = (
+    "add", "get", "set", "touch", "delete", "get_many", "set_many", "delete_many", "has_key", "incr", "decr",
+    "get_or_set",
+)
+DEFAULTS = {"ENABLED": True, "PUBLIC_HEADER": False, "LOG_SAMPLE_RATE": 0.01, "SLOW_MS": 1000}
+
+_current = ContextVar("server_timing", default=None)
+
+
+class RequestTimings:
+    """Время одного запроса к сайту по сегментам (db, cache, template, email). Время сегментов исключающее: запросы к
+    БД при рендеринге шаблона попадают в "db", а не в "template", поэтому сумма сегментов не больше общего времени."""
+
+    __slots__ = ("durations", "counts", "accounted", "in_cache")
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = Counter()
+        self.accounted = 0.0  # Время, уже отнесенное к сегментам (в т.ч. вложенным)
+        self.in_cache = False  # Идет вызов кеша (внутренние вызовы бэкенда, например get() из get_or_set(), не считаю)
+
+    def start(self):
+        return time.perf_counter(), self.accounted
+
+    def stop(self, name, token):
+        started, accounted_before = token
+        elapsed = time.perf_counter() - started
+        # Из времени сегмента вычитаю вложенные сегменты, которые закончились за это время
+        self.durations[name] += elapsed - (self.accounted - accounted_before)
+        self.counts[name] += 1
+        self.accounted = accounted_before + elapsed
+
+
+@contextmanager
+def track(name):
+    """Контекстный менеджер для замера сегмента name в текущем запросе к сайту (вне запроса ничего не делает).
+    Пример: with track("email"): ..."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    token = timings.start()
+    try:
+        yield
+    finally:
+        timings.stop(name, token)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    token = timings.start()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.stop("db", token)
+
+
+def _timed_cache_method(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        timings = _current.get()
+        if timings is None or timings.in_cache:
+            return method(*args, **kwargs)
+        timings.in_cache = True
+        token = timings.start()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings.in_cache = False
+            timings.stop("cache", token)
+
+    return wrapper
+
+
+def instrument_cache(backend):
+    """Функция подменяет методы экземпляра бэкенда кеша на замеряющие время (один раз на экземпляр: Django создает
+    свой экземпляр кеша для каждого потока)."""
+    if getattr(backend, "_server_timing", False):
+        return
+    for name in CACHE_METHODS:
+        setattr(backend, name, _timed_cache_method(getattr(backend, name)))
+    backend._server_timing = True
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with track("template"):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Бэкенд шаблонов Django (TEMPLATES в settings.py), который замеряет время рендеринга шаблонов для сегмента
+    "template" (TemplateResponse, render(), render_to_string(), в т.ч. страницы, которые рендерит кеш страниц)."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class ServerTimingMiddleware:
+    """Middleware для разбивки времени запроса к сайту по сегментам: запросы к БД (db), вызовы кеша (cache), рендеринг
+    шаблонов (template, бэкенд TimedDjangoTemplates), постановка писем в очередь (email) и остальное время (app).
+    1) Результат выводится в заголовке Server-Timing (вкладка Network / Timing в DevTools браузера): для персонала
+       (если пользователь уже загружен при обработке запроса) или для всех, если SERVER_TIMING["PUBLIC_HEADER"] (по
+       умолчанию - при DEBUG);
+    2) доля запросов SERVER_TIMING["LOG_SAMPLE_RATE"] и все запросы дольше SERVER_TIMING["SLOW_MS"] пишутся в лог
+       одной строкой JSON (логгер catalog.server_timing)."""
+
+    def __init__(self, get_response):
+        self.config = {**DEFAULTS, **getattr(settings, "SERVER_TIMING", {})}
+        if not self.config["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        reset_token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            for alias in settings.CACHES:
+                instrument_cache(caches[alias])
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_time_query))
+                response = self.get_response(request)
+        finally:
+            _current.reset(reset_token)
+        total = time.perf_counter() - started
+
+        if self.config["PUBLIC_HEADER"] or self.is_staff(request):
+            response["Server-Timing"] = self.header(timings, total)
+        total_ms = total * 1000
+        if total_ms >= self.config["SLOW_MS"] or random.random() < self.config["LOG_SAMPLE_RATE"]:
+            logger.info(json.dumps(self.log_record(request, response, timings, total_ms), ensure_ascii=False))
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        """Проверяю только уже загруженного пользователя: request.user - ленивый объект, и его загрузка ради заголовка
+        стоила бы запросов сессии и пользователя на страницах, которые пользователя не смотрят (кешированная
+        страница, статика). Персонал видит заголовок на всех страницах, где используется пользователь."""
+        user = getattr(request, "user", None)
+        if user is None or getattr(user, "_wrapped", None) is empty:
+            return False
+        return user.is_staff
+
+    @staticmethod
+    def header(timings, total):
+        parts = [
+            f'{name};dur={timings.durations[name] * 1000:.1f};desc="{timings.counts[name]}"'
+            for name in ("db", "cache", "template", "email")
+            if name in timings.counts
+        ]
+        parts.append(f"app;dur={(total - timings.accounted) * 1000:.1f}")
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+    @staticmethod
+    def log_record(request, response, timings, total_ms):
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            "app_ms": round(total_ms - timings.accounted * 1000, 2),
+        }
+        for name in ("db", "cache", "template", "email"):
+            record[f"{name}_ms"] = round(timings.durations[name] * 1000, 2)
+            record[f"{name}_count"] = timings.counts[name]
+        return record
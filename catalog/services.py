@@ -1,25 +1,335 @@
+import datetime
+import marshal
+from collections.abc import Sequence
+
 from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Left
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from catalog.cache_tags import invalidate_tags, tags_fingerprint
+from catalog.metrics import record_service_cache
+from catalog.models import Category, ContactsData, Product
+from catalog.single_flight import get_or_rebuild
+
+
+# Длина описания в карточке продукта (как в шаблонах: description | truncatechars:100)
+CARD_DESCRIPTION_LENGTH = 100
+# Версия формата строки карточки в кеше: увеличивается при изменении ProductCard.row_fields
+CARD_ROW_VERSION = 2
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+class ProductCard:
+    """Компактное представление продукта для карточек в списках (только поля, которые выводят шаблоны).
+    В отличие от экземпляра модели Product не тянет за собой полное описание, состояние ORM и связанные объекты."""
+
+    __slots__ = ("pk", "product_name", "price", "image", "image_width", "image_height", "description", "created_at")
+
+    # Порядок полей в строке кеша (и в values_list при выборке из БД)
+    row_fields = ("id", "product_name", "price", "image", "image_width", "image_height", "description", "created_at")
+
+    def __init__(self, pk, product_name, price, image, image_width, image_height, description, created_at):
+        self.pk = pk
+        self.product_name = product_name
+        self.price = price
+        self.image = image
+        self.image_width = image_width
+        self.image_height = image_height
+        self.description = description
+        self.created_at = created_at
+
+    @property
+    def id(self):
+        return self.pk
+
+    def __repr__(self):
+        return f"<ProductCard {self.pk}: {self.product_name}>"
+
+    def __str__(self):
+        return f"{self.product_name}"
+
+    @classmethod
+    def from_row(cls, row):
+        """Создает карточку из строки кеша (created_at хранится как количество микросекунд от начала эпохи)."""
+        pk, product_name, price, image, image_width, image_height, description, created_at = row
+        created_at = _EPOCH + datetime.timedelta(microseconds=created_at)
+        return cls(pk, product_name, price, image, image_width, image_height, description, created_at)
 
-from catalog.models import Product
+    @staticmethod
+    def to_row(values):
+        """Преобразует строку values_list() из БД в строку кеша (только простые типы, обрезанное описание)."""
+        pk, product_name, price, image, image_width, image_height, description, created_at = values
+        return (
+            pk,
+            product_name,
+            price,
+            image or "",
+            image_width,
+            image_height,
+            Truncator(description or "").chars(CARD_DESCRIPTION_LENGTH),
+            (created_at - _EPOCH) // datetime.timedelta(microseconds=1),
+        )
+
+
+class ProductCardList(Sequence):
+    """Ленивый список карточек продуктов. Хранит строки (кортежи простых типов) и создает объекты ProductCard
+    только при обращении к элементам, поэтому пагинатор создает карточки только для текущей страницы."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ProductCard.from_row(row) for row in self.rows[index]]
+        return ProductCard.from_row(self.rows[index])
+
+    def encode(self):
+        """Компактная бинарная сериализация (marshal) для хранения в кеше."""
+        return marshal.dumps(self.rows)
+
+    @classmethod
+    def decode(cls, data):
+        return cls(marshal.loads(data))
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        """Выбирает из БД только поля карточки (описание обрезается еще на стороне БД)."""
+        rows = queryset.values_list(
+            "id",
+            "product_name",
+            "price",
+            "image",
+            "image_width",
+            "image_height",
+            Left("description", CARD_DESCRIPTION_LENGTH + 1),
+            "created_at",
+        )
+        return cls(tuple(ProductCard.to_row(values) for values in rows))
 
 
 class ProductService:
     """Класс для сервисных функций по работе с продуктами (модель Product)."""
 
+    @staticmethod
+    def get_category_queryset(category_id):
+        """Функция возвращает QuerySet (без кеширования) опубликованных продуктов в указанной категории,
+        отсортированных от новых к старым.
+        :param category_id: ID категории.
+        :return: QuerySet продуктов."""
+        return (
+            Product.objects.filter(category_id=category_id, is_published=True)
+            .select_related("category")
+            .order_by("-created_at", "-id")  # "id" - уникальный ключ для keyset-пагинации
+        )
+
     @staticmethod
     def get_products_by_category(category_id):
-        """Функция со встроенным кешированием для получения списка всех продуктов в указанной категории.
+        """Функция со встроенным кешированием для получения списка карточек всех продуктов в указанной категории.
+        В кеше хранятся не экземпляры модели (pickle), а компактные строки с полями карточки в бинарном виде (marshal).
         :param category_id: ID категории.
-        :return: Список продуктов."""
-        cache_key = f"category_products_{category_id}"
-        products = cache.get(cache_key)
-
-        if products is None:  # Проверяю есть ли данные в кеше
-            products = list(  # Кеширую список (list), а не сам QuerySet так как это более безопасно и стабильно
-                Product.objects.filter(category_id=category_id, is_published=True)
-                .select_related("category")
-                .order_by("-created_at")
+        :return: Список карточек продуктов (ProductCardList)."""
+        # Версия значения - отпечаток тега категории: при изменении любого продукта категории (сигналы в
+        # catalog/signals.py) версия меняется и список пересобирается, без явного удаления ключа. Пересобирает его только
+        # один процесс, остальные в это время получают устаревший список (get_or_rebuild). Версии формата строки и
+        # marshal в ключе защищают от чтения данных, записанных другой версией кода или Python.
+        rebuilt = False
+
+        def build():
+            nonlocal rebuilt
+            rebuilt = True
+            return ProductCardList.from_queryset(ProductService.get_category_queryset(category_id)).encode()
+
+        data = get_or_rebuild(
+            f"category_cards_{category_id}_r{CARD_ROW_VERSION}_m{marshal.version}",
+            build,
+            timeout=60 * 15,
+            version=tags_fingerprint([f"category:{category_id}"]),
+        )
+        # Попадание - список взят из кеша (в т.ч. устаревший, пока его пересобирает другой процесс)
+        record_service_cache("ProductService.get_products_by_category", hit=not rebuilt)
+        return ProductCardList.decode(data)
+
+
+    @staticmethod
+    def set_published(product_ids, is_published):
+        """Функция массово публикует или снимает с публикации продукты одним UPDATE ... WHERE id IN (...).
+        QuerySet.update() не вызывает сигналы модели, поэтому счетчик неопубликованных продуктов и теги кеша
+        обновляются здесь же, одним вызовом на все продукты. Продукты, у которых статус уже такой, не меняются.
+        :param product_ids: ID продуктов.
+        :param is_published: Новый статус публикации.
+        :return: Список ID продуктов, статус которых изменился."""
+        with transaction.atomic():
+            # Блокирую строки, чтоб параллельный вызов не изменил те же продукты и не посчитал их в счетчике дважды
+            rows = list(
+                Product.objects.select_for_update()
+                .filter(pk__in=product_ids)
+                .exclude(is_published=is_published)
+                .values_list("pk", "category_id")
+            )
+            if not rows:
+                return []
+            changed_ids = [pk for pk, _ in rows]
+            # updated_at задаю явно: update() не заполняет auto_now (а по нему работает инкрементальная выгрузка)
+            # Захват в очереди модерации снимаю: продукт разобран
+            Product.objects.filter(pk__in=changed_ids).update(
+                is_published=is_published, updated_at=timezone.now(), claimed_by=None, claim_expires_at=None
+            )
+            UnpublishedProductsCounter.change(-len(rows) if is_published else len(rows))
+            invalidate_tags(
+                "catalog:published",
+                *(f"product:{pk}" for pk in changed_ids),
+                *{f"category:{category_id}" for _, category_id in rows},
+            )
+        return changed_ids
+
+
+class UnpublishedProductsCounter:
+    """Класс для счетчика неопубликованных продуктов, который хранится в кеше (Redis) и обновляется инкрементально
+    (сигналы модели Product в catalog/signals.py) вместо COUNT(*) на каждой странице магазина.
+    Если ключа в кеше нет (сброс Redis, истек срок), счетчик один раз пересчитывается из БД.
+    Возможный дрейф значения исправляет команда reconcile_unpublished_count."""
+
+    cache_key = "catalog_unpublished_count"
+
+    @classmethod
+    def get(cls):
+        """Функция возвращает текущее значение счетчика (при отсутствии в кеше - пересчитывает из БД).
+        :return: Количество неопубликованных продуктов."""
+        count = cache.get(cls.cache_key)
+        if count is None:
+            count = Product.objects.filter(is_published=False).count()
+            cache.add(cls.cache_key, count, timeout=None)  # add(), а не set(): не затираю параллельный incr()
+        return count
+
+    @classmethod
+    def change(cls, delta):
+        """Функция изменяет счетчик на delta после успешного коммита текущей транзакции (чтоб откаченные
+        изменения не попадали в счетчик).
+        :param delta: На сколько изменить счетчик (может быть отрицательным)."""
+        if delta:
+            transaction.on_commit(lambda: cls._incr(delta))
+
+    @classmethod
+    def _incr(cls, delta):
+        try:
+            cache.incr(cls.cache_key, delta)
+        except ValueError:
+            pass  # Ключа в кеше нет - значит счетчик будет пересчитан из БД при следующем get()
+
+    @classmethod
+    def invalidate(cls):
+        """Функция сбрасывает счетчик (он будет пересчитан из БД при следующем обращении)."""
+        transaction.on_commit(lambda: cache.delete(cls.cache_key))
+
+    @classmethod
+    def reconcile(cls):
+        """Функция пересчитывает счетчик из БД и записывает его в кеш.
+        :return: Пара (значение в кеше до пересчета, актуальное значение)."""
+        cached = cache.get(cls.cache_key)
+        actual = Product.objects.filter(is_published=False).count()
+        cache.set(cls.cache_key, actual, timeout=None)
+        return cached, actual
+
+
+class ModerationQueue:
+    """Класс для очереди модерации неопубликованных продуктов с захватом строк: каждый модератор получает свою пачку
+    продуктов, которую не видят другие модераторы, поэтому модераторы не разбирают одни и те же продукты.
+    1) Пачка выбирается через SELECT ... FOR UPDATE SKIP LOCKED: строки, которые в этот момент захватывает другой
+       модератор, пропускаются без ожидания его транзакции, поэтому модераторы не блокируют друг друга;
+    2) захват - аренда на время lease (claimed_by, claim_expires_at): если модератор ушел, не разобрав пачку, после
+       истечения срока продукты снова попадают в очередь;
+    3) публикация продукта (ProductService.set_published()) снимает захват."""
+
+    lease = datetime.timedelta(minutes=15)
+
+    @staticmethod
+    def available(now):
+        """Условие "продукт никем не захвачен или срок захвата истек"."""
+        return Q(claimed_by__isnull=True) | Q(claim_expires_at__lt=now)
+
+    @classmethod
+    def get_claimed(cls, user, queryset=None):
+        """Функция возвращает QuerySet продуктов, захваченных модератором (срок захвата не истек), от старых к новым."""
+        queryset = Product.objects.all() if queryset is None else queryset
+        return queryset.filter(claimed_by=user, is_published=False, claim_expires_at__gte=timezone.now()).order_by(
+            "created_at", "id"
+        )
+
+    @classmethod
+    def claim(cls, user, count=6, lease=None, queryset=None):
+        """Функция продлевает захват продуктов модератора и добирает до count следующими свободными продуктами
+        (самыми старыми неопубликованными).
+        :param user: Модератор.
+        :param count: Сколько продуктов должно быть в работе у модератора.
+        :param lease: Срок захвата (timedelta), по умолчанию ModerationQueue.lease.
+        :param queryset: Ограничение очереди (по умолчанию - все продукты).
+        :return: Список ID захваченных модератором продуктов."""
+        queryset = Product.objects.all() if queryset is None else queryset
+        now = timezone.now()
+        expires_at = now + (lease or cls.lease)
+        with transaction.atomic():
+            own = queryset.filter(claimed_by=user, is_published=False, claim_expires_at__gte=now)
+            missing = count - own.update(claim_expires_at=expires_at)
+            if missing > 0:
+                candidate_ids = list(
+                    queryset.select_for_update(skip_locked=True)
+                    .filter(cls.available(now), is_published=False)
+                    .order_by("created_at", "id")
+                    .values_list("pk", flat=True)[:missing]
+                )
+                if candidate_ids:
+                    # Условие свободы повторяю в UPDATE: на БД без SKIP LOCKED (SQLite) строку мог успеть захватить
+                    # другой модератор - тогда она просто не достанется этому
+                    queryset.filter(cls.available(now), pk__in=candidate_ids, is_published=False).update(
+                        claimed_by=user, claim_expires_at=expires_at
+                    )
+            return list(
+                queryset.filter(claimed_by=user, claim_expires_at=expires_at)
+                .order_by("created_at", "id")
+                .values_list("pk", flat=True)
             )
-            cache.set(cache_key, products, timeout=60 * 15)
 
-        return products
+    @classmethod
+    def release(cls, user, product_ids=None):
+        """Функция освобождает продукты, захваченные модератором (все или только указанные).
+        :return: Количество освобожденных продуктов."""
+        queryset = Product.objects.filter(claimed_by=user)
+        if product_ids is not None:
+            queryset = queryset.filter(pk__in=product_ids)
+        return queryset.update(claimed_by=None, claim_expires_at=None)
+
+
+class CatalogDataService:
+    """Класс для сервисных функций по работе с редко меняющимися данными каталога (категории, контакты магазина).
+    Данные кешируются и сбрасываются сигналами (catalog/signals.py), а в settings.py ключи этих данных попадают в
+    ближний уровень кеша (память процесса), поэтому обычно не требуют даже запроса к Redis."""
+
+    categories_cache_key = "catalog_categories"
+    contacts_cache_key = "catalog_contacts"
+
+    @classmethod
+    def get_categories(cls):
+        """Функция со встроенным кешированием для получения списка всех категорий.
+        :return: Список категорий."""
+        return cache.get_or_set(cls.categories_cache_key, lambda: list(Category.objects.all()), timeout=60 * 60)
+
+    @classmethod
+    def get_contacts_data(cls):
+        """Функция со встроенным кешированием для получения контактных данных магазина.
+        :return: Объект ContactsData или None, если контакты не заполнены."""
+        return cache.get_or_set(cls.contacts_cache_key, lambda: ContactsData.objects.filter(id=1).first(), timeout=60 * 60)
+
+    @classmethod
+    def invalidate_categories(cls):
+        transaction.on_commit(lambda: cache.delete(cls.categories_cache_key))
+
+    @classmethod
+    def invalidate_contacts_data(cls):
+        transaction.on_commit(lambda: cache.delete(cls.contacts_cache_key))
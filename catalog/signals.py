@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from catalog.cache_tags import invalidate_tags
+from catalog.images import ImageDerivatives
+from catalog.models import Category, ContactsData, Product
+from catalog.services import CatalogDataService, UnpublishedProductsCounter
+
+
+@receiver(post_init, sender=Product)
+def remember_loaded_state(sender, instance, **kwargs):
+    """Запоминаю статус публикации и категорию продукта на момент загрузки из БД, чтоб при сохранении понять, что
+    изменилось. Читаю через __dict__, чтоб не вызывать лишний запрос, если поле было отложено (defer/only)."""
+    instance._loaded_is_published = instance.__dict__.get("is_published")
+    instance._loaded_category_id = instance.__dict__.get("category_id")
+
+
+def product_cache_tags(instance):
+    """Теги кеша, которые затрагивает изменение продукта: сам продукт, его текущая и прежняя категории и
+    общий список опубликованных продуктов (если продукт был или стал опубликованным)."""
+    tags = {f"product:{instance.pk}", f"category:{instance.category_id}"}
+    if instance._loaded_category_id is not None:
+        tags.add(f"category:{instance._loaded_category_id}")
+    if instance.is_published or instance._loaded_is_published is not False:
+        tags.add("catalog:published")
+    return tags
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, **kwargs):
+    """1) Обновление счетчика неопубликованных продуктов при создании продукта и при изменении статуса публикации.
+    2) Инвалидация кеша страниц и списков, в которых участвует продукт."""
+    if created:
+        UnpublishedProductsCounter.change(0 if instance.is_published else 1)
+    elif instance._loaded_is_published is None:
+        UnpublishedProductsCounter.invalidate()  # Исходный статус неизвестен - пересчитываю счетчик из БД
+    elif instance._loaded_is_published != instance.is_published:
+        UnpublishedProductsCounter.change(-1 if instance.is_published else 1)
+    invalidate_tags(*product_cache_tags(instance))
+    instance._loaded_is_published = instance.is_published
+    instance._loaded_category_id = instance.category_id
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Обновление счетчика неопубликованных продуктов и инвалидация кеша при удалении продукта (в т.ч. каскадном)."""
+    if not instance.is_published:
+        UnpublishedProductsCounter.change(-1)
+    invalidate_tags(*product_cache_tags(instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    """Инвалидация кеша категории и всех страниц, где выводится список или название категорий."""
+    invalidate_tags(f"category:{instance.pk}", "catalog:categories")
+    CatalogDataService.invalidate_categories()
+
+
+@receiver(post_save, sender=ContactsData)
+@receiver(post_delete, sender=ContactsData)
+def contacts_data_changed(sender, instance, **kwargs):
+    """Сброс кеша контактных данных магазина."""
+    CatalogDataService.invalidate_contacts_data()
+
+
+# Производные изображения (миниатюры WebP/JPEG) фото продукта создаются в пуле процессов после загрузки
+ImageDerivatives.register(Product, "image", "product", "image_width", "image_height")
@@ -0,0 +1,140 @@
+import hashlib
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+from django.middleware.cache import CacheMiddleware
+from django.utils.cache import patch_vary_headers
+
+# Время аренды блокировки (сек.): если процесс, пересобирающий кеш, упал, блокировка освободится сама
+LOCK_LEASE = 30
+# Сколько ожидающий процесс ждет пересборку кеша, если устаревшего значения нет (сек.)
+LOCK_WAIT = 5
+LOCK_POLL_INTERVAL = 0.05
+
+
+class SingleFlight:
+    """Распределенная блокировка в кеше (Redis) для пересборки одного ключа только одним процессом.
+    Блокировка берется атомарным cache.add() (SET NX) с арендой (lease), остальные процессы либо отдают устаревшее
+    значение, либо ждут освобождения блокировки."""
+
+    def __init__(self, key, lease=LOCK_LEASE, wait=LOCK_WAIT):
+        self.lock_key = f"lock:{key}"
+        self.lease = lease
+        self.wait_timeout = wait
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        """Пытается взять блокировку. :return: True, если блокировка получена."""
+        return cache.add(self.lock_key, self.token, timeout=self.lease)
+
+    def release(self):
+        """Освобождает блокировку, только если она все еще принадлежит этому процессу (аренда могла истечь)."""
+        if cache.get(self.lock_key) == self.token:
+            cache.delete(self.lock_key)
+
+    def wait(self):
+        """Ждет освобождения блокировки другим процессом. :return: True, если блокировка освободилась вовремя."""
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            if cache.get(self.lock_key) is None:
+                return True
+            time.sleep(LOCK_POLL_INTERVAL)
+        return False
+
+
+def get_or_rebuild(key, builder, timeout, version="", stale_timeout=None, beta=1.0):
+    """Функция получения значения из кеша с защитой от "cache stampede" (одновременной пересборки ключа всеми
+    процессами после его истечения или сброса):
+    1) значение хранится вместе с версией (например, отпечатком тегов), сроком свежести и временем пересборки;
+    2) вероятностное раннее обновление (XFetch): чем ближе срок свежести и чем дольше пересборка, тем выше шанс,
+       что запрос обновит значение заранее, до истечения;
+    3) пересобирает значение только процесс, взявший блокировку SingleFlight, остальные отдают устаревшее значение
+       (stale-while-revalidate), а если его нет - ждут пересборку.
+    :param key: Ключ кеша (постоянный, без версии).
+    :param builder: Функция без аргументов, которая вычисляет значение.
+    :param timeout: Срок свежести значения (в секундах).
+    :param version: Версия значения. Значение с другой версией считается устаревшим, но может быть отдано, пока
+    другой процесс его пересобирает.
+    :param stale_timeout: Сколько еще хранить устаревшее значение после срока свежести (по умолчанию = timeout).
+    :param beta: Коэффициент раннего обновления (> 1 - обновлять раньше, 0 - отключить).
+    :return: Значение."""
+    envelope = cache.get(key)
+    if envelope is not None:
+        cached_version, expires_at, delta, value = envelope
+        # 1.0 - random.random() лежит в (0, 1], поэтому логарифм определен
+        early = delta * beta * -math.log(1.0 - random.random())
+        if cached_version == version and time.time() + early < expires_at:
+            return value
+
+    lock = SingleFlight(key)
+    if lock.acquire():
+        try:
+            started = time.monotonic()
+            value = builder()
+            delta = time.monotonic() - started
+            stale = timeout if stale_timeout is None else stale_timeout
+            cache.set(key, (version, time.time() + timeout, delta, value), timeout=timeout + stale)
+            return value
+        finally:
+            lock.release()
+
+    if envelope is not None:
+        return envelope[3]  # Значение пересобирает другой процесс - отдаю устаревшее
+
+    if lock.wait():
+        envelope = cache.get(key)
+        if envelope is not None and envelope[0] == version:
+            return envelope[3]
+    return builder()  # Процесс с блокировкой не успел - вычисляю сам, но в кеш не пишу
+
+
+class SingleFlightCacheMiddleware(CacheMiddleware):
+    """CacheMiddleware (основа cache_page) с защитой от "cache stampede": при промахе страницу рендерит только один
+    процесс (блокировка SingleFlight на URL), остальные отдают устаревшую копию страницы, которая хранится под
+    постоянным префиксом stale_key_prefix, а если ее нет - ждут, пока страница появится в кеше."""
+
+    def __init__(self, get_response, page_timeout, key_prefix, stale_key_prefix, stale_timeout=None):
+        super().__init__(get_response, page_timeout=page_timeout, key_prefix=key_prefix)
+        self.stale = CacheMiddleware(
+            get_response,
+            page_timeout=page_timeout if stale_timeout is None else stale_timeout,
+            key_prefix=stale_key_prefix,
+        )
+
+    def __call__(self, request):
+        response = self.process_request(request)
+        if response is not None:
+            return response
+
+        url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        lock = SingleFlight(f"page:{self.key_prefix}:{url_hash}")
+        if not lock.acquire():
+            stale_response = self.stale.process_request(request)
+            if stale_response is not None:
+                return stale_response
+            if lock.wait():
+                response = self.process_request(request)
+                if response is not None:
+                    return response
+            request._cache_update_cache = True
+            return self.store(request, self.get_response(request))
+        try:
+            return self.store(request, self.get_response(request))
+        finally:
+            lock.release()
+
+    def store(self, request, response):
+        """Рендерит ответ (TemplateResponse) сразу, чтоб страница попала в кеш до освобождения блокировки, и
+        сохраняет ее и как свежую копию, и как устаревшую (stale) копию (отдельно для каждого значения Cookie)."""
+        if hasattr(response, "render") and callable(response.render) and not response.is_rendered:
+            response.render()
+        # Vary: Cookie добавляет SessionMiddleware, но уже после кеша страницы. Без него страница, отрендеренная для
+        # одного пользователя (меню с его email), попадала бы в кеш для всех, включая анонимных посетителей.
+        session = getattr(request, "session", None)
+        if session is not None and session.accessed:
+            patch_vary_headers(response, ("Cookie",))
+        response = self.process_response(request, response)
+        return self.stale.process_response(request, response)
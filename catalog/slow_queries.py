@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from catalog.query_inspector import find_origin, fingerprint
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "THRESHOLD_MS": 200,
+    "LOG_FILE": None,
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "EXPLAIN": True,
+    "EXPLAIN_PER_MINUTE": 6,
+    "EXPLAIN_INTERVAL": 600,
+    "EXPLAIN_TIMEOUT_MS": 10000,
+    "SQL_MAX_LENGTH": 4000,
+}
+NO_VIEW = "-"  # Запрос выполнен не при обработке запроса к сайту (команда, очередь писем)
+
+# Запрос к сайту, который обрабатывается в текущем потоке (ставит SlowQueryMiddleware)
+_current_request = ContextVar("slow_queries_request", default=None)
+# Выполняется EXPLAIN медленного запроса: сам EXPLAIN в журнал не пишется
+_explaining = ContextVar("slow_queries_explaining", default=False)
+
+
+def get_config():
+    config = {**DEFAULTS, **getattr(settings, "SLOW_QUERIES", {})}
+    if not config["LOG_FILE"]:
+        config["LOG_FILE"] = os.path.join(settings.BASE_DIR, "logs", "slow_queries.jsonl")
+    config["LOG_FILE"] = str(config["LOG_FILE"])
+    return config
+
+
+def log_files(path):
+    """Файлы журнала: предыдущий (после ротации) и текущий, от старых записей к новым."""
+    return [file_path for file_path in (f"{path}.1", path) if os.path.exists(file_path)]
+
+
+def read_entries(path, since=None):
+    """Записи журнала медленных запросов (включая файл после ротации), начиная с времени since (datetime с часовым
+    поясом). Поврежденные строки (например, недописанные при остановке воркера) пропускаются."""
+    for file_path in log_files(path):
+        with open(file_path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    logged_at = datetime.fromisoformat(entry["time"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                if since is None or logged_at >= since:
+                    yield entry
+
+
+def summarize(entries):
+    """Сводка журнала по отпечаткам запросов: количество, суммарное, среднее, 95-й перцентиль и максимальное время,
+    представления и места в коде, последний план EXPLAIN.
+    :return: Список словарей, от наибольшего суммарного времени."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(
+            entry["fingerprint"],
+            {"fingerprint": entry["fingerprint"], "durations": [], "views": Counter(), "origins": Counter()},
+        )
+        group["durations"].append(entry["duration_ms"])
+        group["views"][entry["view"]] += 1
+        group["origins"][entry["origin"]] += 1
+        if entry.get("explain"):
+            group["explain"] = entry["explain"]  # Записи идут от старых к новым: остается последний план
+    summary = []
+    for group in groups.values():
+        durations = sorted(group.pop("durations"))
+        summary.append(
+            {
+                **group,
+                "count": len(durations),
+                "total_ms": round(sum(durations), 1),
+                "avg_ms": round(sum(durations) / len(durations), 1),
+                "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                "max_ms": durations[-1],
+                "explain": group.get("explain"),
+            }
+        )
+    return sorted(summary, key=lambda row: row["total_ms"], reverse=True)
+
+
+class ExplainLimiter:
+    """Ограничение EXPLAIN ANALYZE в процессе: не больше per_minute за последние 60 секунд и не чаще раза в interval
+    секунд для одного отпечатка запроса. EXPLAIN ANALYZE выполняет запрос еще раз, и без ограничения медленный запрос
+    на популярной странице удвоил бы нагрузку на БД."""
+
+    def __init__(self, per_minute, interval):
+        self.per_minute = per_minute
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.recent = deque()  # Время последних EXPLAIN за минуту
+        self.last_by_fingerprint = {}  # Отпечаток -> время EXPLAIN (в порядке добавления, т.е. от старых к новым)
+
+    def allow(self, query_fingerprint):
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] >= 60:
+                self.recent.popleft()
+            # Отпечатки старше interval больше ничего не ограничивают: удаляю их, чтоб словарь не рос все время
+            # работы процесса. Отпечаток добавляется, только когда его нет в словаре, т.е. в конец - старые в начале
+            while self.last_by_fingerprint:
+                oldest = next(iter(self.last_by_fingerprint))
+                if now - self.last_by_fingerprint[oldest] < self.interval:
+                    break
+                del self.last_by_fingerprint[oldest]
+            last = self.last_by_fingerprint.get(query_fingerprint)
+            if len(self.recent) >= self.per_minute or (last is not None and now - last < self.interval):
+                return False
+            self.recent.append(now)
+            self.last_by_fingerprint[query_fingerprint] = now
+            return True
+
+
+def can_explain(sql, many):
+    """EXPLAIN ANALYZE выполняет запрос, поэтому повторяю только чтение: один SELECT без блокировки строк."""
+    statement = sql.lstrip().upper()
+    return not many and statement.startswith("SELECT") and " FOR UPDATE" not in statement and ";" not in sql
+
+
+def explain(connection, sql, params, timeout_ms):
+    """Функция выполняет EXPLAIN (ANALYZE, BUFFERS) запроса на Postgres (EXPLAIN QUERY PLAN - на SQLite) в том же
+    соединении и с теми же параметрами. EXPLAIN выполняется в точке сохранения транзакции: его ошибка (в т.ч. таймаут
+    statement_timeout) не ломает транзакцию запроса к сайту.
+    :return: План запроса текстом или None, если БД не поддерживается или EXPLAIN не удался."""
+    if connection.vendor == "postgresql":
+        prefix = "EXPLAIN (ANALYZE, BUFFERS) "
+    elif connection.vendor == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    else:
+        return None
+    token = _explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            if connection.vendor == "postgresql" and timeout_ms:
+                cursor.execute("SELECT current_setting('statement_timeout')")
+                previous_timeout = cursor.fetchone()[0]
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(timeout_ms)])
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+            if connection.vendor == "postgresql" and timeout_ms:
+                # SET LOCAL действует до конца всей транзакции, а не точки сохранения: возвращаю прежний таймаут
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous_timeout])
+    except DatabaseError as error:
+        logger.warning("EXPLAIN медленного запроса не выполнен: %s", error)
+        return None
+    finally:
+        _explaining.reset(token)
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+class SlowQueryLog:
+    """Журнал медленных SQL-запросов процесса: строки JSON в файле LOG_FILE (общий для воркеров, запись одной строкой
+    в режиме добавления). Когда файл больше MAX_BYTES, он переименовывается в <файл>.1 (предыдущий .1 удаляется)."""
+
+    def __init__(self, config):
+        self.config = config
+        self.threshold = config["THRESHOLD_MS"] / 1000
+        self.limiter = ExplainLimiter(config["EXPLAIN_PER_MINUTE"], config["EXPLAIN_INTERVAL"])
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обертка execute_wrapper соединения с БД: при быстром запросе - только замер времени."""
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold and not _explaining.get():
+            self.record(context["connection"], sql, params, many, duration)
+        return result
+
+    def record(self, connection, sql, params, many, duration):
+        query_fingerprint = fingerprint(sql)
+        request = _current_request.get()
+        match = getattr(request, "resolver_match", None)
+        entry = {
+            "time": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "db": connection.alias,
+            "duration_ms": round(duration * 1000, 1),
+            "fingerprint": query_fingerprint[: self.config["SQL_MAX_LENGTH"]],
+            "view": match.view_name if match else NO_VIEW,
+            "method": request.method if request is not None else None,
+            "path": request.path if request is not None else None,
+            "origin": find_origin(connection),
+            "explain": None,
+        }
+        if self.config["EXPLAIN"] and can_explain(sql, many) and self.limiter.allow(query_fingerprint):
+            entry["explain"] = explain(connection, sql, params, self.config["EXPLAIN_TIMEOUT_MS"])
+        logger.warning(
+            "Медленный SQL-запрос %.1f мс (%s, %s): %.200s",
+            entry["duration_ms"],
+            entry["view"],
+            entry["origin"],
+            query_fingerprint,
+        )
+        self.write(entry)
+
+    def write(self, entry):
+        path = self.config["LOG_FILE"]
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if os.path.exists(path) and os.path.getsize(path) >= self.config["MAX_BYTES"]:
+                    os.replace(path, f"{path}.1")
+                with open(path, "a", encoding="utf-8") as file:
+                    file.write(line)
+            except OSError as error:
+                logger.warning("Журнал медленных запросов %s недоступен: %s", path, error)
+
+
+_slow_query_log = None
+
+
+def get_slow_query_log():
+    global _slow_query_log
+    if _slow_query_log is None:
+        _slow_query_log = SlowQueryLog(get_config())
+    return _slow_query_log
+
+
+@receiver(connection_created)
+def install_slow_query_log(connection, **kwargs):
+    """Ставит журнал медленных запросов на каждое новое соединение с БД (один раз на объект соединения: Django
+    переоткрывает соединение потока в том же объекте), в т.ч. в командах и очереди писем."""
+    if not get_config()["ENABLED"]:
+        return
+    slow_query_log = get_slow_query_log()
+    if slow_query_log not in connection.execute_wrappers:
+        # В начало списка: connection.execute_wrapper() (Server-Timing, QueryRecorder) снимает свою обертку с конца
+        connection.execute_wrappers.insert(0, slow_query_log)
+
+
+class SlowQueryMiddleware:
+    """Middleware журнала медленных запросов: запоминает текущий запрос к сайту, чтоб в журнале было представление
+    (имя URL) и путь страницы, на которой выполнен медленный SQL-запрос."""
+
+    def __init__(self, get_response):
+        if not get_config()["ENABLED"]:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_request.reset(token)
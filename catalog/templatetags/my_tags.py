@@ -1,4 +1,8 @@
 from django import template
+from django.utils.html import format_html
+
+from catalog.cache_tags import tags_fingerprint
+from catalog.images import FORMATS, get_srcset
 
 register = template.Library()
 
@@ -15,3 +19,65 @@ def media_filter(path):
         else:
             return f"/media/{path}"
     return "#"  # Если путь пустой, возвращаю просто плейсхолдер
+
+
+@register.simple_tag
+def cache_tags_version(*tags):
+    """Шаблонный тег, который возвращает отпечаток версий тегов кеша. Используется как vary_on аргумент тега
+    {% cache %}, чтоб фрагмент сбрасывался вместе с тегами (например, "catalog:categories").
+    :param tags: Теги кеша.
+    :return: Строка-отпечаток версий тегов."""
+    return tags_fingerprint(tags)
+
+
+def _srcset(candidates):
+    return ", ".join(f"{url} {width}w" for url, width in candidates)
+
+
+@register.simple_tag
+def responsive_image(image, width, height, kind, sizes, alt="", css_class=""):
+    """Шаблонный тег, который выводит изображение с производными изображениями (<picture> с srcset в WebP и JPEG),
+    чтоб браузер загружал миниатюру нужной ширины, а не оригинал. Размеры берутся из полей модели, файл не
+    открывается. Пока производных изображений нет (ширина не заполнена), выводится оригинал.
+    Пример: {% responsive_image product.image product.image_width product.image_height "product" "250px" %}
+    :param image: Поле изображения (или имя файла).
+    :param width: Ширина оригинала (например, product.image_width).
+    :param height: Высота оригинала.
+    :param kind: Вид изображения ("product", "article", "avatar").
+    :param sizes: Значение атрибута sizes (ширина изображения на странице).
+    :param alt: Альтернативный текст.
+    :param css_class: CSS-класс тега <img>.
+    :return: HTML-код изображения."""
+    if not image or not width:
+        return format_html('<img src="{}" alt="{}" class="{}">', media_filter(image), alt, css_class)
+    sources = {ext: get_srcset(image, width, kind, ext) for ext in FORMATS}
+    fallback = sources["jpg"][0][0]
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="lazy" '
+        'decoding="async"></picture>',
+        FORMATS["webp"][1], _srcset(sources["webp"]), sizes,
+        fallback, _srcset(sources["jpg"]), sizes, width, height, alt, css_class,
+    )
+
+
+@register.simple_tag
+def responsive_background(image, width, kind, display_width):
+    """Шаблонный тег для фонового изображения (CSS background-image): производное изображение, ближайшее к
+    ширине на странице (с запасом x2 для экранов высокой плотности), в WebP через image-set() и JPEG для старых
+    браузеров. Пока производных изображений нет, выводится оригинал.
+    :param image: Поле изображения.
+    :param width: Ширина оригинала (из модели).
+    :param kind: Вид изображения.
+    :param display_width: Ширина изображения на странице (в px).
+    :return: CSS-объявления background-image."""
+    if not image or not width:
+        return format_html("background-image: url('{}');", media_filter(image))
+    urls = {}
+    for ext in FORMATS:
+        candidates = get_srcset(image, width, kind, ext)
+        urls[ext] = next((url for url, size in candidates if size >= display_width * 2), candidates[-1][0])
+    return format_html(
+        "background-image: url('{}'); background-image: image-set(url('{}') type('{}'), url('{}') type('{}'));",
+        urls["jpg"], urls["webp"], FORMATS["webp"][1], urls["jpg"], FORMATS["jpg"][1],
+    )
@@ -1,3 +1,662 @@
-# from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import caches
+from django.core.mail import BadHeaderError
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from blog.models import Article
+from blog.services import ArticleViewsCounter
+from catalog import metrics
+from catalog.bulk_export import export_fixture
+from catalog.conditional import viewer_fingerprint
+from catalog.models import Category, Product
+from catalog.paginators import KeysetPaginator
+from catalog.query_inspector import QueryRecorder
+from catalog.server_timing import ServerTimingMiddleware
+from catalog.services import ModerationQueue
+from catalog.single_flight import get_or_rebuild
+from catalog.slow_queries import ExplainLimiter
+from catalog.views import CatalogBulkPublicationView
+from config.cache_backends import CircuitBreaker, ResilientRedisCache
+from users.models import OutboxEmail
+from users.services import MAX_ATTEMPTS, EmailOutbox
+
+try:
+    import fakeredis
+except ImportError:  # Необязательный пакет (его нет в requirements.txt): без него тесты буфера просмотров пропускаются
+    fakeredis = None  # type: ignore[assignment]
+
+
+class QueryPlanTests(TestCase):
+    """Планы запросов списков магазина (команда check_query_plans) на сгенерированных данных."""
+
+    def test_list_queries_use_list_indexes(self):
+        output = StringIO()
+        call_command("check_query_plans", seed=2000, categories=5, verbosity=2, stdout=output)
+        plans = output.getvalue()
+        self.assertIn("Все запросы списков используют индексы.", plans)
+        for index in (
+            "product_published_created_idx",
+            "product_unpublished_idx",
+            "product_category_created_idx",
+            "article_published_created_idx",
+        ):
+            self.assertIn(index, plans)
+
+
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "catalog-tests"}}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class QueryBudgetTests(TestCase):
+    """Бюджеты SQL-запросов представлений (атрибут query_budget, команда check_query_budgets)."""
+
+    def test_views_fit_query_budgets(self):
+        output = StringIO()
+        # Команда завершается с CommandError, если код ответа не тот, бюджет превышен или найден N+1
+        call_command("check_query_budgets", stdout=output)
+        self.assertIn("Все представления укладываются в бюджет запросов", output.getvalue())
+        self.assertRegex(output.getvalue(), r"POST /catalog/products/bulk_publication/ +302 ")
+
+    def test_bulk_publication_queries_do_not_depend_on_product_count(self):
+        moderator = get_user_model().objects.create_superuser(email="moderator@example.com", password="x")
+        category = Category.objects.create(category_name="Публикация")
+        products = Product.objects.bulk_create(
+            Product(product_name=f"Продукт {number}", category=category, price=1) for number in range(20)
+        )
+        self.client.force_login(moderator)
+        counts = []
+        for batch in (products[:1], products[1:]):
+            with QueryRecorder() as recorder:
+                response = self.client.post(
+                    reverse("catalog:products_bulk_publication"),
+                    {"action": "publish", "product_ids": [product.pk for product in batch]},
+                )
+            self.assertEqual(response.status_code, 302)
+            counts.append(recorder.count)
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[0], CatalogBulkPublicationView.query_budget)
+        self.assertEqual(Product.objects.filter(is_published=True).count(), 20)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class GetOrRebuildTests(SimpleTestCase):
+    """Защита от cache stampede (get_or_rebuild): LocMemCache вместо Redis, cache.add() в нем так же атомарен, как
+    SET NX."""
+
+    threads = 8
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def run_threads(self, target):
+        results = []
+        workers = [threading.Thread(target=lambda: results.append(target())) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        return workers, results
+
+    def test_cold_key_is_rebuilt_once_per_version(self):
+        builds = Counter()
+        lock = threading.Lock()
+
+        def builder(version):
+            with lock:
+                builds[version] += 1
+            time.sleep(0.2)  # Остальные потоки успевают прийти за ключом, пока идет пересборка
+            return f"value-{version}"
+
+        for version in ("v1", "v2"):
+            workers, results = self.run_threads(
+                lambda version=version: get_or_rebuild("cold-key", lambda: builder(version), 60, version=version)
+            )
+            for worker in workers:
+                worker.join()
+            self.assertEqual(len(results), self.threads)
+            self.assertIn(f"value-{version}", results)
+            # Холодный ключ: остальные потоки дождались пересборки; новая версия: отдано значение прошлой версии
+            self.assertLessEqual(set(results), {"value-v1", f"value-{version}"})
+        self.assertEqual(builds, {"v1": 1, "v2": 1})
+
+    def test_callers_get_stale_value_while_rebuild_is_in_flight(self):
+        get_or_rebuild("stale-key", lambda: "old", 60, version="v1")
+        started, release = threading.Event(), threading.Event()
+        builds = []
+
+        def builder():
+            builds.append(1)
+            started.set()
+            release.wait(5)
+            return "new"
+
+        workers, results = self.run_threads(lambda: get_or_rebuild("stale-key", builder, 60, version="v2"))
+        try:
+            self.assertTrue(started.wait(5))
+            deadline = time.monotonic() + 5
+            while len(results) < self.threads - 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            # Все, кроме пересобирающего потока, уже получили ответ, хотя пересборка еще не закончилась
+            self.assertEqual(results, ["old"] * (self.threads - 1))
+        finally:
+            release.set()
+            for worker in workers:
+                worker.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results[-1], "new")
+        self.assertEqual(get_or_rebuild("stale-key", builder, 60, version="v2"), "new")
+        self.assertEqual(len(builds), 1)
+
+
+class ViewerFingerprintTests(TestCase):
+    """Отпечаток пользователя в ETag страниц (conditional_page)."""
+
+    def fingerprint(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        with mock.patch("catalog.conditional.UnpublishedProductsCounter.get", return_value=7) as counter:
+            return viewer_fingerprint(request), counter.called
+
+    def test_counter_is_not_read_for_regular_user(self):
+        user = get_user_model().objects.create_user(email="user@example.com", password="x")
+        fingerprint, counter_read = self.fingerprint(user)
+        self.assertFalse(counter_read)
+        self.assertFalse(fingerprint.endswith(":7"))
+
+    def test_counter_is_part_of_moderator_fingerprint(self):
+        user = get_user_model().objects.create_user(email="moderator@example.com", password="x")
+        user.user_permissions.add(Permission.objects.get(codename="can_change_product_publication"))
+        fingerprint, counter_read = self.fingerprint(get_user_model().objects.get(pk=user.pk))
+        self.assertTrue(counter_read)
+        self.assertTrue(fingerprint.endswith(":7"))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ConditionalPageTests(TestCase):
+    """Условный GET (conditional_page) списка блога: ETag учитывает просмотры, Last-Modified не отдается."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.article = Article.objects.create(article_title="Статья", article_contents="Текст", is_published=True)
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_views_change_blog_list_etag(self):
+        url = reverse("blog:blog_page")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, headers={"if-none-match": etag}).status_code, 304)
+
+        ArticleViewsCounter.hit(self.article.pk)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_page_varying_by_viewer_has_no_last_modified(self):
+        url = reverse("blog:blog_page")
+        response = self.client.get(url)
+        self.assertNotIn("Last-Modified", response)
+        self.assertIn("Cookie", response["Vary"])
+        # Без If-None-Match страница не считается актуальной: она могла быть сохранена для другого пользователя
+        since = http_date(time.time() + 3600)
+        self.assertEqual(self.client.get(url, headers={"if-modified-since": since}).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FixtureRoundTripTests(TestCase):
+    """Выгрузка create_product_fixture (export_fixture) и загрузка add_products (loaddata) сохраняют записи как есть."""
+
+    def test_product_keeps_pk_owner_and_created_at(self):
+        owner = get_user_model().objects.create_user(email="owner@example.com", password="x")
+        category = Category.objects.create(category_name="Категория")
+        product = Product.objects.create(product_name="Продукт", category=category, price=10, owner=owner)
+        # Сериализатор Django (как и dumpdata) хранит время с точностью до миллисекунд
+        created_at = (timezone.now() - timedelta(days=30)).replace(microsecond=0)
+        Product.objects.filter(pk=product.pk).update(created_at=created_at)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "products.jsonl.gz")
+            self.assertEqual(export_fixture("products", path), 1)
+            Product.objects.all().delete()
+            call_command("loaddata", path, verbosity=0)
+
+        restored = Product.objects.get()
+        self.assertEqual(
+            (restored.pk, restored.owner_id, restored.category_id, restored.created_at),
+            (product.pk, owner.pk, category.pk, created_at),
+        )
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class ModerationQueueClaimTests(TransactionTestCase):
+    """Одновременный захват очереди модерации несколькими модераторами (SELECT ... FOR UPDATE SKIP LOCKED): каждый
+    поток работает в своем соединении с БД, поэтому нужен TransactionTestCase и БД с SKIP LOCKED (Postgres)."""
+
+    moderators = 6
+    count = 5
+
+    def test_concurrent_claims_never_hand_out_a_product_twice(self):
+        category = Category.objects.create(category_name="Очередь")
+        Product.objects.bulk_create(
+            Product(product_name=f"Продукт {number}", category=category, price=1)
+            for number in range(self.moderators * self.count + 3)
+        )
+        users = [
+            get_user_model().objects.create_user(email=f"moderator{number}@example.com", password="x")
+            for number in range(self.moderators)
+        ]
+        barrier = threading.Barrier(self.moderators)
+        claimed, errors = {}, []
+
+        def claim(user):
+            try:
+                barrier.wait(5)  # Все модераторы захватывают очередь одновременно
+                claimed[user.pk] = ModerationQueue.claim(user, count=self.count)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()  # Соединение потока (у каждого потока свое)
+
+        workers = [threading.Thread(target=claim, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        product_ids = [pk for ids in claimed.values() for pk in ids]
+        self.assertEqual(len(product_ids), len(set(product_ids)))
+        self.assertEqual(len(product_ids), self.moderators * self.count)
+        for user in users:
+            self.assertEqual(
+                sorted(claimed[user.pk]), sorted(Product.objects.filter(claimed_by=user).values_list("pk", flat=True))
+            )
+
+
+@override_settings(SERVER_TIMING={"PUBLIC_HEADER": False, "LOG_SAMPLE_RATE": 0})
+class ServerTimingTests(TestCase):
+    """Заголовок Server-Timing для персонала (ServerTimingMiddleware)."""
+
+    def get(self, user, view=lambda request: HttpResponse()):
+        request = RequestFactory().get("/")
+        loads = []
+        request.user = SimpleLazyObject(lambda: loads.append(1) or user)
+        response = ServerTimingMiddleware(view)(request)
+        return response, loads
+
+    def test_lazy_user_is_not_loaded_for_header(self):
+        staff = get_user_model().objects.create_user(email="staff@example.com", password="x", is_staff=True)
+        response, loads = self.get(staff)
+        self.assertEqual(loads, [])
+        self.assertNotIn("Server-Timing", response)
+
+    def test_header_for_staff_loaded_by_view(self):
+        staff = get_user_model().objects.create_user(email="staff@example.com", password="x", is_staff=True)
+        response, loads = self.get(staff, view=lambda request: HttpResponse(request.user.email))
+        self.assertEqual(loads, [1])
+        self.assertIn("Server-Timing", response)
+
+
+@skipIf(metrics.fcntl is None, "Без fcntl файлы завершившихся воркеров не переносятся в архив")
+class MetricsArchiveTests(SimpleTestCase):
+    """Перенос метрик завершившихся воркеров в archive.json (MetricsStore.merge() и retire())."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = metrics.MetricsStore(self.directory, flush_interval=60)
+        self.store.record_request("catalog:home_page", "GET", 200, 0.01, 2, [])
+        self.store.flush()
+
+    def tearDown(self):
+        for name in os.listdir(self.directory):
+            os.unlink(os.path.join(self.directory, name))
+        os.rmdir(self.directory)
+
+    def test_dead_worker_file_is_archived_without_losing_counters(self):
+        # Файл воркера, которого уже нет (pid, которого не бывает)
+        with open(self.store.path, encoding="utf-8") as file, open(
+            os.path.join(self.directory, f"{metrics.FILE_PREFIX}999999999.json"), "w", encoding="utf-8"
+        ) as dead:
+            json.dump(json.load(file), dead)
+
+        for _ in range(2):  # Повторный сбор не должен посчитать архив и удаленный файл еще раз
+            data, processes = self.store.merge()
+            self.assertEqual(processes, 1)
+            self.assertEqual(data["requests"], {("catalog:home_page", "GET", 200): 2})
+            self.assertEqual(data["db_queries"], {"catalog:home_page": 4})
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory) if name.endswith(".json")),
+            [metrics.ARCHIVE_FILE, os.path.basename(self.store.path)],
+        )
+
+    def test_retired_worker_counters_stay_in_sum(self):
+        self.store.retire()
+        self.assertFalse(os.path.exists(self.store.path))
+        data, processes = metrics.MetricsStore(self.directory, flush_interval=60).merge()
+        self.assertEqual(processes, 1)
+        self.assertEqual(data["requests"], {("catalog:home_page", "GET", 200): 1})
+
+
+class ExplainLimiterTests(SimpleTestCase):
+    """Ограничение EXPLAIN медленных запросов (ExplainLimiter)."""
+
+    def test_fingerprints_older_than_interval_are_pruned(self):
+        limiter = ExplainLimiter(per_minute=100, interval=600)
+        with mock.patch("catalog.slow_queries.time.monotonic", return_value=1000.0):
+            self.assertTrue(limiter.allow("SELECT 1"))
+            self.assertTrue(limiter.allow("SELECT 2"))
+            self.assertFalse(limiter.allow("SELECT 1"))
+        with mock.patch("catalog.slow_queries.time.monotonic", return_value=1500.0):
+            self.assertTrue(limiter.allow("SELECT 3"))
+        with mock.patch("catalog.slow_queries.time.monotonic", return_value=1700.0):
+            self.assertTrue(limiter.allow("SELECT 4"))
+        self.assertEqual(list(limiter.last_by_fingerprint), ["SELECT 3", "SELECT 4"])
+        with mock.patch("catalog.slow_queries.time.monotonic", return_value=1700.0):
+            self.assertTrue(limiter.allow("SELECT 1"))  # Прошло больше interval
+            self.assertFalse(limiter.allow("SELECT 3"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Предохранитель ResilientRedisCache: closed -> open -> half_open -> closed (без Redis: операции - функции
+    guarded())."""
+
+    def setUp(self):
+        # Свой адрес сервера - свой предохранитель процесса (CircuitBreaker.for_process)
+        self.cache = ResilientRedisCache(
+            f"redis://127.0.0.1:1/{self.id()}",
+            {"CIRCUIT_BREAKER": {"FAILURE_THRESHOLD": 2, "RESET_TIMEOUT": 5}},
+        )
+        self.breaker = self.cache._breaker
+        self.now = 1000.0
+        patcher = mock.patch("config.cache_backends.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def redis_down(self):
+        raise RedisConnectionError("connection refused")
+
+    def open_breaker(self):
+        for _ in range(2):
+            self.assertEqual(self.cache.guarded(self.redis_down, lambda: "local"), "local")
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.now += 5
+
+    def test_successful_probe_closes_breaker(self):
+        self.open_breaker()
+        states = []
+        self.assertEqual(
+            self.cache.guarded(lambda: states.append(self.breaker.state) or "redis", lambda: "local"), "redis"
+        )
+        self.assertEqual(states, [CircuitBreaker.HALF_OPEN])
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_opens_breaker_again(self):
+        self.open_breaker()
+        self.assertEqual(self.cache.guarded(self.redis_down, lambda: "local"), "local")
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_with_other_error_closes_breaker(self):
+        # Например, ValueError у incr() несуществующего ключа: Redis ответил, значит доступен
+        self.open_breaker()
+
+        def missing_key():
+            raise ValueError("Key not found")
+
+        with self.assertRaises(ValueError):
+            self.cache.guarded(missing_key, lambda: "local")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+
+
+@skipIf(fakeredis is None, "Для тестов буфера просмотров нужен пакет fakeredis")
+@override_settings(CACHES=LOCAL_CACHES)
+class ArticleViewsFlushTests(TestCase):
+    """Перенос просмотров из буфера в Redis в БД (ArticleViewsCounter.flush) не теряет просмотры при сбоях."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(ArticleViewsCounter, "_client", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.article = Article.objects.create(article_title="Статья", article_contents="Текст", views_counter=10)
+        self.key = ArticleViewsCounter._key()
+
+    def flushing_key(self, created_at):
+        return f"{self.key}:flushing:{int(created_at)}:{uuid.uuid4().hex}"
+
+    def views(self):
+        self.article.refresh_from_db()
+        return self.article.views_counter
+
+    def test_flush_picks_up_buffer_of_interrupted_flush(self):
+        # Перенос, прерванный после RENAME, оставил буфер; свежий буфер, возможно, переносит другой процесс
+        stale_key = self.flushing_key(time.time() - ArticleViewsCounter.stale_flush_timeout - 1)
+        fresh_key = self.flushing_key(time.time())
+        self.redis.hset(stale_key, self.article.pk, 3)
+        self.redis.hset(fresh_key, self.article.pk, 7)
+        self.redis.hset(f"{self.key}:flushing:{uuid.uuid4().hex}", self.article.pk, 4)  # Прежний формат имени
+        ArticleViewsCounter.hit(self.article.pk)
+
+        self.assertEqual(ArticleViewsCounter.flush(), (1, 8))
+        self.assertEqual(self.views(), 18)
+        self.assertEqual([key.decode() for key in self.redis.scan_iter(match=f"{self.key}*")], [fresh_key])
+
+    def test_failed_update_returns_views_to_buffer(self):
+        ArticleViewsCounter.hit(self.article.pk)
+        ArticleViewsCounter.hit(self.article.pk)
+
+        with mock.patch("blog.services.transaction.atomic", side_effect=DatabaseError("database is down")):
+            with self.assertRaises(DatabaseError):
+                ArticleViewsCounter.flush()
+        self.assertEqual(self.views(), 10)
+        self.assertEqual([key.decode() for key in self.redis.scan_iter(match=f"{self.key}*")], [self.key])
+
+        self.assertEqual(ArticleViewsCounter.flush(), (1, 2))
+        self.assertEqual(self.views(), 12)
+        self.assertEqual(list(self.redis.scan_iter(match=f"{self.key}*")), [])
+
+    def test_hit_changes_version(self):
+        version = ArticleViewsCounter.version()
+        ArticleViewsCounter.hit(self.article.pk)
+        self.assertNotEqual(ArticleViewsCounter.version(), version)
+        self.assertEqual(ArticleViewsCounter.get_pending([self.article.pk]), {self.article.pk: 1})
+
+
+class FakeSMTPConnection:
+    """Соединение с почтовым сервером для тестов EmailOutbox: ошибка отправки задается темой письма."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.subject in self.errors:
+                raise self.errors[message.subject]
+            self.sent.append(message.subject)
+        return len(messages)
+
+
+class EmailOutboxDrainTests(TestCase):
+    """Ошибки отправки одного письма не блокируют очередь и не сжигают попытки остальных писем пачки."""
+
+    def enqueue(self, *subjects):
+        return [EmailOutbox.enqueue(subject, "Текст", ["user@example.com"]) for subject in subjects]
+
+    def test_message_error_does_not_roll_back_batch(self):
+        first, broken, last = self.enqueue("Первое", "Сломанное", "Последнее")
+        connection = FakeSMTPConnection({"Сломанное": BadHeaderError("Header values can't contain newlines")})
+
+        self.assertEqual(EmailOutbox.drain(connection), {"sent": 2, "retried": 1, "failed": 0})
+        self.assertEqual(connection.sent, ["Первое", "Последнее"])
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn("BadHeaderError", broken.last_error)
+
+        OutboxEmail.objects.filter(pk=broken.pk).update(next_attempt_at=timezone.now(), attempts=MAX_ATTEMPTS - 1)
+        self.assertEqual(EmailOutbox.drain(connection), {"sent": 0, "retried": 0, "failed": 1})
+        broken.refresh_from_db()
+        self.assertEqual((broken.status, broken.attempts), (OutboxEmail.FAILED, MAX_ATTEMPTS))
+
+    def test_connection_error_does_not_charge_untried_emails(self):
+        first, second, third = self.enqueue("Первое", "Второе", "Третье")
+        connection = FakeSMTPConnection({"Первое": ConnectionRefusedError("connection refused")})
+
+        self.assertEqual(EmailOutbox.drain(connection), {"sent": 0, "retried": 3, "failed": 0})
+        self.assertEqual(connection.sent, [])
+        emails = {email.pk: email for email in OutboxEmail.objects.all()}
+        self.assertEqual([emails[email.pk].attempts for email in (first, second, third)], [1, 0, 0])
+        self.assertTrue(all(email.next_attempt_at > timezone.now() for email in emails.values()))
+        self.assertTrue(all(email.status == OutboxEmail.PENDING for email in emails.values()))
+
+
+class CountingList(list):
+    """Список, который считает обращения по индексу (бинарный поиск KeysetPaginator по списку из кеша)."""
+
+    reads = 0
+
+    def __getitem__(self, index):
+        if isinstance(index, int):
+            self.reads += 1
+        return super().__getitem__(index)
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class KeysetPaginatorTests(TestCase):
+    """Keyset-пагинация (KeysetPaginator) по QuerySet и по готовому списку: одинаковое created_at у соседних записей
+    (порядок внутри группы задает id), переходы вперед и назад, испорченные курсоры."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(category_name="Категория")
+        moment = timezone.now().replace(microsecond=0)
+        # Группы с одинаковым created_at попадают на границы страниц (по 2 продукта на странице)
+        offsets = [0, 1, 1, 1, 2, 2, 2]
+        for number, offset in enumerate(offsets):
+            product = Product.objects.create(product_name=f"Продукт {number}", category=category, price=1)
+            Product.objects.filter(pk=product.pk).update(created_at=moment - timedelta(hours=offset))
+        cls.expected = list(Product.objects.order_by("-created_at", "-id").values_list("pk", flat=True))
+
+    def paginators(self):
+        rows = CountingList(Product.objects.order_by("-created_at", "-id"))
+        return [
+            ("QuerySet", KeysetPaginator(Product.objects.all(), 2)),
+            ("list", KeysetPaginator(rows, 2, model=Product)),
+        ]
+
+    def walk_forward(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def walk_back(self, paginator, page):
+        pages = [page]
+        while pages[-1].has_previous():
+            # Со второй страницы ссылка "назад" ведет на первую страницу без курсора
+            pages.append(paginator.page(pages[-1].previous_cursor or None))
+        return pages[::-1]
+
+    def test_forward_and_backward_round_trip(self):
+        for name, paginator in self.paginators():
+            with self.subTest(name):
+                forward = self.walk_forward(paginator)
+                self.assertEqual([page.number for page in forward], [1, 2, 3, 4])
+                self.assertEqual([obj.pk for page in forward for obj in page], self.expected)
+
+                first, last = forward[0], forward[-1]
+                self.assertFalse(first.has_previous())
+                self.assertEqual(first.previous_cursor, "")
+                self.assertFalse(last.has_next())
+                self.assertEqual(last.next_cursor, "")
+                self.assertEqual(paginator.decode_cursor(last.previous_cursor)[1:], ("p", 3))
+
+                backward = self.walk_back(paginator, last)
+                self.assertEqual([page.number for page in backward], [1, 2, 3, 4])
+                self.assertEqual(
+                    [[obj.pk for obj in page] for page in backward], [[obj.pk for obj in page] for page in forward]
+                )
+                self.assertTrue(all(page.has_next() for page in backward[:-1]))
+
+    def test_list_path_uses_bisect(self):
+        paginator = KeysetPaginator(CountingList(Product.objects.order_by("-created_at", "-id")), 2, model=Product)
+        cursor = paginator.page().next_cursor
+        paginator.object_list.reads = 0
+        page = paginator.page(cursor)
+        self.assertEqual([obj.pk for obj in page], self.expected[2:4])
+        # Граница курсора ищется бинарным поиском (не больше log2(7) + 1 сравнений), остальное - срезом
+        self.assertLessEqual(paginator.object_list.reads, 3)
+
+    def test_tampered_cursor_opens_first_page(self):
+        valid_values = ["2024-01-01T00:00:00+00:00", 1]
+        cursors = [
+            "not a cursor!",
+            base64.urlsafe_b64encode(b"not json").decode(),
+            make_cursor([1, 2]),
+            make_cursor({"v": valid_values, "d": "x", "n": 2}),
+            make_cursor({"v": valid_values[:1], "d": "n", "n": 2}),
+            make_cursor({"v": 5, "d": "n", "n": 2}),
+            make_cursor({"v": ["не дата", 1], "d": "n", "n": 2}),
+            make_cursor({"v": [None, None], "d": "n", "n": 2}),
+            make_cursor({"v": valid_values, "d": "n", "n": "два"}),
+        ]
+        for name, paginator in self.paginators():
+            for cursor in cursors:
+                with self.subTest(name, cursor=cursor):
+                    page = paginator.page(cursor)
+                    self.assertEqual(page.number, 1)
+                    self.assertEqual([obj.pk for obj in page], self.expected[:2])
+        for cursor in cursors:
+            with self.subTest("view", cursor=cursor):
+                self.assertEqual(self.client.get(reverse("catalog:home_page"), {"cursor": cursor}).status_code, 200)
+
+    def test_cursor_with_naive_datetime(self):
+        # Время без часового пояса считается временем в TIME_ZONE (как в ORM), а не дает 500 на списке
+        moment = Product.objects.get(pk=self.expected[3]).created_at
+        naive = make_cursor({"v": [moment.replace(tzinfo=None).isoformat(), self.expected[3]], "d": "n", "n": 3})
+        aware = make_cursor({"v": [moment.isoformat(), self.expected[3]], "d": "n", "n": 3})
+        for name, paginator in self.paginators():
+            with self.subTest(name):
+                page = paginator.page(naive)
+                self.assertEqual([obj.pk for obj in page], [obj.pk for obj in paginator.page(aware)])
+                self.assertEqual([obj.pk for obj in page], self.expected[4:6])
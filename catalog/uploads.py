@@ -0,0 +1,85 @@
+import warnings
+
+from django import forms
+from django.core.exceptions import ValidationError
+from PIL import Image
+
+from config.config import ALLOWED_IMAGE_FORMATS, MAX_IMAGE_PIXELS, MAX_IMAGE_SIDE, MAX_IMAGE_SIZE
+
+# Сигнатуры (magic bytes) в начале файла: сигнатура -> (MIME-тип, формат Pillow)
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": ("image/jpeg", "JPEG"),
+    b"\x89PNG\r\n\x1a\n": ("image/png", "PNG"),
+}
+SIGNATURE_LENGTH = max(len(signature) for signature in IMAGE_SIGNATURES)
+
+
+def sniff_image_type(upload):
+    """Функция определяет тип изображения по первым байтам файла (заголовок content_type от браузера не
+    используется: его присылает клиент, и он может быть любым).
+    :param upload: Загруженный файл (UploadedFile).
+    :return: Пара (MIME-тип, формат Pillow) или None, если формат не поддерживается."""
+    upload.seek(0)
+    head = upload.read(SIGNATURE_LENGTH)
+    upload.seek(0)
+    for signature, image_type in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return image_type
+    return None
+
+
+def inspect_image_upload(upload):
+    """Функция дешевой проверки загруженного изображения до его полного декодирования (Pillow декодирует
+    пиксели только при обращении к ним, а проверка читает только заголовок и структуру файла):
+    1) размер файла (до MAX_IMAGE_SIZE);
+    2) формат по сигнатуре в первых байтах файла (JPEG/PNG из ALLOWED_IMAGE_FORMATS);
+    3) ширина и высота из заголовка (Image.open() без декодирования, только плагином определенного формата):
+       не больше MAX_IMAGE_SIDE по стороне и MAX_IMAGE_PIXELS всего - так отсекаются "декомпрессионные бомбы"
+       (маленький файл, который при декодировании занимает гигабайты памяти);
+    4) целостность структуры файла (verify() читает файл потоком, без декодирования пикселей).
+    :param upload: Загруженный файл (UploadedFile).
+    :return: Кортеж (MIME-тип, ширина, высота).
+    :raise ValidationError: Если файл не прошел проверку."""
+    if upload.size > MAX_IMAGE_SIZE:
+        raise ValidationError(
+            f"Размер изображения не должен превышать {MAX_IMAGE_SIZE // (1024 * 1024)} МБ.", code="file_too_large"
+        )
+
+    image_type = sniff_image_type(upload)
+    if image_type is None or image_type[0] not in ALLOWED_IMAGE_FORMATS:
+        raise ValidationError("Файл должен быть в формате JPEG или PNG.", code="invalid_format")
+    content_type, image_format = image_type
+
+    try:
+        with warnings.catch_warnings():
+            # Предупреждение Pillow о слишком большом изображении считаю ошибкой
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(upload, formats=[image_format]) as image:
+                width, height = image.size
+                if max(width, height) > MAX_IMAGE_SIDE or width * height > MAX_IMAGE_PIXELS:
+                    raise ValidationError(
+                        f"Изображение слишком большое ({width}x{height} пикселей). Максимум: {MAX_IMAGE_SIDE} "
+                        f"пикселей по стороне и {MAX_IMAGE_PIXELS // 1_000_000} млн пикселей.",
+                        code="image_too_large",
+                    )
+                image.verify()
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning) as error:
+        raise ValidationError("Изображение слишком большое.", code="image_too_large") from error
+    except (OSError, SyntaxError, ValueError) as error:  # Поврежденный файл (Pillow бросает и SyntaxError)
+        raise ValidationError("Файл поврежден или не является изображением.", code="invalid_image") from error
+    finally:
+        upload.seek(0)
+    return content_type, width, height
+
+
+class SafeImageField(forms.ImageField):
+    """Поле формы для загрузки изображений с дешевой проверкой файла (inspect_image_upload) вместо стандартной
+    проверки forms.ImageField, которая копирует загруженный файл в память и открывает его всеми плагинами Pillow.
+    Тип файла (content_type) определяется по сигнатуре файла, а не берется из запроса."""
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        upload.content_type, upload.image_width, upload.image_height = inspect_image_upload(upload)
+        return upload
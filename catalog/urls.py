@@ -14,7 +14,13 @@ urlpatterns = [
     path("product/<int:pk>/delete/", views.CatalogDeleteView.as_view(), name="product_confirm_delete_page"),
     path("contacts/", views.CatalogContactsView.as_view(), name="contacts_page"),
     path("product/<int:pk>/publication/", views.CatalogPublicationView.as_view(), name="product_publication"),
+    path(
+        "products/bulk_publication/", views.CatalogBulkPublicationView.as_view(), name="products_bulk_publication"
+    ),
+    path("moderation_queue/", views.CatalogModerationQueueView.as_view(), name="moderation_queue_page"),
     path("unpublished_products/", views.CatalogUnpublishedListView.as_view(), name="unpublished_products_page"),
     path("category_products/", views.CatalogCategoryProductsView.as_view(), name="category_products_page"),
     path("category_products/<int:category_id>/", views.CatalogCategoryProductsView.as_view(), name="category_products_page"),
+    path("cache_stats/", views.CatalogCacheStatsView.as_view(), name="cache_stats"),
+    path("memory_stats/", views.CatalogMemoryStatsView.as_view(), name="memory_stats"),
 ]
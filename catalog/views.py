@@ -1,44 +1,70 @@
+import hmac
+
 from django.contrib import messages
-from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
 from django.core.cache import cache
-from django.http import HttpResponseForbidden
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views import View
-from django.views.decorators.cache import cache_page
 from django.views.generic import CreateView, DeleteView, DetailView, FormView, ListView, UpdateView
 
+from catalog import memory, metrics
+from catalog.cache_tags import tagged_cache_page
+from catalog.conditional import conditional_page
 from catalog.forms import ContactForm, ProductForm
-from catalog.models import Category, ContactsData, Feedback, Product
-from catalog.services import ProductService
+from catalog.models import ContactsData, Feedback, Product
+from catalog.paginators import KeysetPaginationMixin
+from catalog.services import CatalogDataService, ModerationQueue, ProductService, UnpublishedProductsCounter
 
 
-class CatalogListView(ListView):
+# Условный GET (ETag / 304): страница меняется только вместе с тегом "catalog:published"
+@method_decorator(conditional_page(tags=lambda request: ["catalog:published"]), name="dispatch")
+class CatalogListView(KeysetPaginationMixin, ListView):
     """Представление для отображения домашней страницы (home.html) с опубликованными продуктами и пагинацией.
     Для отладки главной/домашней страницы представление выводит в консоль последние 5 созданных продуктов."""
 
+    query_budget = 6  # Бюджет SQL-запросов страницы (проверяет команда check_query_budgets)
+
     model = Product
     template_name = "catalog/home.html"
     context_object_name = "products"
     paginate_by = 6
+    count_cache_key = "catalog_published_count"
 
     def get_queryset(self):
         """1) Выбираем только опубликованные продукты и сортируем их от новых к старым.
         2) Для отладки выводим в консоль последние 5 добавленных товаров. Символ '-' перед 'created_at' устанавливает
         порядок от новых к старым. Если не использовать символ '-' перед 'created_at', то порядок будет наоборот."""
-        queryset = Product.objects.filter(is_published=True).order_by("-created_at")
+        queryset = Product.objects.filter(is_published=True).order_by("-created_at", "-id")
         latest_products = queryset[:5]
         for product in latest_products:
             print(f"Название: {product.product_name}, Дата создания: {product.created_at}")
         return queryset  # Возвращает только опубликованные продукты
 
 
-@method_decorator(cache_page(60 * 15), name="dispatch")  # Декоратор для создания кеша для всей страницы
+def product_page_tags(request, pk):
+    """Теги страницы продукта: сам продукт и категории (на странице выводится название категории)."""
+    return [f"product:{pk}", "catalog:categories"]
+
+
+# 1) Условный GET (ETag / 304) проверяется первым, до обращения к кешу страницы.
+# 2) Декоратор для создания кеша для всей страницы. Кеш помечен тегами и сбрасывается сигналами при изменении продукта
+# (или любой категории, так как на странице выводится название категории):
+@method_decorator(
+    [conditional_page(tags=product_page_tags), tagged_cache_page(60 * 15, tags=product_page_tags)],
+    name="dispatch",
+)
 class CatalogDetailView(LoginRequiredMixin, DetailView):
     """Представление для отображения страницы с подробной информацией о продукте (product.html)."""
 
+    query_budget = 3
+
     model = Product
+    # Категория и владелец выводятся в шаблоне: загружаю их тем же запросом
+    queryset = Product.objects.select_related("category", "owner")
     template_name = "catalog/product.html"
     context_object_name = "product"
 
@@ -46,6 +72,8 @@ class CatalogDetailView(LoginRequiredMixin, DetailView):
 class CatalogCreateView(LoginRequiredMixin, CreateView):
     """Представление для отображения страницы с формой, которая позволяет пользователю добавлять новые товары в БД."""
 
+    query_budget = 4
+
     model = Product
     form_class = ProductForm
     template_name = "catalog/add_your_product.html"
@@ -70,6 +98,8 @@ class CatalogCreateView(LoginRequiredMixin, CreateView):
 class CatalogUpdateView(LoginRequiredMixin, UpdateView):
     """Представление для редактирования продукта в магазине."""
 
+    query_budget = 5
+
     model = Product
     form_class = ProductForm
     template_name = "catalog/add_your_product.html"
@@ -77,36 +107,29 @@ class CatalogUpdateView(LoginRequiredMixin, UpdateView):
     def dispatch(self, request, *args, **kwargs):
         """Метод выполняет проверку прав пользователя на редактирование продукта (владелец продукта), заранее до
         выполнения любого запроса (GET, POST и т.д.)."""
-        product = get_object_or_404(Product, pk=self.kwargs["pk"])
-        if not request.user == product.owner:
+        # Продукт загружаю один раз (get_object() возвращает его же), владельца сравниваю по owner_id - без запроса
+        # пользователя-владельца
+        self.object = product = get_object_or_404(Product, pk=self.kwargs["pk"])
+        if product.owner_id is None or request.user.pk != product.owner_id:
             return HttpResponseForbidden(
                 f"У вас нет прав для редактирования продукта. Обратитесь к владельцу: {product.owner}"
             )
         return super().dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        """Продукт уже загружен в dispatch()."""
+        return self.object
+
     def get_success_url(self):
         """Перенаправление на страницу с деталями продукта после успешного редактирования."""
         return reverse("catalog:product_detail_page", kwargs={"pk": self.object.pk})
 
-    def form_valid(self, form):
-        """Метод сброса кеша продукта (CatalogDetailView) и списка продуктов в категории (CatalogCategoryProductsView)
-        после редактирования каких-либо параметров продукта."""
-        response = super().form_valid(form)
-
-        # Формирую URL и удаляю кеш для конкретного продукта (CatalogDetailView)
-        product_cache_url = reverse("catalog:product_detail_page", kwargs={"pk": self.object.pk})
-        cache.delete(product_cache_url)
-
-        # Формирую URL и удаляю кеш для списка продуктов (CatalogCategoryProductsView) с помощью сервисной функции
-        category_cache_key = f"category_products_{self.object.category.pk}"
-        cache.delete(category_cache_key)
-
-        return response
-
 
 class CatalogDeleteView(LoginRequiredMixin, DeleteView):
     """Представление для удаления продукта в магазине."""
 
+    query_budget = 3
+
     model = Product
     template_name = "catalog/product_confirm_delete.html"
     context_object_name = "product"
@@ -117,13 +140,19 @@ class CatalogDeleteView(LoginRequiredMixin, DeleteView):
     def dispatch(self, request, *args, **kwargs):
         """Метод выполняет проверку прав пользователя на удаление продукта (владелец или модератор),
         заранее до выполнения любого запроса (GET, POST и т.д.)."""
-        product = get_object_or_404(Product, pk=self.kwargs["pk"])
-        if request.user.has_perm("catalog.delete_product") or request.user == product.owner:
+        # Продукт загружаю один раз (get_object() возвращает его же), владельца сравниваю по owner_id
+        self.object = product = get_object_or_404(Product, pk=self.kwargs["pk"])
+        is_owner = product.owner_id is not None and request.user.pk == product.owner_id
+        if is_owner or request.user.has_perm("catalog.delete_product"):
             return super().dispatch(request, *args, **kwargs)
         return HttpResponseForbidden(
             f"У вас нет прав для удаления продукта. Обратитесь к владельцу ({product.owner}) или модераторам магазина."
         )
 
+    def get_object(self, queryset=None):
+        """Продукт уже загружен в dispatch()."""
+        return self.object
+
     def form_valid(self, form):
         """Отправка пользователю уведомления о том, что продукт был удален."""
         # Получаю объект продукт
@@ -138,6 +167,8 @@ class CatalogContactsView(FormView):
     """Представление для отображения страницы с контактной информацией (contacts.html) и получением от
     пользователя обратной связи."""
 
+    query_budget = 3
+
     model = ContactsData
     template_name = "catalog/contacts.html"
     # Использую форму из 'catalog/forms.py' для заполнения и отправки пользователем обратной связи на странице
@@ -150,7 +181,10 @@ class CatalogContactsView(FormView):
         context = super().get_context_data(**kwargs)
         # Меняю базовое наименование объекта на 'contacts_data', чтоб не менять код на странице contacts.html, так
         # как эта страница уже использует название 'contacts_data':
-        context["contacts_data"] = get_object_or_404(ContactsData, id=1)
+        contacts_data = CatalogDataService.get_contacts_data()  # Контакты из кеша
+        if contacts_data is None:
+            raise Http404("Контактные данные магазина не заполнены.")
+        context["contacts_data"] = contacts_data
         return context
 
     def form_valid(self, form):
@@ -171,39 +205,120 @@ class CatalogContactsView(FormView):
 class CatalogPublicationView(PermissionRequiredMixin, View):
     """Представление Модератора для управления публикациями продуктов в магазине ('Опубликовать' / 'Отменить')."""
 
+    query_budget = 7
+
     # Устанавливаю для PermissionRequired, что требуется именно право 'can_change_product_publication':
     permission_required = "catalog.can_change_product_publication"
 
     def post(self, request, pk):
         """Метод обрабатывает POST-запрос на то, чтоб опубликовать или отменить публикацию продукта."""
-        product = get_object_or_404(Product, pk=pk)
+        product = get_object_or_404(Product.objects.only("pk", "is_published"), pk=pk)
         if not request.user.has_perm("catalog.can_change_product_publication"):
             return HttpResponseForbidden("У вас нет прав на управление публикациями продуктов.")
-        # Эта строка автоматически меняет статус публикации: если был True → станет False и наоборот. Удобно тем, что
-        # теперь и публиковать и отменять публикацию можно одним контроллером CatalogPublicationView, а не отдельными.
-        product.is_published = not product.is_published
-        product.save()
+        # Статус меняется на противоположный: если был True → станет False и наоборот. Удобно тем, что и публиковать и
+        # отменять публикацию можно одним контроллером. Меняю одним UPDATE только статуса (а не save() всей строки),
+        # счетчик и кеш обновляет ProductService.set_published()
+        ProductService.set_published([product.pk], not product.is_published)
+        return redirect("catalog:unpublished_products_page")
+
+
+class CatalogBulkPublicationView(PermissionRequiredMixin, View):
+    """Представление Модератора для массовой публикации / отмены публикации выбранных продуктов на странице
+    unpublished_products.html одним запросом к БД."""
+
+    query_budget = 6
+
+    permission_required = "catalog.can_change_product_publication"
+    max_products = 1000  # Ограничение количества продуктов в одном запросе
+
+    def post(self, request):
+        """Метод обрабатывает POST-запрос со списком ID продуктов (product_ids) и действием (action: "publish" или
+        "unpublish")."""
+        action = request.POST.get("action")
+        if action not in ("publish", "unpublish"):
+            return HttpResponseBadRequest("Неизвестное действие.")
+        try:
+            product_ids = {int(pk) for pk in request.POST.getlist("product_ids")}
+        except ValueError:
+            return HttpResponseBadRequest("Некорректный ID продукта.")
+        if len(product_ids) > self.max_products:
+            return HttpResponseBadRequest(f"За один раз можно изменить не больше {self.max_products} продуктов.")
+
+        if product_ids:
+            changed_ids = ProductService.set_published(product_ids, action == "publish")
+            verb = "Опубликовано" if action == "publish" else "Снято с публикации"
+            messages.success(request, f"{verb} продуктов: {len(changed_ids)}.")
+        else:
+            messages.warning(request, "Не выбрано ни одного продукта.")
+
+        # Возвращаю модератора на ту же страницу списка (если адрес внутри сайта)
+        next_url = request.POST.get("next")
+        if next_url and url_has_allowed_host_and_scheme(next_url, {request.get_host()}, request.is_secure()):
+            return redirect(next_url)
         return redirect("catalog:unpublished_products_page")
 
 
-class CatalogUnpublishedListView(PermissionRequiredMixin, ListView):
+class CatalogUnpublishedListView(PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     """Представление для страницы с неопубликованными продуктами (unpublished_products.html) с пагинацией."""
 
+    query_budget = 3
+
     model = Product
     template_name = "catalog/unpublished_products.html"
     context_object_name = "products"
     paginate_by = 6
+    count_cache_key = UnpublishedProductsCounter.cache_key  # Количество страниц по инкрементальному счетчику
 
     permission_required = "catalog.can_change_product_publication"  # Ограничиваю доступ, чтоб только Модератор мог
 
     def get_queryset(self):
         """Выбираем только неопубликованные продукты и сортируем их от новых к старым"""
-        return Product.objects.filter(is_published=False).order_by("-created_at")
+        return Product.objects.filter(is_published=False).order_by("-created_at", "-id")
+
 
+class CatalogModerationQueueView(PermissionRequiredMixin, View):
+    """Представление Модератора для очереди модерации (moderation_queue.html): модератор берет в работу пачку
+    следующих неопубликованных продуктов, которую на время захвата не видят другие модераторы (ModerationQueue)."""
 
-class CatalogCategoryProductsView(ListView):
+    query_budget = 3
+
+    permission_required = "catalog.can_change_product_publication"
+    template_name = "catalog/moderation_queue.html"
+    batch_size = 6  # Сколько продуктов модератор берет в работу за раз
+
+    def get(self, request):
+        """Метод выводит продукты, которые модератор уже взял в работу."""
+        products = ModerationQueue.get_claimed(request.user).select_related("category")
+        return render(
+            request,
+            self.template_name,
+            {"products": products, "batch_size": self.batch_size, "lease_minutes": ModerationQueue.lease.seconds // 60},
+        )
+
+    def post(self, request):
+        """Метод обрабатывает действия: "claim" - взять в работу следующие продукты (и продлить захват уже взятых),
+        "release" - вернуть все взятые продукты в общую очередь."""
+        if request.POST.get("action") == "release":
+            released = ModerationQueue.release(request.user)
+            messages.info(request, f"Возвращено в очередь продуктов: {released}.")
+        else:
+            claimed = ModerationQueue.claim(request.user, count=self.batch_size)
+            if not claimed:
+                messages.info(request, "Очередь модерации пуста.")
+        return redirect("catalog:moderation_queue_page")
+
+
+def category_page_tags(request, category_id=None):
+    """Теги страницы категории: выбранная категория (ее продукты) и список всех категорий (выпадающее меню)."""
+    return ["catalog:categories"] + ([f"category:{category_id}"] if category_id else [])
+
+
+@method_decorator(conditional_page(tags=category_page_tags), name="dispatch")
+class CatalogCategoryProductsView(KeysetPaginationMixin, ListView):
     """Представление для отображения списка всех опубликованных продуктов в указанной категории (с пагинацией)."""
 
+    query_budget = 3
+
     model = Product
     template_name = "catalog/category_products.html"
     context_object_name = "products"
@@ -219,8 +334,74 @@ class CatalogCategoryProductsView(ListView):
     def get_context_data(self, **kwargs):
         """Добавляем список категорий и текущую категорию в контекст шаблона."""
         context = super().get_context_data(**kwargs)
-        context["categories"] = Category.objects.all()  # Передаем список всех категорий
+        categories = CatalogDataService.get_categories()  # Список всех категорий из кеша
+        context["categories"] = categories
         category_id = self.kwargs.get("category_id")
         if category_id:
-            context["selected_category"] = Category.objects.get(pk=category_id)
+            selected_category = next((category for category in categories if category.pk == category_id), None)
+            if selected_category is None:
+                raise Http404("Категория не найдена.")
+            context["selected_category"] = selected_category
         return context
+
+
+class CatalogCacheStatsView(UserPassesTestMixin, View):
+    """Представление для персонала: статистика попаданий/промахов по уровням кеша (ближний уровень в памяти процесса
+    и Redis) для текущего воркера. Нужна для подбора размера ближнего уровня (NEAR_CACHE в settings.py)."""
+
+    query_budget = 2
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        get_stats = getattr(cache, "get_stats", None)  # Статистику отдает только NearCacheRedisCache
+        return JsonResponse(get_stats() if get_stats else {})
+
+
+class CatalogMemoryStatsView(UserPassesTestMixin, View):
+    """Представление для персонала: память воркера, который обработал запрос (RSS, tracemalloc, сборщик мусора), и
+    места кода с наибольшим ростом памяти с прошлого запроса к этой странице в этом воркере (снимки tracemalloc,
+    MEMORY["TRACEMALLOC"] в settings.py). Параметры: group=lineno|filename, top=20, reset=0 (не начинать новый
+    интервал)."""
+
+    query_budget = 2
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        group_by = request.GET.get("group", "lineno")
+        if group_by not in memory.GROUP_BY:
+            return HttpResponseBadRequest(f"group: {', '.join(memory.GROUP_BY)}")
+        try:
+            limit = int(request.GET.get("top", 20))
+        except ValueError:
+            return HttpResponseBadRequest("top: целое число")
+        data = memory.memory_stats()
+        if data["tracemalloc"]:
+            data["top"] = memory.tracker.diff(group_by, limit, reset=request.GET.get("reset") != "0")
+        return JsonResponse(data)
+
+
+class MetricsView(View):
+    """Представление для сбора метрик Prometheus (/metrics): метрики всех воркеров в текстовом формате Prometheus
+    (catalog/metrics.py). Доступ - по токену из METRICS["TOKEN"] (заголовок "Authorization: Bearer <токен>", так
+    авторизуется Prometheus) или для персонала."""
+
+    query_budget = 2
+
+    def get(self, request):
+        config = metrics.get_config()
+        if not config["ENABLED"]:
+            raise Http404
+        authorization = request.headers.get("Authorization", "")
+        token_ok = bool(config["TOKEN"]) and hmac.compare_digest(
+            authorization.encode(), f"Bearer {config['TOKEN']}".encode()
+        )
+        if not token_ok and not request.user.is_staff:
+            return HttpResponseForbidden()
+        data, processes = metrics.get_store().merge()
+        return HttpResponse(
+            metrics.render_prometheus(data, processes), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
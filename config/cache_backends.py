@@ -0,0 +1,573 @@
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import partial
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalLRUCache:
+    """Ограниченный по размеру LRU-кеш с TTL в памяти процесса (ближний уровень NearCacheRedisCache).
+    Значения хранятся в pickle, чтоб вызывающий код не мог изменить закешированный объект."""
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.epoch = 0  # Растет при каждой инвалидации (см. set())
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """:return: Пара (найдено ли значение, значение)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False, None
+            expires_at, data = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+        return True, pickle.loads(data)
+
+    def set(self, key, value, epoch=None):
+        """Сохраняет значение. Если передан epoch и с тех пор была инвалидация, значение не сохраняется: оно было
+        прочитано из Redis до инвалидации и уже могло устареть."""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._data[key] = (time.monotonic() + self.timeout, data)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self.epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.epoch += 1
+
+
+class NearCacheTier:
+    """Ближний уровень кеша, общий для всех потоков процесса (Django создает свой экземпляр бэкенда кеша в каждом
+    потоке, а LRU-кеш и подписка на инвалидацию нужны одни на процесс)."""
+
+    _tiers: dict[tuple[str, tuple[str, ...]], "NearCacheTier"] = {}  # (канал, серверы Redis) -> уровень
+    _tiers_lock = threading.Lock()
+
+    def __init__(self, max_entries, timeout):
+        self.local = LocalLRUCache(max_entries, timeout)
+        self.stats = dict.fromkeys(("local_hits", "local_misses", "remote_hits", "remote_misses", "invalidations"), 0)
+        self.stats_lock = threading.Lock()
+        self.subscribed = threading.Event()
+        self.listener_pid = None
+        self.listener_lock = threading.Lock()
+
+    @classmethod
+    def for_process(cls, key, max_entries, timeout):
+        with cls._tiers_lock:
+            if key not in cls._tiers:
+                cls._tiers[key] = cls(max_entries, timeout)
+            return cls._tiers[key]
+
+
+class NearCacheRedisCache(RedisCache):
+    """Двухуровневый кеш: LRU-кеш в памяти процесса перед RedisCache.
+    1) Ближний уровень используется только для ключей с префиксами из NEAR_CACHE["KEY_PREFIXES"] (редко меняющиеся
+       данные: версии тегов кеша, список категорий, контакты магазина), остальные ключи идут напрямую в Redis;
+    2) любая запись/удаление такого ключа публикуется в канал Redis pub/sub, и все процессы (воркеры gunicorn)
+       удаляют этот ключ из своего ближнего уровня;
+    3) пока процесс не подписан на канал (старт, разрыв соединения), ближний уровень не используется и очищается;
+    4) get_stats() возвращает попадания/промахи по каждому уровню для подбора размера.
+
+    Пример настройки в settings.py:
+        "BACKEND": "config.cache_backends.NearCacheRedisCache",
+        "NEAR_CACHE": {"MAX_ENTRIES": 1000, "TIMEOUT": 10, "KEY_PREFIXES": ["cache_tag:"], "CHANNEL": "..."}"""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = params.get("NEAR_CACHE", {})
+        self._local_prefixes = tuple(options.get("KEY_PREFIXES", ()))
+        self._channel = options.get("CHANNEL", "near-cache-invalidation")
+        self._tier = NearCacheTier.for_process(
+            (self._channel, tuple(self._servers)), options.get("MAX_ENTRIES", 1000), options.get("TIMEOUT", 10)
+        )
+
+    # --- Статистика ---
+
+    def _count(self, name, value=1):
+        with self._tier.stats_lock:
+            self._tier.stats[name] += value
+
+    def get_stats(self):
+        """Статистика попаданий/промахов по уровням кеша для текущего процесса."""
+        with self._tier.stats_lock:
+            stats = dict(self._tier.stats)
+        stats.update(
+            pid=os.getpid(),
+            local_size=len(self._tier.local),
+            local_max_entries=self._tier.local.max_entries,
+            local_evictions=self._tier.local.evictions,
+            subscribed=self._tier.subscribed.is_set(),
+        )
+        return stats
+
+    # --- Подписка на инвалидацию ---
+
+    def _use_local(self, key):
+        """Можно ли использовать ближний уровень для ключа (подходит префикс и процесс подписан на инвалидацию)."""
+        if not self._local_prefixes or not key.startswith(self._local_prefixes):
+            return False
+        self._ensure_listener()
+        return self._tier.subscribed.is_set()
+
+    def _ensure_listener(self):
+        """Запускает поток-подписчик в текущем процессе (после fork() воркера gunicorn поток нужно запустить заново)."""
+        if self._tier.listener_pid == os.getpid():
+            return
+        with self._tier.listener_lock:
+            if self._tier.listener_pid == os.getpid():
+                return
+            self._tier.listener_pid = os.getpid()
+            self._tier.subscribed.clear()
+            self._tier.local.clear()
+            threading.Thread(target=self._listen, name="near-cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._cache.get_client(write=False).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._channel)
+                self._tier.local.clear()  # Пока подписки не было, сообщения об инвалидации могли быть пропущены
+                self._tier.subscribed.set()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        payload = json.loads(message["data"])
+                        # Свои сообщения пропускаю: ключи уже удалены из ближнего уровня в _invalidate()
+                        if payload["origin"] != self._origin():
+                            self._apply_invalidation(payload["keys"])
+            except Exception:  # Любая ошибка соединения: отключаю ближний уровень и переподключаюсь
+                self._tier.subscribed.clear()
+                self._tier.local.clear()
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+                time.sleep(1)
+
+    def _apply_invalidation(self, keys):
+        if keys == "*":
+            self._tier.local.clear()
+        else:
+            for key in keys:
+                self._tier.local.delete(key)
+        self._count("invalidations")
+
+    def _origin(self):
+        """Идентификатор отправителя сообщений об инвалидации (процесс + ближний уровень)."""
+        return f"{os.getpid()}:{id(self._tier)}"
+
+    def _publish(self, keys):
+        message = json.dumps({"origin": self._origin(), "keys": keys})
+        self._cache.get_client(write=True).publish(self._channel, message)
+
+    def _invalidate(self, keys):
+        """Удаляет ключи из ближнего уровня текущего процесса и рассылает инвалидацию остальным процессам."""
+        made_keys = [made_key for key, made_key in keys if key.startswith(self._local_prefixes)]
+        if not self._local_prefixes or not made_keys:
+            return
+        for made_key in made_keys:
+            self._tier.local.delete(made_key)
+        self._publish(made_keys)
+
+    def _keys(self, keys, version):
+        return [(key, self.make_and_validate_key(key, version=version)) for key in keys]
+
+    # --- Чтение ---
+
+    def get(self, key, default=None, version=None):
+        if not self._use_local(key):
+            value = super().get(key, _MISSING, version=version)
+            self._count("remote_misses" if value is _MISSING else "remote_hits")
+            return default if value is _MISSING else value
+
+        made_key = self.make_and_validate_key(key, version=version)
+        found, value = self._tier.local.get(made_key)
+        if found:
+            self._count("local_hits")
+            return value
+        self._count("local_misses")
+        epoch = self._tier.local.epoch
+        value = self._cache.get(made_key, _MISSING)
+        if value is _MISSING:
+            self._count("remote_misses")
+            return default
+        self._count("remote_hits")
+        self._tier.local.set(made_key, value, epoch=epoch)
+        return value
+
+    def get_many(self, keys, version=None):
+        result = {}
+        remote_keys = []
+        for key in keys:
+            if self._use_local(key):
+                found, value = self._tier.local.get(self.make_and_validate_key(key, version=version))
+                if found:
+                    result[key] = value
+                    self._count("local_hits")
+                    continue
+                self._count("local_misses")
+            remote_keys.append(key)
+
+        if remote_keys:
+            epoch = self._tier.local.epoch
+            found = super().get_many(remote_keys, version=version)
+            self._count("remote_hits", len(found))
+            self._count("remote_misses", len(remote_keys) - len(found))
+            for key, value in found.items():
+                if self._use_local(key):
+                    self._tier.local.set(self.make_and_validate_key(key, version=version), value, epoch=epoch)
+            result.update(found)
+        return result
+
+    # --- Запись (сквозная запись в Redis + инвалидация ближнего уровня во всех процессах) ---
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = super().add(key, value, timeout, version=version)
+        if added:
+            self._invalidate(self._keys([key], version))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        super().set(key, value, timeout, version=version)
+        self._invalidate(self._keys([key], version))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = super().touch(key, timeout, version=version)
+        self._invalidate(self._keys([key], version))
+        return touched
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version=version)
+        self._invalidate(self._keys([key], version))
+        return deleted
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version=version)
+        self._invalidate(self._keys([key], version))
+        return value
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version=version)
+        self._invalidate(self._keys(data, version))
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        super().delete_many(keys, version=version)
+        self._invalidate(self._keys(keys, version))
+
+    def clear(self):
+        cleared = super().clear()
+        self._tier.local.clear()
+        self._publish("*")
+        return cleared
+
+
+class CircuitBreaker:
+    """Предохранитель (circuit breaker) для Redis, общий для всех потоков процесса:
+    1) closed - запросы идут в Redis; после failure_threshold ошибок подряд (соединение, таймаут) он размыкается;
+    2) open - запросы к Redis не выполняются (сразу локальный кеш процесса) reset_timeout секунд;
+    3) half_open - один пробный запрос идет в Redis (остальные - в локальный кеш): успех замыкает предохранитель,
+       ошибка снова размыкает его на reset_timeout секунд.
+    Ключи, которые записывались или удалялись, пока Redis был недоступен, запоминаются (не больше max_dirty_keys):
+    после восстановления они удаляются из Redis, чтоб в нем не осталось значений, устаревших за время сбоя."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    _breakers: dict[tuple[int, tuple[str, ...]], "CircuitBreaker"] = {}  # (pid, серверы Redis) -> предохранитель
+    _breakers_lock = threading.Lock()
+
+    def __init__(self, failure_threshold, reset_timeout, max_dirty_keys):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_dirty_keys = max_dirty_keys
+        self.state = self.CLOSED
+        self.failures = 0  # Ошибок подряд
+        self.opened_at = 0.0
+        self.dirty_keys = set()  # (ключ, версия)
+        self.dirty_overflow = False
+        self.stats = dict.fromkeys(("opens", "failures", "fallback_operations"), 0)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_process(cls, key, failure_threshold, reset_timeout, max_dirty_keys):
+        """Предохранитель процесса (после fork() у воркера gunicorn - свой, с состоянием closed)."""
+        key = (os.getpid(), key)
+        with cls._breakers_lock:
+            if key not in cls._breakers:
+                cls._breakers[key] = cls(failure_threshold, reset_timeout, max_dirty_keys)
+            return cls._breakers[key]
+
+    def allow(self):
+        """Можно ли выполнить запрос к Redis. В состоянии open после reset_timeout секунд первый вызов переводит
+        предохранитель в half_open и выполняет пробный запрос."""
+        if self.state == self.CLOSED:
+            return True
+        with self.lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """:return: True, если предохранитель замкнулся после пробного запроса (Redis снова доступен)."""
+        if self.state == self.CLOSED and not self.failures:
+            return False
+        with self.lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            return recovered
+
+    def record_failure(self):
+        """:return: True, если после этой ошибки замкнутый предохранитель разомкнулся (начало сбоя Redis; неудачная
+        проба в half_open снова размыкает его, но сбой тот же)."""
+        with self.lock:
+            self.stats["failures"] += 1
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.stats["opens"] += 1
+                return True
+            return False
+
+    def record_fallback(self, keys=(), version=None):
+        with self.lock:
+            self.stats["fallback_operations"] += 1
+            for key in keys:
+                if len(self.dirty_keys) >= self.max_dirty_keys:
+                    self.dirty_overflow = True
+                    break
+                self.dirty_keys.add((key, version))
+
+    def take_dirty_keys(self):
+        """:return: (ключи по версиям {версия: [ключи]}, было ли переполнение), запомненные ключи забываются."""
+        with self.lock:
+            dirty_keys, overflow = self.dirty_keys, self.dirty_overflow
+            self.dirty_keys, self.dirty_overflow = set(), False
+        by_version = defaultdict(list)
+        for key, version in dirty_keys:
+            by_version[version].append(key)
+        return by_version, overflow
+
+    def get_stats(self):
+        with self.lock:
+            return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
+
+
+class ResilientRedisCache(NearCacheRedisCache):
+    """NearCacheRedisCache, который не останавливает сайт, когда Redis недоступен или отвечает медленно:
+    1) короткие таймауты сокета (OPTIONS "socket_timeout" и "socket_connect_timeout" в settings.py) ограничивают
+       ожидание одного запроса к Redis;
+    2) после CIRCUIT_BREAKER["FAILURE_THRESHOLD"] ошибок подряд предохранитель (CircuitBreaker) размыкается, и все
+       операции кеша процесса выполняются в локальном кеше в памяти (LocMemCache, не больше FALLBACK_MAX_ENTRIES
+       записей, время жизни не больше FALLBACK_TIMEOUT секунд: инвалидация в нем не видна другим воркерам);
+    3) через RESET_TIMEOUT секунд один пробный запрос проверяет Redis; после восстановления ключи, записанные за время
+       сбоя, удаляются из Redis, а локальный кеш очищается.
+    Ошибка Redis никогда не доходит до вызывающего кода: операция выполняется в локальном кеше.
+
+    Пример настройки в settings.py:
+        "BACKEND": "config.cache_backends.ResilientRedisCache",
+        "OPTIONS": {"socket_timeout": 0.25, "socket_connect_timeout": 0.1},
+        "CIRCUIT_BREAKER": {"FAILURE_THRESHOLD": 3, "RESET_TIMEOUT": 5, "FALLBACK_TIMEOUT": 30}"""
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        options = params.get("CIRCUIT_BREAKER", {})
+        self._breaker = CircuitBreaker.for_process(
+            tuple(self._servers),
+            options.get("FAILURE_THRESHOLD", 3),
+            options.get("RESET_TIMEOUT", 5),
+            options.get("MAX_DIRTY_KEYS", 10000),
+        )
+        self._fallback_timeout = options.get("FALLBACK_TIMEOUT", 30)
+        # LocMemCache с одним и тем же именем хранит данные в общем словаре процесса (для всех потоков)
+        self._fallback = LocMemCache(
+            f"circuit-breaker-fallback:{','.join(self._servers)}",
+            {
+                "TIMEOUT": self._fallback_timeout,
+                "KEY_PREFIX": params.get("KEY_PREFIX", ""),
+                "VERSION": params.get("VERSION", 1),
+                "KEY_FUNCTION": params.get("KEY_FUNCTION"),
+                "OPTIONS": {"MAX_ENTRIES": options.get("FALLBACK_MAX_ENTRIES", 1000)},
+            },
+        )
+
+    def get_stats(self):
+        stats = super().get_stats()
+        stats["circuit_breaker"] = self.get_breaker_stats()
+        return stats
+
+    def get_breaker_stats(self):
+        """Состояние предохранителя процесса и счетчики (размыкания, ошибки Redis, операции в локальном кеше)."""
+        return self._breaker.get_stats()
+
+    def _call(self, remote, fallback, written=(), version=None):
+        """Выполняет операцию в Redis (remote) или, если предохранитель разомкнут или Redis ответил ошибкой, в
+        локальном кеше (fallback). written - ключи, которые операция меняет (удаляются из Redis после сбоя)."""
+        if self._breaker.allow():
+            try:
+                result = remote()
+            except RedisError as error:
+                if self._breaker.record_failure():
+                    logger.warning("Redis недоступен (%s): кеш переключен на память процесса %d", error, os.getpid())
+            except Exception:
+                # Другая ошибка (например, ValueError у incr() несуществующего ключа) - Redis ответил, т.е. доступен.
+                # Без record_success() пробный запрос в half_open не завершился бы, и предохранитель остался бы в
+                # half_open навсегда (allow() возвращает False всем остальным вызовам)
+                if self._breaker.record_success():
+                    self._recover()
+                raise
+            else:
+                if self._breaker.record_success():
+                    self._recover()
+                return result
+        self._breaker.record_fallback(written, version)
+        return fallback()
+
+    def guarded(self, operation, fallback):
+        """Своя операция с Redis (например, команда клиента self._cache.get_client()) под защитой предохранителя:
+        пока Redis недоступен или если operation() завершилась ошибкой Redis, возвращается результат fallback()."""
+        return self._call(operation, fallback)
+
+    def _recover(self):
+        """Redis снова доступен: удаляю из него ключи, измененные за время сбоя, и очищаю локальный кеш."""
+        by_version, overflow = self._breaker.take_dirty_keys()
+        try:
+            for version, keys in by_version.items():
+                super().delete_many(keys, version=version)
+        except RedisError:
+            for version, keys in by_version.items():
+                self._breaker.record_fallback(keys, version)  # Удалю при следующем восстановлении
+            self._breaker.record_failure()
+            return
+        self._fallback.clear()
+        logger.warning(
+            "Redis снова доступен: процесс %d вернул кеш в Redis, удалено измененных за время сбоя ключей: %d%s",
+            os.getpid(),
+            sum(len(keys) for keys in by_version.values()),
+            " (не все: ключей было больше MAX_DIRTY_KEYS)" if overflow else "",
+        )
+
+    def _local_timeout(self, timeout):
+        """Время жизни записи в локальном кеше: не больше FALLBACK_TIMEOUT секунд."""
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self._fallback_timeout
+        return min(timeout, self._fallback_timeout)
+
+    def get(self, key, default=None, version=None):
+        return self._call(
+            partial(super().get, key, default, version=version),
+            partial(self._fallback.get, key, default, version=version),
+        )
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        return self._call(
+            partial(super().get_many, keys, version=version), partial(self._fallback.get_many, keys, version=version)
+        )
+
+    def has_key(self, key, version=None):
+        return self._call(
+            partial(super().has_key, key, version=version), partial(self._fallback.has_key, key, version=version)
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(
+            partial(super().add, key, value, timeout, version=version),
+            partial(self._fallback.add, key, value, self._local_timeout(timeout), version=version),
+            [key],
+            version,
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._call(
+            partial(super().set, key, value, timeout, version=version),
+            partial(self._fallback.set, key, value, self._local_timeout(timeout), version=version),
+            [key],
+            version,
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(
+            partial(super().touch, key, timeout, version=version),
+            partial(self._fallback.touch, key, self._local_timeout(timeout), version=version),
+            [key],
+            version,
+        )
+
+    def delete(self, key, version=None):
+        return self._call(
+            partial(super().delete, key, version=version),
+            partial(self._fallback.delete, key, version=version),
+            [key],
+            version,
+        )
+
+    def incr(self, key, delta=1, version=None):
+        return self._call(
+            partial(super().incr, key, delta, version=version),
+            partial(self._fallback.incr, key, delta, version=version),
+            [key],
+            version,
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._call(
+            partial(super().set_many, data, timeout, version=version),
+            partial(self._fallback.set_many, data, self._local_timeout(timeout), version=version),
+            list(data),
+            version,
+        )
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._call(
+            partial(super().delete_many, keys, version=version),
+            partial(self._fallback.delete_many, keys, version=version),
+            keys,
+            version,
+        )
+
+    def clear(self):
+        self._fallback.clear()
+        return self._call(super().clear, lambda: True)
@@ -5,4 +5,8 @@ FORBIDDEN_WORDS = {"казино", "криптовалюта", "крипта", "
 MAX_IMAGE_SIZE = 5 * 1024 * 1024
 
 # Допустимые форматы загружаемых файлов
-ALLOWED_IMAGE_FORMATS = ["image/jpeg", "image/png"]
\ No newline at end of file
+ALLOWED_IMAGE_FORMATS = ["image/jpeg", "image/png"]
+
+# Максимальные размеры загружаемого изображения в пикселях (проверяются по заголовку файла, до декодирования)
+MAX_IMAGE_SIDE = 8000
+MAX_IMAGE_PIXELS = 40_000_000
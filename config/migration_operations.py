@@ -0,0 +1,19 @@
+from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+from django.db.migrations.operations import AddIndex
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    """Операция миграции CREATE INDEX CONCURRENTLY (индекс строится без блокировки записи в таблицу) на Postgres.
+    На других БД (SQLite для локальных проверок и нагрузочного теста) индекс создается обычным CREATE INDEX."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
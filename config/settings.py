@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os
 from pathlib import Path
+from typing import Any
 
 from django.conf.global_settings import AUTH_USER_MODEL, LOGIN_URL
 from dotenv import load_dotenv
@@ -32,6 +33,9 @@ SECRET_KEY = os.getenv('SECRET_KEY_FOR_PROJECT')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True if os.getenv('DEBUG') == 'True' else False
 
+# Запись SQL-запросов каждого запроса к сайту с поиском N+1 (catalog/query_inspector.py), только для разработки
+QUERY_INSPECTOR = os.getenv('QUERY_INSPECTOR') == 'True'
+
 ALLOWED_HOSTS = ['*']
 
 
@@ -51,20 +55,33 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым в списке, чтоб замерять время всех остальных middleware: заголовок Server-Timing и лог времени запросов
+    'catalog.server_timing.ServerTimingMiddleware',
+    # Метрики для Prometheus (/metrics): время ответа, коды ответов, SQL-запросы и кеш по представлениям
+    'catalog.metrics.MetricsMiddleware',
+    # Журнал медленных SQL-запросов (SLOW_QUERIES ниже): представление и путь страницы для записей журнала
+    'catalog.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Только для разработки (QUERY_INSPECTOR=True): лог N+1 и превышения бюджета SQL-запросов представлений
+    'catalog.query_inspector.QueryInspectorMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # После AuthenticationMiddleware (нужен request.user): профилирование запросов по ссылке сотрудника и каждого N-го
+    'catalog.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Память воркеров (MEMORY ниже): tracemalloc и перезапуск воркера при превышении RSS, по умолчанию выключено
+    'catalog.memory.MemoryMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Бэкенд Django с замером времени рендеринга для заголовка Server-Timing (catalog/server_timing.py)
+        'BACKEND': 'catalog.server_timing.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -87,7 +104,7 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+DATABASES: dict[str, dict[str, Any]] = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
         'NAME': os.getenv('DATABASE_SKYSTORE'),
@@ -97,6 +114,18 @@ DATABASES = {
         'PORT': os.getenv('DATABASE_PORT', default='5432'),
     }
 }
+# Для локальных проверок (например, нагрузочного теста load_test) без Postgres: DATABASE_ENGINE=sqlite, файл БД -
+# DATABASE_SKYSTORE (по умолчанию db.sqlite3 в корне проекта)
+if os.getenv('DATABASE_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DATABASE_SKYSTORE') or BASE_DIR / 'db.sqlite3',
+            # Запись берет блокировку сразу в начале транзакции: параллельные запросы ждут ее, а не падают с
+            # "database is locked" при попытке повысить блокировку чтения до записи
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        }
+    }
 
 
 # Password validation
@@ -141,6 +170,93 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Производные изображения (catalog/images.py): ширины миниатюр по видам изображений, качество WebP/JPEG и
+# количество процессов в пуле обработки изображений (в каждом воркере gunicorn)
+IMAGE_DERIVATIVES = {
+    'WIDTHS': {
+        'product': [250, 500, 1000],
+        'article': [250, 500, 1000],
+        'avatar': [40, 80, 160],
+    },
+    'QUALITY': 80,
+    'WORKERS': 2,
+}
+
+# Разбивка времени запросов к сайту по сегментам (БД, кеш, шаблоны, письма) - catalog/server_timing.py:
+# заголовок Server-Timing (персоналу или всем, если PUBLIC_HEADER) и строка JSON в логе для доли LOG_SAMPLE_RATE
+# запросов и всех запросов дольше SLOW_MS миллисекунд
+SERVER_TIMING = {
+    'ENABLED': (os.getenv('SERVER_TIMING') or 'True') == 'True',
+    'PUBLIC_HEADER': DEBUG,
+    'LOG_SAMPLE_RATE': float(os.getenv('SERVER_TIMING_SAMPLE_RATE') or 0.01),
+    'SLOW_MS': 1000,
+}
+
+# Метрики сайта для Prometheus (catalog/metrics.py): каждый воркер раз в FLUSH_INTERVAL секунд сохраняет свои метрики
+# в файл в каталоге DIR (общий для всех воркеров), эндпоинт /metrics их суммирует. Файлы завершившихся воркеров
+# переносятся в архив metrics/archive.json, поэтому каталог не растет.
+# TOKEN - токен Prometheus (заголовок "Authorization: Bearer <токен>"), без него /metrics доступен только персоналу
+METRICS = {
+    'ENABLED': (os.getenv('METRICS') or 'True') == 'True',
+    'DIR': os.getenv('METRICS_DIR') or BASE_DIR / 'metrics',
+    'TOKEN': os.getenv('METRICS_TOKEN') or '',
+    'FLUSH_INTERVAL': 1,
+}
+
+# Профилирование запросов (catalog/profiling.py): по подписанной ссылке сотрудника (команда make_profile_link) и
+# каждого SAMPLE_EVERY-го запроса (0 - выключено) со сводными отчетами (команда profile_report). ENGINE - "sampling"
+# (сэмплирующий профилировщик, снимок стека раз в INTERVAL секунд) или "cprofile"; файлы профилей пишутся в DIR
+PROFILING = {
+    'ENABLED': True,
+    'DIR': os.getenv('PROFILING_DIR') or BASE_DIR / 'profiles',
+    'ENGINE': 'sampling',
+    'INTERVAL': 0.002,
+    'TOP': 30,
+    'TOKEN_MAX_AGE': 60 * 60,
+    'SAMPLE_EVERY': int(os.getenv('PROFILING_SAMPLE_EVERY') or 0),
+    'ROLL_INTERVAL': 300,
+}
+
+# Память воркеров (catalog/memory.py): TRACEMALLOC - снимки памяти tracemalloc (страница memory_stats для персонала,
+# команда memory_diff), замедляет выделение памяти, поэтому по умолчанию выключен. MAX_RSS_MB - перезапуск воркера
+# gunicorn, если после запроса его RSS больше лимита (проверка раз в RSS_CHECK_EVERY запросов), 0 - выключено
+MEMORY = {
+    'TRACEMALLOC': os.getenv('MEMORY_TRACEMALLOC') == 'True',
+    'TRACEMALLOC_FRAMES': 1,
+    'MAX_RSS_MB': int(os.getenv('WORKER_MAX_RSS_MB') or 0),
+    'RSS_CHECK_EVERY': 10,
+}
+
+# Журнал медленных SQL-запросов (catalog/slow_queries.py): запросы дольше THRESHOLD_MS миллисекунд пишутся строкой JSON
+# в LOG_FILE (отпечаток SQL, представление, место в коде или шаблоне), для части из них - план EXPLAIN (ANALYZE,
+# BUFFERS): не больше EXPLAIN_PER_MINUTE в минуту на воркер и не чаще раза в EXPLAIN_INTERVAL секунд для одного
+# запроса, с таймаутом EXPLAIN_TIMEOUT_MS. Сводка по худшим запросам - команда slow_query_report
+SLOW_QUERIES = {
+    'ENABLED': (os.getenv('SLOW_QUERIES') or 'True') == 'True',
+    'THRESHOLD_MS': int(os.getenv('SLOW_QUERY_MS') or 200),
+    'LOG_FILE': os.getenv('SLOW_QUERY_LOG') or BASE_DIR / 'logs' / 'slow_queries.jsonl',
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'EXPLAIN': (os.getenv('SLOW_QUERY_EXPLAIN') or 'True') == 'True',
+    'EXPLAIN_PER_MINUTE': 6,
+    'EXPLAIN_INTERVAL': 600,
+    'EXPLAIN_TIMEOUT_MS': 10000,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console_plain': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        # Строки JSON для системы сбора логов
+        'catalog.server_timing': {'handlers': ['console_plain'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -148,11 +264,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.UserCustomer'
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.yandex.ru'
-EMAIL_PORT = 465
+# Письма отправляет команда send_outbox_emails (очередь users.OutboxEmail), а не запрос пользователя. Для локальной
+# проверки бэкенд и сервер можно заменить через .env: файловый бэкенд (EMAIL_BACKEND=
+# django.core.mail.backends.filebased.EmailBackend, EMAIL_FILE_PATH=...) или локальный SMTP-сервер
+# (python -m aiosmtpd -n -l localhost:8025 и EMAIL_HOST=localhost, EMAIL_PORT=8025, EMAIL_USE_SSL=False)
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND') or 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_HOST = os.getenv('EMAIL_HOST') or 'smtp.yandex.ru'
+EMAIL_PORT = int(os.getenv('EMAIL_PORT') or 465)
 EMAIL_USE_TLS = False
-EMAIL_USE_SSL = True
+EMAIL_USE_SSL = (os.getenv('EMAIL_USE_SSL') or 'True') == 'True'
+EMAIL_TIMEOUT = 10  # Таймаут сокета SMTP (сек.), чтоб зависший сервер не блокировал воркер очереди писем
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH') or BASE_DIR / 'sent_emails'
 EMAIL_HOST_USER = os.getenv('YANDEX_EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('YANDEX_EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
@@ -166,7 +288,31 @@ CACHE_ENABLED = True
 if CACHE_ENABLED:
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            # Двухуровневый кеш: LRU-кеш в памяти процесса перед Redis для редко меняющихся данных (версии тегов кеша,
+            # список категорий, контакты). Инвалидация ближнего уровня рассылается всем воркерам через Redis pub/sub.
+            # Если Redis недоступен или медленный, после FAILURE_THRESHOLD ошибок подряд кеш воркера переключается на
+            # память процесса (записи живут не больше FALLBACK_TIMEOUT сек.), раз в RESET_TIMEOUT сек. - проба Redis
+            'BACKEND': 'config.cache_backends.ResilientRedisCache',
             'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                # Таймауты сокета Redis (сек.): медленный Redis не должен задерживать запрос к сайту на секунды
+                'socket_timeout': float(os.getenv('REDIS_SOCKET_TIMEOUT') or 0.25),
+                'socket_connect_timeout': float(os.getenv('REDIS_CONNECT_TIMEOUT') or 0.1),
+            },
+            'CIRCUIT_BREAKER': {
+                'FAILURE_THRESHOLD': 3,
+                'RESET_TIMEOUT': 5,
+                'FALLBACK_MAX_ENTRIES': 1000,
+                'FALLBACK_TIMEOUT': 30,
+                'MAX_DIRTY_KEYS': 10000,
+            },
+            'NEAR_CACHE': {
+                'MAX_ENTRIES': 1000,
+                'TIMEOUT': 10,
+                'KEY_PREFIXES': ['cache_tag:', 'catalog_categories', 'catalog_contacts'],
+            },
         }
     }
+    # Для локальных проверок без Redis: CACHE_BACKEND=locmem (кеш в памяти процесса)
+    if os.getenv('CACHE_BACKEND') == 'locmem':
+        CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
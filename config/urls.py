@@ -19,12 +19,16 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from catalog.views import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     # namespace='catalog' это заданное пространство имен, которое есть в catalog/urls.py с помощью CatalogConfig.name
     path('catalog/', include('catalog.urls', namespace='catalog')),
     path('blog/', include('blog.urls', namespace='blog')),
-    path('users/', include('users.urls', namespace='users'))
+    path('users/', include('users.urls', namespace='users')),
+    # Метрики для Prometheus (catalog/metrics.py), доступ по токену METRICS_TOKEN или для персонала
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from users.models import UserCustomer
+from users.models import OutboxEmail, UserCustomer
 
 
 @admin.register(UserCustomer)
@@ -45,3 +45,13 @@ class UserCustomerAdmin(UserAdmin):
             },
         ),
     )
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    """Настройка отображения очереди писем в админке (только просмотр состояния отправки)."""
+
+    list_display = ("subject", "recipients", "status", "attempts", "next_attempt_at", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("subject", "recipients")
+    readonly_fields = ("attempts", "last_error", "created_at", "sent_at")
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        """Подключаю сигналы модели UserCustomer (производные изображения аватара)."""
+        import users.signals  # noqa: F401
@@ -6,6 +6,7 @@ from django.contrib.auth.forms import (
 )
 from django.core.exceptions import ValidationError
 
+from catalog.uploads import SafeImageField
 from users.models import UserCustomer
 
 
@@ -89,6 +90,8 @@ class UserProfileEditForm(forms.ModelForm):
             "phone_number",
             "country",
         )
+        # Проверка формата (JPEG/PNG по сигнатуре файла), размера файла и размеров в пикселях до декодирования
+        field_classes = {"avatar": SafeImageField}
         widgets = {
             "email": forms.EmailInput(
                 attrs={"readonly": "readonly"}
@@ -0,0 +1,66 @@
+import time
+from contextlib import suppress
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+
+from users.services import MAX_ATTEMPTS, EmailOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Кастомная команда для отправки писем из очереди (users.OutboxEmail) пачками через одно SMTP-соединение, "
+        "с повторными попытками при ошибках."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Сколько писем отправлять за одну пачку.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=0,
+            help="Проверять очередь каждые N секунд (по умолчанию - отправить все готовые письма и выйти, например, "
+            "для cron).",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=MAX_ATTEMPTS,
+            help="Количество попыток, после которого письмо помечается как неотправленное.",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["max_attempts"] < 1:
+            raise CommandError("Размер пачки и количество попыток должны быть больше 0.")
+        # Одно соединение на все пачки: на каждое письмо не тратится подключение, TLS и авторизация на сервере
+        connection = get_connection(fail_silently=False)
+        try:
+            while True:
+                totals = self.drain_ready(connection, options["batch_size"], options["max_attempts"])
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Отправлено: {totals['sent']}, отложено для повтора: {totals['retried']}, "
+                        f"не отправлено: {totals['failed']}."
+                    )
+                )
+                if not options["interval"]:
+                    break
+                # Пока очередь пуста, соединение не держу (сервер все равно закроет простаивающее соединение)
+                with suppress(OSError):
+                    connection.close()
+                time.sleep(options["interval"])
+        finally:
+            with suppress(OSError):
+                connection.close()
+
+    @staticmethod
+    def drain_ready(connection, batch_size, max_attempts):
+        """Отправляет пачки, пока они полные (в очереди есть еще письма, время отправки которых наступило)."""
+        totals = {"sent": 0, "retried": 0, "failed": 0}
+        while True:
+            result = EmailOutbox.drain(connection, batch_size=batch_size, max_attempts=max_attempts)
+            for key, value in result.items():
+                totals[key] += value
+            if sum(result.values()) < batch_size or result["retried"] == batch_size:
+                # Пачка неполная или отложена вся (сервер недоступен) - жду следующей проверки
+                return totals
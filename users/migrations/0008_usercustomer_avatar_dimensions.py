@@ -0,0 +1,27 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0007_alter_usercustomer_managers_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usercustomer",
+            name="avatar_height",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Высота аватара:"
+            ),
+        ),
+        migrations.AddField(
+            model_name="usercustomer",
+            name="avatar_width",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="Ширина аватара:"
+            ),
+        ),
+    ]
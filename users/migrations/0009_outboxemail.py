@@ -0,0 +1,95 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0008_usercustomer_avatar_dimensions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "subject",
+                    models.CharField(max_length=255, verbose_name="Тема письма"),
+                ),
+                ("body", models.TextField(verbose_name="Текст письма")),
+                (
+                    "from_email",
+                    models.CharField(
+                        blank=True, max_length=254, verbose_name="Отправитель"
+                    ),
+                ),
+                ("recipients", models.JSONField(verbose_name="Получатели")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Ожидает отправки"),
+                            ("sent", "Отправлено"),
+                            ("failed", "Не отправлено"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Количество попыток"
+                    ),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Следующая попытка",
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Последняя ошибка"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата отправки"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Письмо в очереди",
+                "verbose_name_plural": "Очередь писем",
+                "db_table": "users_outbox_emails",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pending")),
+                        fields=["next_attempt_at", "id"],
+                        name="outbox_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 from phonenumber_field.modelfields import PhoneNumberField  # type: ignore
 from users.managers import UserCustomerManager
 
@@ -20,6 +21,9 @@ class UserCustomer(AbstractUser):
         verbose_name="Аватар:",
         help_text="Загрузите аватар",
     )
+    # Размеры оригинала аватара заполняются после создания производных изображений (catalog/images.py)
+    avatar_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Ширина аватара:")
+    avatar_height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name="Высота аватара:")
     phone_number = PhoneNumberField(
         blank=True,
         null=True,
@@ -59,3 +63,46 @@ class UserCustomer(AbstractUser):
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
         ordering = ["email"]
+
+
+class OutboxEmail(models.Model):
+    """Модель OutboxEmail представляет письмо в очереди на отправку (outbox). Представления только добавляют письмо
+    в очередь (EmailOutbox.enqueue), а отправляет письма команда send_outbox_emails."""
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Ожидает отправки"),
+        (SENT, "Отправлено"),
+        (FAILED, "Не отправлено"),
+    ]
+
+    subject = models.CharField(max_length=255, verbose_name="Тема письма")
+    body = models.TextField(verbose_name="Текст письма")
+    from_email = models.CharField(max_length=254, blank=True, verbose_name="Отправитель")
+    recipients = models.JSONField(verbose_name="Получатели")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, verbose_name="Статус")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Количество попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Дата отправки")
+
+    def __str__(self):
+        """Метод определяет строковое представление объекта. Полезно для отображения объектов в админке/консоли."""
+        return f"{self.subject} → {', '.join(self.recipients)}"
+
+    class Meta:
+        verbose_name = "Письмо в очереди"
+        verbose_name_plural = "Очередь писем"
+        ordering = ["-created_at"]
+        db_table = "users_outbox_emails"
+        # Частичный индекс под выборку воркера: filter(status="pending", next_attempt_at__lte=now)
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at", "id"],
+                condition=models.Q(status="pending"),
+                name="outbox_pending_idx",
+            ),
+        ]
@@ -0,0 +1,134 @@
+import random
+import smtplib
+from contextlib import suppress
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from catalog.server_timing import track
+from users.models import OutboxEmail
+
+# Повторные попытки отправки: пауза 1, 2, 4, ... минут (не больше часа), после MAX_ATTEMPTS попыток письмо
+# помечается как неотправленное
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 60 * 60
+MAX_ATTEMPTS = 8
+
+# Ошибки соединения с SMTP-сервером (кроме них - любые ошибки сокета): письмо не виновато, соединение нужно открыть
+# заново
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+
+
+class EmailOutbox:
+    """Класс для асинхронной отправки писем через очередь в БД (модель OutboxEmail).
+    1) Представления вызывают только enqueue(): медленный или недоступный SMTP-сервер не влияет на время ответа и
+       не дает 500. Письмо попадает в транзакцию вызывающего кода: представления регистрации и редактирования
+       профиля вызывают enqueue() внутри transaction.atomic() вместе с сохранением данных;
+    2) команда send_outbox_emails вызывает drain(): письма отправляются пачками через одно открытое
+       SMTP-соединение, неудачные попытки повторяются с экспоненциальной паузой (backoff). Доставка - "хотя бы один
+       раз": если воркер упал после отправки письма, но до коммита пачки, письмо будет отправлено повторно."""
+
+    @staticmethod
+    def enqueue(subject, message, recipient_list, from_email=None):
+        """Функция добавляет письмо в очередь на отправку (в текущей транзакции, если она открыта).
+        :param subject: Тема письма.
+        :param message: Текст письма.
+        :param recipient_list: Список адресов получателей.
+        :param from_email: Адрес отправителя (по умолчанию DEFAULT_FROM_EMAIL).
+        :return: Письмо в очереди (OutboxEmail)."""
+        with track("email"):  # Сегмент "email" в заголовке Server-Timing
+            return OutboxEmail.objects.create(
+                subject=subject, body=message, from_email=from_email or "", recipients=list(recipient_list)
+            )
+
+    @staticmethod
+    def retry_delay(attempts):
+        """Пауза перед следующей попыткой (экспоненциальная, со случайным разбросом до 10%, чтоб письма, не
+        отправленные из-за одного сбоя, не повторялись одновременно)."""
+        delay = min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+        return timedelta(seconds=delay * random.uniform(1.0, 1.1))
+
+    @classmethod
+    def drain(cls, connection=None, batch_size=50, max_attempts=MAX_ATTEMPTS):
+        """Функция отправляет одну пачку писем, время отправки которых наступило.
+        Письма выбираются с блокировкой строк (SELECT ... FOR UPDATE SKIP LOCKED), поэтому несколько воркеров не
+        отправят одно письмо дважды. Строки остаются заблокированными, пока пачка отправляется по SMTP, а статус
+        SENT сохраняется при коммите после отправки всей пачки: если процесс упадет до коммита, транзакция
+        откатится, и уже отправленные письма пачки уйдут еще раз (доставка "хотя бы один раз"; размер пачки
+        ограничивает количество таких повторов). Соединение не закрывается, чтоб следующая пачка ушла через него же.
+        :param connection: Открытое соединение с почтовым сервером (get_connection()); если None - открывается новое.
+        :param batch_size: Размер пачки.
+        :param max_attempts: Количество попыток, после которого письмо помечается как неотправленное.
+        :return: Словарь {"sent": ..., "retried": ..., "failed": ...}."""
+        connection = connection or get_connection(fail_silently=False)
+        result = {"sent": 0, "retried": 0, "failed": 0}
+        with transaction.atomic():
+            batch = list(
+                OutboxEmail.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxEmail.PENDING, next_attempt_at__lte=timezone.now())
+                .order_by("next_attempt_at", "id")[:batch_size]
+            )
+            connection_error, retry_at = None, None
+            for email in batch:
+                if connection_error is not None:
+                    # SMTP-сервер недоступен: остальные письма пачки не отправляю и откладываю вместе с первым, не
+                    # списывая попытку (письмо не отправлялось и не должно раньше времени стать неотправленным)
+                    email.next_attempt_at, email.last_error = retry_at, repr(connection_error)
+                    result["retried"] += 1
+                    continue
+                error = cls._send(connection, email)
+                email.attempts += 1
+                if error is None:
+                    email.status, email.sent_at, email.last_error = OutboxEmail.SENT, timezone.now(), ""
+                    result["sent"] += 1
+                elif email.attempts >= max_attempts or cls._is_permanent(error):
+                    email.status, email.last_error = OutboxEmail.FAILED, repr(error)
+                    result["failed"] += 1
+                else:
+                    email.next_attempt_at = timezone.now() + cls.retry_delay(email.attempts)
+                    email.last_error = repr(error)
+                    result["retried"] += 1
+                if cls._is_connection_error(error):
+                    connection_error, retry_at = error, timezone.now() + cls.retry_delay(email.attempts)
+            OutboxEmail.objects.bulk_update(batch, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"])
+        return result
+
+    @staticmethod
+    def _send(connection, email):
+        """Отправляет одно письмо. Если соединение оборвалось (сервер закрывает простаивающие соединения),
+        открывает его заново и пробует еще раз. :return: None или ошибка отправки."""
+        message = EmailMessage(
+            email.subject, email.body, email.from_email or None, email.recipients, connection=connection
+        )
+        for retry in (False, True):
+            try:
+                connection.open()  # Ничего не делает, если соединение уже открыто
+                message.send()
+                return None
+            except OSError as error:  # smtplib.SMTPException - тоже наследник OSError
+                if not EmailOutbox._is_connection_error(error):
+                    return error  # Ошибку вернул сервер на само письмо (адрес отклонен и т.п.)
+                with suppress(OSError):
+                    connection.close()
+                if retry:
+                    return error
+            except Exception as error:
+                # Ошибка в самом письме (BadHeaderError, ValueError при сборке сообщения и т.п.) не должна откатывать
+                # пачку: иначе это письмо навсегда останется первым в очереди. Оно повторяется до max_attempts
+                return error
+
+    @staticmethod
+    def _is_connection_error(error):
+        """Ошибка соединения (сокет, обрыв, отказ в подключении), а не ответ сервера на конкретное письмо."""
+        if not isinstance(error, OSError):
+            return False
+        return not isinstance(error, smtplib.SMTPException) or isinstance(error, CONNECTION_ERRORS)
+
+    @staticmethod
+    def _is_permanent(error):
+        """Постоянная ошибка (адрес отклонен, код ответа 5xx) - повторять отправку бессмысленно."""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
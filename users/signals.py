@@ -0,0 +1,5 @@
+from catalog.images import ImageDerivatives
+from users.models import UserCustomer
+
+# Производные изображения (миниатюры WebP/JPEG) аватара создаются в пуле процессов после загрузки
+ImageDerivatives.register(UserCustomer, "avatar", "avatar", "avatar_width", "avatar_height")
@@ -2,8 +2,8 @@ import os
 
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.auth.views import LoginView, PasswordChangeView
-from django.core.mail import send_mail
+from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
+from django.db import transaction
 from django.urls import reverse_lazy
 from django.views.generic import UpdateView
 from django.views.generic.edit import FormView
@@ -16,6 +16,7 @@ from users.forms import (
     UserPasswordChangeForm,
 )
 from users.models import UserCustomer
+from users.services import EmailOutbox
 
 # Загрузка переменных из .env-файла
 load_dotenv()
@@ -24,21 +25,24 @@ load_dotenv()
 class CustomRegisterView(FormView):
     """Представление для отображения страницы регистрации нового пользователя (register.html)."""
 
+    query_budget = 2  # Бюджет SQL-запросов страницы (проверяет команда check_query_budgets)
+
     form_class = UserCustomerRegistrationForm
     template_name = "users/register.html"
     success_url = reverse_lazy("catalog:home_page")  # Редирект после регистрации
 
     def form_valid(self, form):
         """Сохранение нового пользователя и автоматический вход после регистрации."""
-        user = form.save()
+        # Пользователь и приветственное письмо в очереди сохраняются в одной транзакции: письма без пользователя
+        # (или пользователя без письма) не бывает
+        with transaction.atomic():
+            user = form.save()
+            self.send_welcome_email(user)  # Запрос на отправку приветственного письма после регистрации
         login(self.request, user)
-        self.send_welcome_email(
-            user
-        )  # Запрос на отправку приветственного письма после регистрации
         return super().form_valid(form)
 
     def send_welcome_email(self, user):
-        """Отправка приветственного письма пользователю после успешной регистрации."""
+        """Постановка в очередь приветственного письма пользователю после успешной регистрации."""
         subject = "Регистрация в магазине Skystore!"
         message = (
             f"Спасибо, что зарегистрировались в нашем магазине!\n\n"
@@ -46,24 +50,16 @@ class CustomRegisterView(FormView):
             f"После регистрации в интернет-магазине Skystore Вы можете публиковать свои плагины и"
             f"примеры кода для поиска покупателей."
         )
-        from_email = os.getenv("YANDEX_EMAIL_HOST_USER")
-        if not from_email:
-            raise ValueError(
-                "Переменная окружения YANDEX_EMAIL_HOST_USER не загружена!"
-            )
-        recipient_list = [user.email]
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=from_email,
-            recipient_list=recipient_list,
-            fail_silently=False,
-        )
+        # Письмо только ставится в очередь (отправляет команда send_outbox_emails): регистрация не ждет SMTP-сервер
+        # и не падает с ошибкой, если он недоступен
+        EmailOutbox.enqueue(subject, message, [user.email], from_email=os.getenv("YANDEX_EMAIL_HOST_USER"))
 
 
 class CustomLoginView(LoginView):
     """Представление для входа пользователя (login.html)."""
 
+    query_budget = 2
+
     # Явно указываю кастомную форму для входа пользователя, без этого у меня почему-то не подтягиваются определенные в
     # форме UserCustomerLoginForm стили (наверное, потому что по умолчанию LoginView использует стандартную
     # форму Django → AuthenticationForm.)
@@ -83,9 +79,17 @@ class CustomLoginView(LoginView):
         return super().form_valid(form)
 
 
+class CustomLogoutView(LogoutView):
+    """Представление для выхода пользователя (POST-запрос из меню)."""
+
+    query_budget = 4
+
+
 class CustomEditProfileView(LoginRequiredMixin, UpdateView):
     """Представление для редактирования профиля зарегистрированного пользователя (user_profile_edit.html)."""
 
+    query_budget = 2
+
     model = UserCustomer
     form_class = UserProfileEditForm
     template_name = "users/user_profile_edit.html"
@@ -101,34 +105,23 @@ class CustomEditProfileView(LoginRequiredMixin, UpdateView):
         # CustomRegisterView для "send_welcome_email"
         # 1) Django сам вызывает form.save() поэтому та строка по сути лишняя
         # 2) "self.object" - это уже и есть сохраненный пользователь (т.е. user)
-        response = super().form_valid(form)
-        self.send_info_email(self.object)
+        with transaction.atomic():  # Изменения профиля и письмо в очереди - в одной транзакции
+            response = super().form_valid(form)
+            self.send_info_email(self.object)
         return response
 
     def send_info_email(self, user):
-        """Отправка письма пользователю после успешного изменения данных в его профиле."""
-
+        """Постановка в очередь письма пользователю после успешного изменения данных в его профиле."""
         subject = "Изменение данных пользователя в магазине Skystore!"
         message = "Ваши данные были изменены."
-
-        from_email = os.getenv("YANDEX_EMAIL_HOST_USER")
-        if not from_email:
-            raise ValueError(
-                "Переменная окружения YANDEX_EMAIL_HOST_USER не загружена!"
-            )
-        recipient_list = [user.email]
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=from_email,
-            recipient_list=recipient_list,
-            fail_silently=False,
-        )
+        EmailOutbox.enqueue(subject, message, [user.email], from_email=os.getenv("YANDEX_EMAIL_HOST_USER"))
 
 
 class CustomPasswordChangeView(LoginRequiredMixin, PasswordChangeView):
     """Представление для изменения пароля пользователя (change_password.html)."""
 
+    query_budget = 2
+
     form_class = UserPasswordChangeForm
     template_name = "users/change_password.html"
     success_url = reverse_lazy("catalog:home_page")  # Редирект после изменения пароля